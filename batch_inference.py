@@ -0,0 +1,142 @@
+import time
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future
+import numpy as np
+
+
+class MicroBatcher:
+    def __init__(self, model_factory, replicas=1, max_batch=8, max_wait=0.02, history=1000, **predict_kwargs):
+        """
+        Collects concurrent predict requests into micro-batches.
+        - Each of `replicas` worker threads owns its own model (model_factory() is called once per
+          replica, on that worker thread, so replicas load in parallel without blocking the caller),
+          takes the first waiting request and keeps collecting for up to max_wait seconds or
+          max_batch requests, then runs one forward pass.
+        - If model_factory() raises, that replica exits; once no replica is left, pending and new
+          requests fail with the load error instead of waiting for their timeout.
+        - Requests are grouped by IoU (NMS setting); within a group the batch runs at the lowest
+          confidence requested and each result is filtered back to its own threshold afterwards,
+          which gives the same boxes as a separate call.
+        - stats() reports queue wait, batch size and inference time over the last `history` batches.
+        """
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.predict_kwargs = predict_kwargs
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=history)
+        self._batch_sizes = deque(maxlen=history)
+        self._infer_times = deque(maxlen=history)
+        self.requests = 0
+        self.batches = 0
+        self._alive = replicas
+        self._load_error = None
+
+        self._workers = []
+        for i in range(replicas):
+            worker = threading.Thread(target=self._worker, args=(model_factory,), name=f"batcher-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, image, conf=0.25, iou=0.45):
+        """Queues one image; the Future resolves to its ultralytics Results object."""
+        future = Future()
+        self._queue.put((image, float(conf), round(float(iou), 3), time.time(), future))
+        if self._load_error is not None and not self._alive:
+            self._fail_pending()
+        return future
+
+    def predict(self, image, conf=0.25, iou=0.45, timeout=60.0):
+        return self.submit(image, conf, iou).result(timeout=timeout)
+
+    def _collect(self):
+        try:
+            first = self._queue.get(timeout=0.2)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _fail_pending(self):
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if not request[4].done():
+                request[4].set_exception(self._load_error)
+
+    def _worker(self, model_factory):
+        try:
+            model = model_factory()
+        except Exception as e:
+            print(f"ERROR loading model for {threading.current_thread().name}: {e}")
+            with self._lock:
+                self._alive -= 1
+                self._load_error = e
+                alive = self._alive
+            if not alive:
+                self._fail_pending()
+            return
+        while not self._stop.is_set():
+            batch = self._collect()
+            if not batch:
+                continue
+            start = time.time()
+            groups = {}
+            for request in batch:
+                groups.setdefault(request[2], []).append(request)
+
+            for iou, requests in groups.items():
+                low_conf = min(r[1] for r in requests)
+                try:
+                    results = model.predict(source=[r[0] for r in requests], conf=low_conf, iou=iou,
+                                            verbose=False, **self.predict_kwargs)
+                except Exception as e:
+                    for r in requests:
+                        r[4].set_exception(e)
+                    continue
+                for (_, conf, _, _, future), result in zip(requests, results):
+                    if conf > low_conf and result.boxes is not None:
+                        result = result[(result.boxes.conf >= conf).cpu().numpy()]
+                    future.set_result(result)
+
+            with self._lock:
+                self.requests += len(batch)
+                self.batches += 1
+                self._waits.extend(start - r[3] for r in batch)
+                self._batch_sizes.append(len(batch))
+                self._infer_times.append(time.time() - start)
+
+    def stats(self):
+        with self._lock:
+            waits = np.array(self._waits) if self._waits else np.zeros(1)
+            sizes = np.array(self._batch_sizes) if self._batch_sizes else np.zeros(1)
+            infer = np.array(self._infer_times) if self._infer_times else np.zeros(1)
+            return {
+                "requests": self.requests,
+                "batches": self.batches,
+                "pending": self._queue.qsize(),
+                "queue_wait_ms_avg": float(waits.mean() * 1000),
+                "queue_wait_ms_p95": float(np.percentile(waits, 95) * 1000),
+                "batch_size_avg": float(sizes.mean()),
+                "batch_size_max": int(sizes.max()),
+                "inference_ms_avg": float(infer.mean() * 1000),
+            }
+
+    def close(self):
+        self._stop.set()
+        for worker in self._workers:
+            worker.join(timeout=1.0)
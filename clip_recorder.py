@@ -0,0 +1,227 @@
+import os
+import json
+import time
+import queue
+import tempfile
+import threading
+from collections import deque
+import cv2
+import numpy as np
+
+
+class ClipRecorder:
+    def __init__(self, uploader=None, save_dir=None, pre_seconds=5.0, post_seconds=5.0, fps=10.0,
+                 max_clip_seconds=30.0, jpeg_quality=80, fourcc="mp4v", ext=".mp4", prefix="clip_fall",
+                 max_pending_frames=16, max_pending_clips=2, on_clip=None):
+        """
+        Keeps the last pre_seconds of video in a bounded ring of JPEG-compressed frames and turns
+        an alert into one video clip (pre-event + post_seconds after the last trigger).
+        - push(frame) only hands the frame reference to the ingest thread (frames are sampled
+          down to `fps` and JPEG-encoded there), so the caller never waits on encoding.
+        - trigger(meta) starts a clip or extends the running one (capped at max_clip_seconds).
+          Triggers have their own unbounded queue, so they never block the caller and are never
+          dropped when the frame inbox is full.
+        - Finished clips are encoded to `ext` with `fourcc` on a separate encoder thread, written to
+          save_dir (if given) and queued on the MinioUploader as one video object plus a
+          <name>.json metadata sidecar; on_clip(meta, object_names), if given, is called afterwards.
+        Memory is bounded by the ring length (pre_seconds * fps frames), the post-event frames of
+        the running clip and max_pending_clips clips waiting for the encoder.
+        """
+        self.uploader = uploader
+        self.save_dir = save_dir
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.fps = fps
+        self.max_clip_seconds = max_clip_seconds
+        self.jpeg_quality = jpeg_quality
+        self.fourcc = fourcc
+        self.ext = ext
+        self.prefix = prefix
+        self.on_clip = on_clip
+        if save_dir:
+            os.makedirs(save_dir, exist_ok=True)
+
+        self._ring = deque(maxlen=max(1, int(round(pre_seconds * fps))))
+        self._clip = None
+        self._next_due = 0.0
+        self._inbox = queue.Queue(maxsize=max_pending_frames)
+        self._triggers = queue.Queue()
+        self._clips = queue.Queue(maxsize=max_pending_clips)
+        self.stats = {"frames": 0, "skipped": 0, "dropped": 0, "clips": 0, "clips_dropped": 0,
+                      "clip_bytes": 0, "failed": 0}
+
+        self._ingest_thread = threading.Thread(target=self._ingest, name="clip-ingest", daemon=True)
+        self._encoder_thread = threading.Thread(target=self._encoder, name="clip-encoder", daemon=True)
+        self._ingest_thread.start()
+        self._encoder_thread.start()
+
+    # --- Producer API (hot path) ---
+
+    def push(self, frame, timestamp=None):
+        """Offers a BGR frame to the ring buffer. Returns False if the ingest thread is behind."""
+        timestamp = time.time() if timestamp is None else timestamp
+        # Sample down to the clip frame rate before anything is queued (fixed cadence, small jitter allowed)
+        period = 1.0 / self.fps
+        if timestamp < self._next_due - 0.25 * period:
+            self.stats["skipped"] += 1
+            return False
+        self._next_due = max(self._next_due, timestamp - period) + period
+        try:
+            self._inbox.put_nowait(("frame", timestamp, frame))
+            return True
+        except queue.Full:
+            self.stats["dropped"] += 1
+            return False
+
+    def trigger(self, meta=None, timestamp=None):
+        """Starts (or extends) a clip around `timestamp`; meta is merged into the sidecar."""
+        timestamp = time.time() if timestamp is None else timestamp
+        self._triggers.put((timestamp, meta or {}))
+        # Wake an idle ingest thread; a full inbox means it is busy and sees the trigger next
+        try:
+            self._inbox.put_nowait(("wake", timestamp, None))
+        except queue.Full:
+            pass
+
+    @property
+    def recording(self):
+        return self._clip is not None
+
+    # --- Ingest thread: owns the ring and the running clip ---
+
+    def _ingest(self):
+        while True:
+            item = self._inbox.get()
+            self._drain_triggers()
+            if item is None:
+                break
+            kind, timestamp, payload = item
+            if kind == "wake":
+                continue
+
+            ok, buf = cv2.imencode(".jpg", payload, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            if not ok:
+                continue
+            entry = (timestamp, buf.tobytes())
+            self.stats["frames"] += 1
+            clip = self._clip
+            if clip is not None:
+                clip["frames"].append(entry)
+                if timestamp >= clip["end_time"]:
+                    self._finish_clip()
+            self._ring.append(entry)
+        if self._clip is not None:
+            self._finish_clip()
+        self._clips.put(None)
+
+    def _drain_triggers(self):
+        while True:
+            try:
+                timestamp, meta = self._triggers.get_nowait()
+            except queue.Empty:
+                return
+            self._on_trigger(timestamp, meta)
+
+    def _on_trigger(self, timestamp, meta):
+        clip = self._clip
+        if clip is None:
+            # Frames already in the ring become the pre-event part (bytes are immutable, no copy);
+            # a slow source can leave older frames in it than pre_seconds
+            start = timestamp - self.pre_seconds
+            self._clip = {"trigger_time": timestamp, "end_time": timestamp + self.post_seconds,
+                          "frames": [entry for entry in self._ring if entry[0] >= start], "events": [meta]}
+            return
+        clip["events"].append(meta)
+        start = clip["frames"][0][0] if clip["frames"] else clip["trigger_time"]
+        clip["end_time"] = min(timestamp + self.post_seconds, start + self.max_clip_seconds)
+
+    def _finish_clip(self):
+        clip, self._clip = self._clip, None
+        if not clip["frames"]:
+            return
+        try:
+            self._clips.put_nowait(clip)
+        except queue.Full:
+            self.stats["clips_dropped"] += 1
+            print("Clip encoder busy, dropping event clip")
+
+    # --- Encoder thread ---
+
+    def _encode_video(self, frames, path, fps):
+        first = cv2.imdecode(np.frombuffer(frames[0][1], np.uint8), cv2.IMREAD_COLOR)
+        h, w = first.shape[:2]
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*self.fourcc), fps, (w, h))
+        if not writer.isOpened():
+            raise RuntimeError(f"Could not open video writer for {path} ({self.fourcc})")
+        try:
+            for i, (_, data) in enumerate(frames):
+                frame = first if i == 0 else cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+                if frame.shape[:2] != (h, w):
+                    frame = cv2.resize(frame, (w, h))  # e.g. a camera reconnected at another size
+                writer.write(frame)
+        finally:
+            writer.release()
+
+    def _encoder(self):
+        while True:
+            clip = self._clips.get()
+            if clip is None:
+                break
+            try:
+                self._write_clip(clip)
+            except Exception as e:
+                self.stats["failed"] += 1
+                print(f"ERROR encoding event clip: {e}")
+
+    def _write_clip(self, clip):
+        frames = clip["frames"]
+        start_ts, end_ts = frames[0][0], frames[-1][0]
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(clip["trigger_time"]))
+        name = f"{self.prefix}_{stamp}_{int((clip['trigger_time'] % 1) * 1000):03d}"
+
+        # Play back in real time even if the source delivered fewer frames than `fps`
+        fps = min(self.fps, (len(frames) - 1) / (end_ts - start_ts)) if end_ts > start_ts else self.fps
+        # Encode into a plain temp path (the writer backend may read "d:/..." as a URL scheme)
+        fd, video_path = tempfile.mkstemp(suffix=self.ext)
+        os.close(fd)
+        try:
+            self._encode_video(frames, video_path, fps)
+            with open(video_path, "rb") as f:
+                video_bytes = f.read()
+        finally:
+            os.remove(video_path)
+
+        meta = {
+            "clip": name + self.ext,
+            "trigger_time": clip["trigger_time"],
+            "start_time": start_ts,
+            "end_time": end_ts,
+            "pre_seconds": clip["trigger_time"] - start_ts,
+            "post_seconds": end_ts - clip["trigger_time"],
+            "frames": len(frames),
+            "fps": fps,
+            "bytes": len(video_bytes),
+            "events": clip["events"],
+        }
+        if self.save_dir:
+            with open(os.path.join(self.save_dir, name + self.ext), "wb") as f:
+                f.write(video_bytes)
+            with open(os.path.join(self.save_dir, name + ".json"), "w") as f:
+                json.dump(meta, f, indent=2)
+        if self.uploader is not None:
+            content_type = "video/mp4" if self.ext == ".mp4" else "video/x-msvideo"
+            self.uploader.put_bytes(name + self.ext, video_bytes, content_type)
+            self.uploader.put_json(name + ".json", meta)
+        if self.on_clip is not None:
+            self.on_clip(meta, [name + self.ext, name + ".json"])
+        self.stats["clips"] += 1
+        self.stats["clip_bytes"] += len(video_bytes)
+        print(f"Event clip {name}{self.ext}: {len(frames)} frame(s), {end_ts - start_ts:.1f}s")
+
+    # --- Shutdown ---
+
+    def close(self, timeout=30.0):
+        """Finishes the running clip with the frames collected so far and waits for the encoder."""
+        self._inbox.put(None)
+        self._ingest_thread.join(timeout)
+        self._encoder_thread.join(timeout)
@@ -0,0 +1,181 @@
+import os
+import json
+import time
+import numpy as np
+from tracking_utils import StreamTracker
+
+CACHE_VERSION = 1
+
+
+def build_detection_cache(model, source, path, conf=0.05, iou=0.7, imgsz=640, classes=None, device=None):
+    """
+    Runs the detector over a video once and stores every frame's boxes, scores and classes in a
+    compressed .npz (flat arrays + per-frame offsets), so trackers can be re-run without the model.
+    Use a confidence floor below the lowest track_low_thresh you want to sweep.
+    """
+    import cv2
+    cap = cv2.VideoCapture(source)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    cap.release()
+
+    boxes, scores, labels, counts = [], [], [], []
+    shape = None
+    start = time.time()
+    for r in model.predict(source=source, conf=conf, iou=iou, imgsz=imgsz, classes=classes, device=device,
+                           stream=True, verbose=False):
+        data = r.boxes.data.cpu().numpy() if r.boxes is not None else np.zeros((0, 6), np.float32)
+        boxes.append(data[:, :4])
+        scores.append(data[:, -2])
+        labels.append(data[:, -1])
+        counts.append(len(data))
+        shape = r.orig_shape
+
+    meta = {"version": CACHE_VERSION, "source": str(source), "model": str(getattr(model, "ckpt_path", "") or ""),
+            "conf": conf, "iou": iou, "imgsz": imgsz, "classes": classes, "fps": fps,
+            "shape": list(shape) if shape else None, "frames": len(counts),
+            "seconds": time.time() - start}
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    np.savez_compressed(
+        path,
+        boxes=np.concatenate(boxes).astype(np.float32) if boxes else np.zeros((0, 4), np.float32),
+        scores=np.concatenate(scores).astype(np.float16) if scores else np.zeros(0, np.float16),
+        classes=np.concatenate(labels).astype(np.int16) if labels else np.zeros(0, np.int16),
+        offsets=np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+        meta=np.frombuffer(json.dumps(meta).encode("utf-8"), dtype=np.uint8),
+    )
+    return meta
+
+
+class DetectionCache:
+    def __init__(self, path):
+        """Cached detections (see build_detection_cache); frame(i) returns (xyxy, conf, cls) arrays."""
+        with np.load(path) as data:
+            self.boxes = data["boxes"]
+            self.scores = data["scores"].astype(np.float32)
+            self.classes = data["classes"]
+            self.offsets = data["offsets"]
+            self.meta = json.loads(data["meta"].tobytes().decode("utf-8"))
+        self.path = path
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def frame(self, index):
+        a, b = self.offsets[index], self.offsets[index + 1]
+        return self.boxes[a:b], self.scores[a:b], self.classes[a:b]
+
+
+def retrack(cache, cfg):
+    """
+    Replays cached detections through a fresh ByteTrack with config `cfg`.
+    Returns (per-frame [N, 8] track arrays, seconds spent in the tracker).
+    """
+    tracker = StreamTracker(cfg, frame_rate=int(round(cache.meta.get("fps") or 30)))
+    frames = []
+    start = time.perf_counter()
+    for i in range(len(cache)):
+        frames.append(tracker.update_arrays(*cache.frame(i)))
+    return frames, time.perf_counter() - start
+
+
+def _iou_matrix(a, b):
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.clip(br - tl, 0, None).prod(2)
+    area_a = (a[:, 2:] - a[:, :2]).prod(1)
+    area_b = (b[:, 2:] - b[:, :2]).prod(1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def track_stats(frames, handover_iou=0.3, handover_gap=30, detections=None):
+    """
+    Label-free tracking quality for a sweep:
+    - tracks, mean_length (frames), short_tracks (< 5 frames, usually ghosts)
+    - coverage: tracked boxes / `detections` (the number of confident cached detections, the same
+      for every config), capped at 1; a config that tracks nothing has no ID switches but 0 coverage
+    - reacquired: gaps bridged by a track (ID missing for a while, then the same ID again); this is
+      what a good track_buffer should do, so it is reported but not counted as a failure
+    - id_switches: new IDs born on top of a track that ended shortly before (its last box overlaps
+      the new track's first box by handover_iou within handover_gap frames), i.e. the same object
+      most likely continued under a new ID
+    Keep handover_gap the same for every config being compared; tying it to the config's own
+    track_buffer would make short buffers hide the switches they cause.
+    """
+    first, last, seen = {}, {}, {}
+    reacquired = tracked = 0
+    for f, tracks in enumerate(frames):
+        tracked += len(tracks)
+        for row in tracks:
+            tid = int(row[4])
+            if tid in last and last[tid][0] < f - 1:
+                reacquired += 1
+            if tid not in first:
+                first[tid] = (f, row[:4])
+            last[tid] = (f, row[:4])
+            seen[tid] = seen.get(tid, 0) + 1
+
+    switches = 0
+    if first:
+        ends = sorted((end_f, tid, box) for tid, (end_f, box) in last.items())
+        end_frames = np.array([e[0] for e in ends])
+        end_boxes = np.array([e[2] for e in ends], np.float32)
+        end_ids = np.array([e[1] for e in ends])
+        for tid, (start_f, box) in first.items():
+            recent = (end_frames < start_f) & (end_frames >= start_f - handover_gap) & (end_ids != tid)
+            if recent.any() and _iou_matrix(box[None], end_boxes[recent]).max() >= handover_iou:
+                switches += 1
+
+    lengths = np.array(list(seen.values())) if seen else np.zeros(0)
+    return {"tracks": len(seen), "mean_length": float(lengths.mean()) if len(lengths) else 0.0,
+            "short_tracks": int((lengths < 5).sum()), "reacquired": reacquired, "id_switches": switches,
+            "coverage": min(tracked / detections, 1.0) if detections else 1.0}
+
+
+def load_mot_gt(path):
+    """MOTChallenge gt.txt (frame, id, x, y, w, h, ...; frames 1-based) -> {frame index: (ids, xyxy)}."""
+    data = np.loadtxt(path, delimiter=",", ndmin=2)
+    gt = {}
+    for f in np.unique(data[:, 0]).astype(int):
+        rows = data[data[:, 0] == f]
+        xyxy = rows[:, 2:6].copy()
+        xyxy[:, 2:] += xyxy[:, :2]
+        gt[f - 1] = (rows[:, 1].astype(int), xyxy.astype(np.float32))
+    return gt
+
+
+def gt_stats(frames, gt, iou_thresh=0.5):
+    """
+    CLEAR-MOT style ID switches and fragmentations against ground truth (greedy IoU matching per
+    frame): a switch is a GT object matched to a different track ID than last time, a fragment
+    is a GT trajectory that was lost and picked up again.
+    """
+    last_match, was_tracked = {}, {}
+    switches = fragments = matched = total = 0
+    for f, tracks in enumerate(frames):
+        ids, boxes = gt.get(f, (np.zeros(0, int), np.zeros((0, 4), np.float32)))
+        total += len(ids)
+        matches = {}
+        if len(ids) and len(tracks):
+            iou = _iou_matrix(boxes, tracks[:, :4])
+            for _ in range(min(iou.shape)):
+                g, t = np.unravel_index(iou.argmax(), iou.shape)
+                if iou[g, t] < iou_thresh:
+                    break
+                matches[int(ids[g])] = int(tracks[t, 4])
+                iou[g, :] = 0
+                iou[:, t] = 0
+        for gid in ids.tolist():
+            tid = matches.get(gid)
+            if tid is None:
+                if was_tracked.get(gid):
+                    was_tracked[gid] = False
+                continue
+            matched += 1
+            if gid in last_match and last_match[gid] != tid:
+                switches += 1
+            if was_tracked.get(gid) is False:
+                fragments += 1
+            last_match[gid] = tid
+            was_tracked[gid] = True
+    return {"gt_id_switches": switches, "gt_fragments": fragments,
+            "gt_recall": matched / total if total else 0.0}
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+SQLite index of everything live_pose.py saves (keypoint snapshots, fall alerts, event clips).
+
+    events          one row per save / alert / clip: time, camera, kind, alert type, person count,
+                    summary features (JSON)
+    event_tracks    track IDs seen in an event (a keypoint snapshot can hold several people)
+    event_objects   object keys written for the event; bucket is NULL for local-only files
+
+Incident review queries the index (time range, camera, track, kind) instead of listing the
+bucket. Writers never touch the database on the hot path: record() only queues the row and a
+background thread commits batches in one transaction (WAL mode, so readers never block it).
+"""
+import os
+import json
+import time
+import queue
+import sqlite3
+import argparse
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    time REAL NOT NULL,
+    camera TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    alert_type TEXT,
+    persons INTEGER,
+    features TEXT
+);
+CREATE TABLE IF NOT EXISTS event_tracks (
+    event_id INTEGER NOT NULL REFERENCES events(id),
+    track_id INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS event_objects (
+    event_id INTEGER NOT NULL REFERENCES events(id),
+    key TEXT NOT NULL,
+    bucket TEXT
+);
+CREATE INDEX IF NOT EXISTS events_camera_time ON events(camera, time);
+CREATE INDEX IF NOT EXISTS events_kind_time ON events(kind, time);
+CREATE INDEX IF NOT EXISTS events_time ON events(time);
+CREATE INDEX IF NOT EXISTS event_tracks_track ON event_tracks(track_id, event_id);
+CREATE INDEX IF NOT EXISTS event_objects_event ON event_objects(event_id);
+"""
+
+KINDS = ("keypoints", "alert", "clip")
+
+
+def _connect(path, readonly=False):
+    if readonly:
+        conn = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True, timeout=30)
+    else:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+class EventIndex:
+    def __init__(self, path, batch_size=256, flush_interval=1.0, max_pending=10000):
+        """
+        Batched writer for the event index at `path` (created on first use).
+        record() returns immediately; rows are committed by the writer thread once batch_size rows
+        are queued or flush_interval seconds have passed. If the queue is full (disk stalled),
+        new rows are dropped and counted in stats["dropped"] rather than blocking the caller.
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # Create the schema up front so readers can open the file right away
+        _connect(path).close()
+        self._queue = queue.Queue(maxsize=max_pending)
+        self.stats = {"recorded": 0, "dropped": 0, "batches": 0, "failed": 0}
+        self._thread = threading.Thread(target=self._writer, name="event-index", daemon=True)
+        self._thread.start()
+
+    # --- Producer API ---
+
+    def record(self, timestamp, camera, kind, keys=(), bucket=None, track_ids=(), persons=None,
+               alert_type=None, features=None):
+        """
+        Queues one event. keys are the object names written for it (stored in `bucket`, or
+        None when they were only written locally); track_ids may contain None for untracked people.
+        """
+        row = (float(timestamp), str(camera), kind, alert_type, persons,
+               json.dumps(features, separators=(",", ":")) if features else None,
+               sorted({int(t) for t in track_ids if t is not None and t >= 0}),
+               [(key, bucket) for key in keys])
+        try:
+            self._queue.put_nowait(row)
+            return True
+        except queue.Full:
+            self.stats["dropped"] += 1
+            return False
+
+    def flush(self, timeout=10.0):
+        """Waits until everything recorded so far is committed."""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=10.0):
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    # --- Writer thread ---
+
+    def _writer(self):
+        conn = _connect(self.path)
+        running = True
+        while running:
+            batch, waiters = [], []
+            deadline = None
+            while len(batch) < self.batch_size:
+                timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                    break
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            if batch:
+                try:
+                    self._commit(conn, batch)
+                except sqlite3.Error as e:
+                    self.stats["failed"] += len(batch)
+                    print(f"ERROR writing event index: {e}")
+            for waiter in waiters:
+                waiter.set()
+        conn.close()
+
+    def _commit(self, conn, batch):
+        with conn:
+            for timestamp, camera, kind, alert_type, persons, features, tracks, objects in batch:
+                event_id = conn.execute(
+                    "INSERT INTO events (time, camera, kind, alert_type, persons, features) VALUES (?, ?, ?, ?, ?, ?)",
+                    (timestamp, camera, kind, alert_type, persons, features)).lastrowid
+                if tracks:
+                    conn.executemany("INSERT INTO event_tracks (event_id, track_id) VALUES (?, ?)",
+                                     [(event_id, t) for t in tracks])
+                if objects:
+                    conn.executemany("INSERT INTO event_objects (event_id, key, bucket) VALUES (?, ?, ?)",
+                                     [(event_id, key, bucket) for key, bucket in objects])
+        self.stats["recorded"] += len(batch)
+        self.stats["batches"] += 1
+
+
+# --- Queries (any process; the writer keeps running) ---
+
+def query_events(path, start=None, end=None, camera=None, kind=None, track_id=None, alert_type=None,
+                 limit=None):
+    """
+    Events matching every given filter, oldest first. Each is a dict with the event columns plus
+    `track_ids`, `objects` ([(key, bucket)]) and decoded `features`.
+    """
+    where, params = [], []
+    for column, op, value in (("e.time", ">=", start), ("e.time", "<", end), ("e.camera", "=", camera),
+                              ("e.kind", "=", kind), ("e.alert_type", "=", alert_type)):
+        if value is not None:
+            where.append(f"{column} {op} ?")
+            params.append(value)
+    if track_id is not None:
+        where.append("e.id IN (SELECT event_id FROM event_tracks WHERE track_id = ?)")
+        params.append(int(track_id))
+    sql = "SELECT e.* FROM events e"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY e.time"
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+
+    conn = _connect(path, readonly=True)
+    try:
+        events = [dict(row) for row in conn.execute(sql, params)]
+        by_id = {e["id"]: e for e in events}
+        for e in events:
+            e["features"] = json.loads(e["features"]) if e["features"] else {}
+            e["track_ids"], e["objects"] = [], []
+        # Children in chunks (SQLite caps the number of bound parameters)
+        ids = list(by_id)
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            marks = ",".join("?" * len(chunk))
+            for row in conn.execute(f"SELECT event_id, track_id FROM event_tracks WHERE event_id IN ({marks})", chunk):
+                by_id[row[0]]["track_ids"].append(row[1])
+            for row in conn.execute(f"SELECT event_id, key, bucket FROM event_objects WHERE event_id IN ({marks})",
+                                    chunk):
+                by_id[row[0]]["objects"].append((row[1], row[2]))
+    finally:
+        conn.close()
+    return events
+
+
+def query_keys(path, bucket_only=False, **filters):
+    """Object keys of all matching events ([(key, bucket)]); bucket_only skips local-only files."""
+    return [(key, bucket) for e in query_events(path, **filters) for key, bucket in e["objects"]
+            if bucket or not bucket_only]
+
+
+def index_summary(path):
+    conn = _connect(path, readonly=True)
+    try:
+        rows = conn.execute("SELECT camera, kind, COUNT(*), MIN(time), MAX(time) FROM events "
+                            "GROUP BY camera, kind ORDER BY camera, kind").fetchall()
+    finally:
+        conn.close()
+    return [tuple(row) for row in rows]
+
+
+# --- CLI ---
+
+def _parse_time(value):
+    """Accepts epoch seconds, YYYYmmdd-HHMMSS (as in file names) or YYYY-mm-dd."""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    for fmt in ("%Y%m%d-%H%M%S", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d"):
+        try:
+            return time.mktime(time.strptime(value, fmt))
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognized time '{value}'")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Query the index of saved keypoints, alerts and clips')
+    parser.add_argument('command', choices=['query', 'keys', 'info'],
+                        help='query: matching events, keys: matching object keys only, info: counts per camera')
+    parser.add_argument('--db', type=str, default='output/keypoints/events.db', help='Event index file')
+    parser.add_argument('--start', type=str, default=None,
+                        help='Range start (epoch seconds, YYYYmmdd-HHMMSS or YYYY-mm-dd)')
+    parser.add_argument('--end', type=str, default=None, help='Range end (exclusive, same formats)')
+    parser.add_argument('--camera', type=str, default=None, help='Camera name')
+    parser.add_argument('--kind', type=str, default=None, choices=KINDS, help='Event kind')
+    parser.add_argument('--track', type=int, default=None, help='Track ID')
+    parser.add_argument('--alert-type', type=str, default=None, help='Alert type (e.g. fall)')
+    parser.add_argument('--limit', type=int, default=None, help='At most this many events')
+    parser.add_argument('--minio-only', action='store_true', help='keys: only objects uploaded to MinIO')
+    parser.add_argument('--json', action='store_true', help='Print JSON instead of a table')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if not os.path.exists(args.db):
+        raise SystemExit(f"No event index at {args.db}")
+    if args.command == 'info':
+        for camera, kind, count, t_start, t_end in index_summary(args.db):
+            print(f"{camera:<16}{kind:<11}{count:>8}  {time.ctime(t_start)} -> {time.ctime(t_end)}")
+        return
+
+    filters = {"start": _parse_time(args.start), "end": _parse_time(args.end), "camera": args.camera,
+               "kind": args.kind, "track_id": args.track, "alert_type": args.alert_type, "limit": args.limit}
+    if args.command == 'keys':
+        keys = query_keys(args.db, bucket_only=args.minio_only, **filters)
+        if args.json:
+            print(json.dumps([{"key": k, "bucket": b} for k, b in keys], indent=2))
+        else:
+            for key, bucket in keys:
+                print(f"{bucket}/{key}" if bucket else key)
+        return
+
+    events = query_events(args.db, **filters)
+    if args.json:
+        print(json.dumps(events, indent=2))
+        return
+    for e in events:
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(e["time"]))
+        tracks = ",".join(map(str, e["track_ids"])) or "-"
+        print(f"{stamp}  {e['camera']:<12}{e['kind']:<10}{e['alert_type'] or '':<6}"
+              f"persons={e['persons'] if e['persons'] is not None else '-':<3} tracks={tracks:<10} "
+              f"{' '.join(k for k, _ in e['objects'])}")
+    print(f"{len(events)} event(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import time
+from collections import namedtuple
+import numpy as np
+
+# COCO keypoint indices used by the posture check
+LEFT_SHOULDER, RIGHT_SHOULDER = 5, 6
+LEFT_HIP, RIGHT_HIP = 11, 12
+
+# One alert per fall, not per frame: track_id is -1 when the frame came from predict() (no tracker)
+FallEvent = namedtuple("FallEvent", ["track_id", "box", "timestamp", "frames"])
+
+
+def score_falls(boxes, keypoints, aspect_ratio_thresh=1.2, collapse_ratio=0.15, min_kpt_conf=0.3):
+    """
+    Vectorized posture check for every person in a frame.
+    boxes: [N, 4] xyxy, keypoints: [N, 17, 3] (x, y, conf).
+    Returns a boolean mask [N] of people whose posture looks like a fall:
+      - Aspect ratio > aspect_ratio_thresh (wide box), or
+      - vertical distance between average shoulders and average hips < collapse_ratio * box width,
+        only evaluated when all four torso points are confident enough (missing points sit at 0,0).
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    keypoints = np.asarray(keypoints, dtype=np.float32)
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=bool)
+
+    w = boxes[:, 2] - boxes[:, 0]
+    h = boxes[:, 3] - boxes[:, 1]
+    is_horizontal = w > aspect_ratio_thresh * np.maximum(h, 1e-6)
+
+    if keypoints.ndim != 3 or keypoints.shape[1] <= RIGHT_HIP:
+        return is_horizontal
+
+    s_y = keypoints[:, [LEFT_SHOULDER, RIGHT_SHOULDER], 1].mean(axis=1)
+    h_y = keypoints[:, [LEFT_HIP, RIGHT_HIP], 1].mean(axis=1)
+    v_dist = np.abs(h_y - s_y)
+    is_collapsed = v_dist < (w * collapse_ratio)
+
+    if keypoints.shape[2] > 2:
+        torso_conf = keypoints[:, [LEFT_SHOULDER, RIGHT_SHOULDER, LEFT_HIP, RIGHT_HIP], 2].min(axis=1)
+        is_collapsed &= torso_conf >= min_kpt_conf
+
+    return is_horizontal | is_collapsed
+
+
+class FallDetector:
+    def __init__(self, aspect_ratio_thresh=1.2, collapse_ratio=0.15, min_kpt_conf=0.3,
+                 hold_frames=5, cooldown=10.0, track_ttl=30):
+        """
+        Track-aware fall detector.
+        A person must hold a fall posture for hold_frames consecutive frames before an event fires,
+        and the same track only re-alerts after it recovers or cooldown seconds have passed.
+        State for tracks unseen for track_ttl frames is discarded.
+        """
+        self.aspect_ratio_thresh = aspect_ratio_thresh
+        self.collapse_ratio = collapse_ratio
+        self.min_kpt_conf = min_kpt_conf
+        self.hold_frames = hold_frames
+        self.cooldown = cooldown
+        self.track_ttl = track_ttl
+
+        self.frame_index = 0
+        # track_id -> [consecutive fall frames, last seen frame, last alert time]
+        self._tracks = {}
+
+    def reset(self):
+        self.frame_index = 0
+        self._tracks.clear()
+
+    def update(self, boxes, keypoints, track_ids=None, timestamp=None):
+        """
+        Scores one frame and advances the temporal state.
+        Returns (fallen_mask [N], events): fallen_mask marks people currently in a fall posture
+        (for drawing), events lists the FallEvents that fired on this frame.
+        Without track_ids (plain predict) the whole frame is treated as one track (-1).
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        self.frame_index += 1
+
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        fallen = score_falls(boxes, keypoints, self.aspect_ratio_thresh,
+                             self.collapse_ratio, self.min_kpt_conf)
+
+        if track_ids is None:
+            keys = [-1]
+            any_fallen = bool(fallen.any())
+            states = [any_fallen]
+            rows = [int(np.argmax(fallen)) if any_fallen else -1]
+        else:
+            keys = [int(t) for t in np.asarray(track_ids).reshape(-1)]
+            states = fallen.tolist()
+            rows = range(len(keys))
+
+        events = []
+        for key, is_fallen, row in zip(keys, states, rows):
+            state = self._tracks.get(key)
+            if state is None:
+                state = self._tracks[key] = [0, self.frame_index, -np.inf]
+            state[1] = self.frame_index
+
+            if not is_fallen:
+                state[0] = 0
+                continue
+
+            state[0] += 1
+            if state[0] == self.hold_frames or (
+                    state[0] > self.hold_frames and timestamp - state[2] >= self.cooldown):
+                state[2] = timestamp
+                events.append(FallEvent(key, boxes[row].tolist(), timestamp, state[0]))
+
+        # Forget tracks that have left the scene
+        stale = [k for k, s in self._tracks.items() if self.frame_index - s[1] > self.track_ttl]
+        for k in stale:
+            del self._tracks[k]
+
+        return fallen, events
@@ -0,0 +1,147 @@
+import numpy as np
+
+NUM_KEYPOINTS = 17
+
+
+class FrameResult:
+    def __init__(self, capacity=32, num_kpts=NUM_KEYPOINTS):
+        """
+        Host-side view of one ultralytics Results object, stored as struct-of-arrays.
+        Buffers are preallocated and reused frame after frame (they only grow when a frame
+        has more people than ever before), so steady-state loading allocates nothing.
+        All consumers (fall detection, ID overlay, confidence filtering, serialization)
+        read the same arrays instead of calling .cpu().numpy() on the result themselves.
+        """
+        self.num_kpts = num_kpts
+        self.count = 0
+        self.has_keypoints = False
+        self.has_track_ids = False
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self.capacity = capacity
+        self._boxes = np.zeros((capacity, 4), dtype=np.float32)
+        self._scores = np.zeros(capacity, dtype=np.float32)
+        self._classes = np.zeros(capacity, dtype=np.int32)
+        self._track_ids = np.full(capacity, -1, dtype=np.int32)
+        self._keypoints = np.zeros((capacity, self.num_kpts, 3), dtype=np.float32)
+
+    def load(self, result):
+        """
+        Copies boxes, scores, classes, track IDs and keypoints to host in a single transfer:
+        everything is concatenated on the device first, then moved with one .cpu().
+        """
+        boxes = getattr(result, "boxes", None)
+        if boxes is None or len(boxes) == 0:
+            self.count = 0
+            self.has_keypoints = False
+            self.has_track_ids = False
+            return self
+
+        # boxes.data is [N, 6] (xyxy, conf, cls) or [N, 7] (xyxy, track_id, conf, cls) when tracking
+        data = boxes.data
+        keypoints = getattr(result, "keypoints", None)
+        self.has_keypoints = keypoints is not None and len(keypoints) == len(data)
+        if self.has_keypoints:
+            data = _concat([data, keypoints.data.reshape(len(data), -1)])
+        host = _to_numpy(data)
+        box_cols = boxes.data.shape[1]
+
+        n = len(host)
+        if n > self.capacity:
+            self._allocate(max(n, 2 * self.capacity))
+        self.count = n
+
+        self.has_track_ids = boxes.is_track
+        self._boxes[:n] = host[:, :4]
+        self._scores[:n] = host[:, box_cols - 2]
+        self._classes[:n] = host[:, box_cols - 1]
+        if self.has_track_ids:
+            self._track_ids[:n] = host[:, 4]
+        else:
+            self._track_ids[:n] = -1
+        if self.has_keypoints:
+            self._keypoints[:n] = host[:, box_cols:].reshape(n, self.num_kpts, 3)
+        return self
+
+    # --- Views (valid until the next load) ---
+
+    @property
+    def boxes(self):
+        return self._boxes[:self.count]
+
+    @property
+    def scores(self):
+        return self._scores[:self.count]
+
+    @property
+    def classes(self):
+        return self._classes[:self.count]
+
+    @property
+    def track_ids(self):
+        """[N] int32 track IDs, or None when the frame came from predict() rather than track()."""
+        return self._track_ids[:self.count] if self.has_track_ids else None
+
+    @property
+    def keypoints(self):
+        return self._keypoints[:self.count]
+
+    def __len__(self):
+        return self.count
+
+    # --- Vectorized consumers ---
+
+    def keypoint_mask(self, kpt_conf_threshold):
+        """[N, 17] bool: points that are inside the frame and confident enough to show."""
+        kpts = self.keypoints
+        return (kpts[..., 0] > 0) & (kpts[..., 1] > 0) & (kpts[..., 2] >= kpt_conf_threshold)
+
+    def filtered_keypoints(self, kpt_conf_threshold):
+        """[N, 17, 3] copy with x/y zeroed where confidence is below the threshold (conf is kept)."""
+        kpts = self.keypoints.copy()
+        kpts[kpts[..., 2] < kpt_conf_threshold, :2] = 0.0
+        return kpts
+
+    def copy(self):
+        """Compact, independent snapshot (for consumers that outlive the buffer, e.g. persistence)."""
+        snapshot = FrameResult(capacity=max(self.count, 1), num_kpts=self.num_kpts)
+        n = snapshot.count = self.count
+        snapshot.has_keypoints = self.has_keypoints
+        snapshot.has_track_ids = self.has_track_ids
+        snapshot._boxes[:n] = self.boxes
+        snapshot._scores[:n] = self.scores
+        snapshot._classes[:n] = self.classes
+        snapshot._track_ids[:n] = self._track_ids[:n]
+        snapshot._keypoints[:n] = self.keypoints
+        return snapshot
+
+
+class FrameResultPool:
+    def __init__(self, size, capacity=32):
+        """
+        Small ring of reusable FrameResults for a pipeline: a buffer handed to a downstream
+        queue must not be overwritten while it may still be rendered, so size it to
+        (queue size + frames in flight).
+        """
+        self._items = [FrameResult(capacity) for _ in range(size)]
+        self._next = 0
+
+    def next(self):
+        item = self._items[self._next]
+        self._next = (self._next + 1) % len(self._items)
+        return item
+
+
+def _concat(tensors):
+    first = tensors[0]
+    if isinstance(first, np.ndarray):
+        return np.concatenate(tensors, axis=1)
+    import torch
+    return torch.cat(tensors, dim=1)
+
+
+def _to_numpy(data):
+    if isinstance(data, np.ndarray):
+        return data.astype(np.float32, copy=False)
+    return data.float().cpu().numpy()
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Append-only columnar keypoint log.
+
+Each segment is a directory of raw little-endian column files plus a meta.json:
+
+    <log_dir>/seg_<first_ts_ms>/
+        timestamp.bin   float64 [M]          wall-clock seconds
+        frame_id.bin    int64   [M]          rows of the same saved frame share a frame_id
+        track_id.bin    int32   [M]          -1 when the frame was not tracked
+        kpt_conf.bin    float32 [M]          keypoint confidence threshold active at save time
+        boxes.bin       float32 [M, 4]       xyxy
+        keypoints.bin   float32 [M, 17, 3]   raw (unfiltered) x, y, conf
+        meta.json
+
+Rows are buffered in memory and appended in chunks, at least once per flush_interval (default
+1 s), so a crash or kill loses at most the last second of rows. Segments rotate by size or age.
+Readers np.memmap the column files, so loading a time range is zero-copy within a segment.
+"""
+import os
+import json
+import time
+import argparse
+import threading
+import numpy as np
+
+NUM_KEYPOINTS = 17
+
+COLUMNS = {
+    "timestamp": (np.float64, ()),
+    "frame_id": (np.int64, ()),
+    "track_id": (np.int32, ()),
+    "kpt_conf": (np.float32, ()),
+    "boxes": (np.float32, (4,)),
+    "keypoints": (np.float32, (NUM_KEYPOINTS, 3)),
+}
+
+ROW_BYTES = sum(np.dtype(dt).itemsize * int(np.prod(shape)) for dt, shape in COLUMNS.values())
+
+
+class KeypointRecorder:
+    def __init__(self, log_dir, chunk_rows=256, max_segment_bytes=64 * 1024 * 1024,
+                 max_segment_seconds=3600, flush_interval=1.0):
+        """
+        Appends per-person keypoint rows to the current segment.
+        Rows are staged in preallocated chunk buffers and written once chunk_rows is reached,
+        by a background flush every flush_interval seconds, or on flush/close. Rows still staged
+        when the process dies are lost, i.e. at most flush_interval seconds of data (flush_interval=0
+        writes every append straight through). Written rows are in the OS page cache and survive
+        a crash or SIGKILL of the process. A new segment starts when the current one exceeds
+        max_segment_bytes or max_segment_seconds.
+        """
+        self.log_dir = log_dir
+        self.chunk_rows = chunk_rows
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segment_seconds = max_segment_seconds
+        os.makedirs(log_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._chunk = {name: np.zeros((chunk_rows,) + shape, dtype=dt) for name, (dt, shape) in COLUMNS.items()}
+        self._chunk_len = 0
+        self._segment = None
+        self._files = {}
+        # Frame IDs start from the wall clock (microseconds) so they stay unique across restarts
+        self._next_frame_id = time.time_ns() // 1000
+
+        self.flush_interval = flush_interval
+        self._stop = threading.Event()
+        self._flusher = None
+        if flush_interval > 0:
+            self._flusher = threading.Thread(target=self._flush_loop, name="keypoint-log-flush", daemon=True)
+            self._flusher.start()
+
+    # --- Writing ---
+
+    def append(self, timestamp, boxes, keypoints, track_ids=None, kpt_conf_threshold=0.0):
+        """Records every person of one frame. Returns the frame_id assigned to the rows."""
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        keypoints = np.asarray(keypoints, dtype=np.float32).reshape(-1, NUM_KEYPOINTS, 3)
+        n = len(boxes)
+        with self._lock:
+            frame_id = self._next_frame_id
+            self._next_frame_id += 1
+            if self._segment is None or self._should_rotate(timestamp):
+                self._open_segment(timestamp)
+
+            start = 0
+            while start < n:
+                take = min(n - start, self.chunk_rows - self._chunk_len)
+                rows = slice(self._chunk_len, self._chunk_len + take)
+                self._chunk["timestamp"][rows] = timestamp
+                self._chunk["frame_id"][rows] = frame_id
+                self._chunk["track_id"][rows] = -1 if track_ids is None else np.asarray(track_ids)[start:start + take]
+                self._chunk["kpt_conf"][rows] = kpt_conf_threshold
+                self._chunk["boxes"][rows] = boxes[start:start + take]
+                self._chunk["keypoints"][rows] = keypoints[start:start + take]
+                self._chunk_len += take
+                start += take
+                if self._chunk_len == self.chunk_rows:
+                    self._write_chunk()
+            if self.flush_interval <= 0:
+                self._write_chunk()
+        return frame_id
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def _should_rotate(self, timestamp):
+        meta = self._segment
+        size = (meta["rows"] + self._chunk_len) * ROW_BYTES
+        return size >= self.max_segment_bytes or timestamp - meta["t_start"] >= self.max_segment_seconds
+
+    def _open_segment(self, timestamp):
+        self._close_segment()
+        name = f"seg_{int(timestamp * 1000):013d}"
+        path = os.path.join(self.log_dir, name)
+        os.makedirs(path, exist_ok=True)
+        self._segment = {"name": name, "path": path, "rows": 0, "t_start": timestamp, "t_end": timestamp}
+        self._files = {col: open(os.path.join(path, f"{col}.bin"), "ab") for col in COLUMNS}
+        self._write_meta()
+
+    def _write_chunk(self):
+        if self._chunk_len == 0:
+            return
+        n = self._chunk_len
+        for col, f in self._files.items():
+            f.write(self._chunk[col][:n].tobytes())
+            f.flush()
+        self._segment["rows"] += n
+        self._segment["t_end"] = float(self._chunk["timestamp"][n - 1])
+        self._chunk_len = 0
+        self._write_meta()
+
+    def _write_meta(self):
+        meta = {k: v for k, v in self._segment.items() if k != "path"}
+        meta["columns"] = {col: {"dtype": np.dtype(dt).str, "shape": list(shape)} for col, (dt, shape) in COLUMNS.items()}
+        tmp_path = os.path.join(self._segment["path"], "meta.json.part")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(self._segment["path"], "meta.json"))
+
+    def _close_segment(self):
+        if self._segment is None:
+            return
+        self._write_chunk()
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+        self._segment = None
+
+    def flush(self):
+        with self._lock:
+            if self._segment is not None:
+                self._write_chunk()
+
+    def close(self):
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        with self._lock:
+            self._close_segment()
+
+
+class KeypointLogReader:
+    def __init__(self, log_dir):
+        self.log_dir = log_dir
+
+    def segments(self):
+        """Segment metadata sorted by start time."""
+        metas = []
+        if not os.path.isdir(self.log_dir):
+            return metas
+        for name in sorted(os.listdir(self.log_dir)):
+            meta_path = os.path.join(self.log_dir, name, "meta.json")
+            if name.startswith("seg_") and os.path.exists(meta_path):
+                with open(meta_path) as f:
+                    meta = json.load(f)
+                meta["path"] = os.path.join(self.log_dir, name)
+                metas.append(meta)
+        return metas
+
+    @staticmethod
+    def _open_columns(meta):
+        # The row count comes from the file sizes, so a segment still being written is readable too
+        path = meta["path"]
+        columns = {}
+        rows = None
+        for col, (dt, shape) in COLUMNS.items():
+            file_path = os.path.join(path, f"{col}.bin")
+            n = os.path.getsize(file_path) // (np.dtype(dt).itemsize * int(np.prod(shape)))
+            rows = n if rows is None else min(rows, n)
+            columns[col] = (file_path, dt, shape)
+        if rows == 0:
+            return {col: np.zeros((0,) + shape, dtype=dt) for col, (dt, shape) in COLUMNS.items()}
+        return {col: np.memmap(file_path, dtype=dt, mode="r", shape=(rows,) + shape)
+                for col, (file_path, dt, shape) in columns.items()}
+
+    def iter_range(self, t_start=None, t_end=None):
+        """
+        Yields one dict of column arrays per overlapping segment.
+        The arrays are read-only memmap slices: nothing is copied until they are touched.
+        """
+        for meta in self.segments():
+            if t_start is not None and meta["t_end"] < t_start and meta["rows"] > 0:
+                continue
+            if t_end is not None and meta["t_start"] > t_end:
+                continue
+            columns = self._open_columns(meta)
+            ts = columns["timestamp"]
+            lo = 0 if t_start is None else int(np.searchsorted(ts, t_start, side="left"))
+            hi = len(ts) if t_end is None else int(np.searchsorted(ts, t_end, side="right"))
+            if hi > lo:
+                yield {col: arr[lo:hi] for col, arr in columns.items()}
+
+    def read(self, t_start=None, t_end=None):
+        """All rows in [t_start, t_end] as one dict of arrays (zero-copy if a single segment matches)."""
+        parts = list(self.iter_range(t_start, t_end))
+        if len(parts) == 1:
+            return parts[0]
+        if not parts:
+            return {col: np.zeros((0,) + shape, dtype=dt) for col, (dt, shape) in COLUMNS.items()}
+        return {col: np.concatenate([p[col] for p in parts]) for col in COLUMNS}
+
+
+def frame_records(columns, kpt_conf_threshold=None):
+    """
+    Groups rows by frame and yields dicts in the JSON shape live_pose.py used to write.
+    kpt_conf_threshold overrides the threshold stored with each frame.
+    """
+    frame_ids = np.asarray(columns["frame_id"])
+    if len(frame_ids) == 0:
+        return
+    # Rows of a frame are contiguous (append-only log)
+    bounds = np.flatnonzero(np.diff(frame_ids)) + 1
+    starts = np.concatenate(([0], bounds))
+    ends = np.concatenate((bounds, [len(frame_ids)]))
+    for s, e in zip(starts.tolist(), ends.tolist()):
+        ts = float(columns["timestamp"][s])
+        threshold = float(columns["kpt_conf"][s]) if kpt_conf_threshold is None else kpt_conf_threshold
+        kpts = np.array(columns["keypoints"][s:e])
+        kpts[kpts[..., 2] < threshold, :2] = 0.0
+        yield {
+            "timestamp": time.strftime("%Y%m%d-%H%M%S", time.localtime(ts)),
+            "ms": int((ts % 1) * 1000),
+            "num_persons": e - s,
+            "kpt_conf_threshold": threshold,
+            "track_ids": np.asarray(columns["track_id"][s:e]).tolist(),
+            "keypoints": kpts.tolist(),
+        }
+
+
+def export_json(log_dir, out_dir, t_start=None, t_end=None, kpt_conf_threshold=None, indent=4):
+    """Writes one keypoints_<timestamp>_<ms>.json per recorded frame. Returns the number of files."""
+    os.makedirs(out_dir, exist_ok=True)
+    count = 0
+    for columns in KeypointLogReader(log_dir).iter_range(t_start, t_end):
+        for record in frame_records(columns, kpt_conf_threshold):
+            base_filename = f"keypoints_{record['timestamp']}_{record['ms']:03d}"
+            with open(os.path.join(out_dir, f"{base_filename}.json"), "w") as f:
+                json.dump(record, f, indent=indent)
+            count += 1
+    return count
+
+
+def _parse_time(value):
+    """Accepts epoch seconds or the YYYYmmdd-HHMMSS format used in file names."""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return time.mktime(time.strptime(value, "%Y%m%d-%H%M%S"))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Keypoint log tools')
+    parser.add_argument('command', choices=['info', 'export'],
+                        help='info: list segments, export: write JSON files')
+    parser.add_argument('--log-dir', type=str, default='output/keypoints/log',
+                        help='Keypoint log directory')
+    parser.add_argument('--start', type=str, default=None,
+                        help='Range start (epoch seconds or YYYYmmdd-HHMMSS)')
+    parser.add_argument('--end', type=str, default=None,
+                        help='Range end (epoch seconds or YYYYmmdd-HHMMSS)')
+    parser.add_argument('--output', type=str, default='output/keypoints/export',
+                        help='Output directory for exported JSON')
+    parser.add_argument('--kpt-conf', type=float, default=None,
+                        help='Override the keypoint confidence threshold on export')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.command == 'info':
+        for meta in KeypointLogReader(args.log_dir).segments():
+            print(f"{meta['name']}: {meta['rows']} rows, "
+                  f"{time.ctime(meta['t_start'])} -> {time.ctime(meta['t_end'])}")
+    else:
+        count = export_json(args.log_dir, args.output, _parse_time(args.start), _parse_time(args.end),
+                            args.kpt_conf)
+        print(f"Exported {count} frame(s) to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+import os
+import json
+import signal
+import threading
+import socketserver
+import yaml
+
+# Allowed (min, max) for numeric settings; thresholds outside [0, 1] are rejected
+RANGES = {"conf": (0.0, 1.0), "iou": (0.0, 1.0), "kpt_conf_threshold": (0.0, 1.0)}
+
+
+class LiveConfig:
+    def __init__(self, defaults, path=None, control_port=None, watch_interval=1.0, static_keys=()):
+        """
+        Runtime settings for the live scripts when no GUI trackbars are available.
+        - Values start from `defaults`, then the YAML/JSON file at `path` (if any).
+        - The file is re-read whenever its modification time changes (poll every watch_interval s).
+        - An optional localhost TCP control socket accepts newline-delimited JSON commands:
+            {"set": {"conf": 0.4}}   update settings
+            {"cmd": "get"}           reply with the current settings
+            {"cmd": "save"}          request a manual save (same as pressing 's')
+            {"cmd": "stop"}          shut the process down
+        Keys listed in static_keys (e.g. "source") are only read at startup and kept in `static`.
+        Values are converted to the type of their default and range-checked (RANGES); an invalid
+        update is rejected as a whole and the previous settings stay in effect.
+        Reading `settings` from other threads is safe: updates replace values, never mutate in place.
+        """
+        self.settings = dict(defaults)
+        self.static_keys = tuple(static_keys)
+        self.static = {}
+        self.path = path
+        self.control_port = control_port
+        self.watch_interval = watch_interval
+        self.stop_event = threading.Event()
+        self.save_requested = threading.Event()
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._server = None
+        if path:
+            self._load_file()
+
+    def _load_file(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+            with open(self.path) as f:
+                values = yaml.safe_load(f) or {}
+        except (OSError, yaml.YAMLError) as e:
+            print(f"Could not read config {self.path}: {e}")
+            return False
+        self._mtime = mtime
+        try:
+            if not isinstance(values, dict):
+                raise ValueError("expected a mapping of setting: value")
+            self.update(**values)
+        except ValueError as e:
+            print(f"Ignoring config {self.path}: {e}")
+            return False
+        return True
+
+    def _coerce(self, key, value):
+        """Converts value to the type of the setting's default; raises ValueError if it doesn't fit."""
+        default = self.settings[key]
+        try:
+            if isinstance(default, bool):
+                if not isinstance(value, (bool, int)) or value not in (0, 1):
+                    raise ValueError
+                value = bool(value)
+            elif isinstance(default, int):
+                if isinstance(value, float) and not value.is_integer():
+                    raise ValueError
+                value = int(value)
+            elif isinstance(default, float):
+                value = float(value)
+            elif isinstance(default, str):
+                value = str(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{key}: expected {type(default).__name__}, got {value!r}") from None
+        low, high = RANGES.get(key, (None, None))
+        if low is not None and not low <= value <= high:
+            raise ValueError(f"{key}: {value} is outside [{low}, {high}]")
+        return value
+
+    def update(self, **values):
+        """Applies values (all or nothing); raises ValueError for a value that doesn't fit its setting."""
+        for key in self.static_keys:
+            if key in values:
+                self.static.setdefault(key, values.pop(key))
+        unknown = [k for k in values if k not in self.settings]
+        if unknown:
+            print(f"Ignoring unknown setting(s): {', '.join(unknown)}")
+        checked = {key: self._coerce(key, value) for key, value in values.items() if key in self.settings}
+        with self._lock:
+            self.settings.update(checked)
+
+    def get(self):
+        with self._lock:
+            return dict(self.settings)
+
+    def _watch(self):
+        while not self.stop_event.wait(self.watch_interval):
+            try:
+                mtime = os.path.getmtime(self.path)
+            except OSError:
+                continue
+            if mtime != self._mtime and self._load_file():
+                print(f"Reloaded config from {self.path}")
+
+    def start(self):
+        if self.path:
+            threading.Thread(target=self._watch, name="config-watch", daemon=True).start()
+        if self.control_port:
+            config = self
+
+            class Handler(socketserver.StreamRequestHandler):
+                def handle(self):
+                    for line in self.rfile:
+                        reply = config.handle_command(line.decode("utf-8", "replace").strip())
+                        self.wfile.write((json.dumps(reply) + "\n").encode("utf-8"))
+
+            socketserver.ThreadingTCPServer.allow_reuse_address = True
+            self._server = socketserver.ThreadingTCPServer(("127.0.0.1", self.control_port), Handler)
+            self._server.daemon_threads = True
+            threading.Thread(target=self._server.serve_forever, name="control-socket", daemon=True).start()
+            print(f"Control socket listening on 127.0.0.1:{self.control_port}")
+        return self
+
+    def handle_command(self, line):
+        if not line:
+            return {"ok": True}
+        try:
+            message = json.loads(line)
+        except ValueError:
+            return {"ok": False, "error": "invalid JSON"}
+        if not isinstance(message, dict):
+            return {"ok": False, "error": "expected a JSON object"}
+        if "set" in message:
+            if not isinstance(message["set"], dict):
+                return {"ok": False, "error": "\"set\" expects an object of setting: value"}
+            try:
+                self.update(**message["set"])
+            except ValueError as e:
+                return {"ok": False, "error": str(e)}
+            return {"ok": True, "settings": self.get()}
+        cmd = message.get("cmd")
+        if cmd == "get":
+            return {"ok": True, "settings": self.get()}
+        if cmd == "save":
+            self.save_requested.set()
+            return {"ok": True}
+        if cmd == "stop":
+            self.stop_event.set()
+            return {"ok": True}
+        return {"ok": False, "error": f"unknown command: {cmd}"}
+
+    def stop(self):
+        self.stop_event.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+def install_signal_handlers(stop_event):
+    """SIGINT/SIGTERM set stop_event so the pipeline drains and releases the camera cleanly."""
+    def handler(signum, frame):
+        print(f"Received signal {signum}, shutting down...")
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, handler)
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, handler)
+
+
+def parse_source(value):
+    """Webcam index as int, anything else (file path, rtsp:// URL) unchanged."""
+    return int(value) if isinstance(value, str) and value.isdigit() else value
+
+
+def is_live_source(source):
+    """True for webcam indexes and stream URLs (rtsp://, http://, ...), False for files that end at EOF."""
+    if isinstance(source, int):
+        return True
+    return str(source).lower().startswith(("rtsp://", "rtsps://", "rtmp://", "http://", "https://", "udp://", "tcp://"))
@@ -1,10 +1,26 @@
 import cv2
-from ultralytics import YOLO
 import os
 import json
 import time
 import torch
-from minio_utils import MinioStorage
+import threading
+import argparse
+import numpy as np
+from minio_utils import MinioStorage, MinioUploader
+from fall_detection import FallDetector
+from frame_results import FrameResultPool
+from keypoint_log import KeypointRecorder
+from clip_recorder import ClipRecorder
+from event_index import EventIndex
+from stream_server import StreamServer
+from motion_gate import MotionGate
+from roi_pose import RoiPoseRunner
+from tracking_utils import DEFAULT_TRACKER_CONFIG
+from metrics import Metrics, NULL_METRICS
+from model_export import BACKENDS
+from model_registry import get_model
+from live_config import LiveConfig, install_signal_handlers, parse_source
+from pipeline_utils import LatestFrameCapture, FrameQueue, StageWorker, DROP_OLDEST, DROP_NEWEST, DROP_POLICIES
 
 # Load the pose model
 model_path = 'd:/06-code/yolo/yolo-project/models/yolo11n-pose.pt'
@@ -12,255 +28,619 @@ model_path = 'd:/06-code/yolo/yolo-project/models/yolo11n-pose.pt'
 device = 'cuda' if torch.cuda.is_available() else 'cpu'
 print(f"Using device: {device}")
 
-if not os.path.exists(model_path):
-    print("Model not found locally, using online version...")
-    model = YOLO('yolo11n-pose.pt').to(device)
-else:
-    model = YOLO(model_path).to(device)
+# Loaded lazily: start_live_pose() kicks off loading + warm-up in the background
+model = get_model(model_path, fallback='yolo11n-pose.pt', device=device)
 
 def nothing(x):
     pass
 
-def start_live_pose():
+def draw_fall_alerts(display_frame, boxes):
+    for x1, y1, x2, y2 in boxes:
+        # Draw prominent alert
+        cv2.rectangle(display_frame, (int(x1), int(y1)), (int(x2), int(y2)), (0, 0, 255), 3)
+        cv2.putText(display_frame, "FALL DETECTED!", (int(x1), int(y1) - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
+
+    if len(boxes) > 0:
+        # Blend the alert banner into the top strip only (no full-frame copy)
+        banner = display_frame[:50]
+        cv2.addWeighted(np.full_like(banner, (0, 0, 255)), 0.3, banner, 0.7, 0, banner)
+        cv2.putText(display_frame, "WARNING: PERSON DOWN", (20, 35),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 255, 255), 2)
+
+def draw_keypoint_ids(display_frame, frame_result, kpt_conf_threshold):
+    # ONLY show index if confidence matches the trackbar (one vectorized mask for all people)
+    person_idx, kpt_idx = np.nonzero(frame_result.keypoint_mask(kpt_conf_threshold))
+    points = frame_result.keypoints[person_idx, kpt_idx, :2].astype(int)
+    for i, (x, y) in zip(kpt_idx.tolist(), points.tolist()):
+        cv2.putText(display_frame, str(i), (x, y),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
+
+def save_keypoints(job, save_dir, uploader, recorder=None, metrics=NULL_METRICS, index=None, camera="0"):
+    """
+    Persistence stage: records keypoints + raw/result images and queues them for MinIO.
+    With a recorder, keypoints go to the append-only binary log instead of one JSON file per save
+    (export with `python keypoint_log.py export`); MinIO still receives the JSON document.
+    Encoding and disk writes are timed as the "encode" / "disk_write" spans of `metrics`.
+    With an EventIndex the save is also recorded there (object keys, tracks, summary features).
+    """
+    frame_result = job["frame_result"]
+    kpt_conf_threshold = job["kpt_conf_threshold"]
+
+    save_timestamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(job["time"]))
+    ms = int((job["time"] % 1) * 1000)
+    base_filename = f"keypoints_{save_timestamp}_{ms:03d}"
+
+    json_path = os.path.join(save_dir, f"{base_filename}.json")
+    raw_path = os.path.join(save_dir, f"{base_filename}_raw.jpg")
+    res_path = os.path.join(save_dir, f"{base_filename}_result.jpg")
+
+    try:
+        # 1. Keypoints: raw values into the log (filtering is re-applied on export)
+        frame_id = None
+        if recorder is not None:
+            frame_id = recorder.append(job["time"], frame_result.boxes, frame_result.keypoints,
+                                       frame_result.track_ids, kpt_conf_threshold)
+
+        json_bytes = None
+        if recorder is None or job["minio_enabled"] == 1:
+            # Filter the data for JSON to match the visual output:
+            # low-confidence points keep their confidence but get zeroed coordinates
+            json_bytes = json.dumps({
+                "timestamp": save_timestamp,
+                "ms": ms,
+                "num_persons": len(frame_result),
+                "kpt_conf_threshold": kpt_conf_threshold,
+                "keypoints": frame_result.filtered_keypoints(kpt_conf_threshold).tolist()
+            }, separators=(",", ":")).encode("utf-8")
+
+        # Encode images once in memory: the same bytes go to disk and to MinIO
+        with metrics.span("encode"):
+            raw_bytes = cv2.imencode(".jpg", job["frame"])[1].tobytes()
+            # Use display_frame which has the plots/IDs
+            res_bytes = cv2.imencode(".jpg", job["display_frame"])[1].tobytes()
+
+        # 2. Raw Image, 3. Result Image (Annotated) (+ JSON file when not logging)
+        files = [(raw_path, raw_bytes), (res_path, res_bytes)]
+        if recorder is None:
+            files.insert(0, (json_path, json_bytes))
+        with metrics.span("disk_write"):
+            for path, data in files:
+                with open(path, 'wb') as f:
+                    f.write(data)
+        metrics.inc("saves")
+
+        if job["manual"]:
+            print(f"SUCCESS: Manual save to {base_filename}")
+
+        # 4. Queue for MinIO if enabled (uploaded in the background, no disk read-back)
+        if job["minio_enabled"] == 1:
+            uploader.put_bytes(os.path.basename(json_path), json_bytes, "application/json")
+            uploader.put_bytes(os.path.basename(raw_path), raw_bytes, "image/jpeg")
+            uploader.put_bytes(os.path.basename(res_path), res_bytes, "image/jpeg")
+            if job["manual"]:
+                print(f"SUCCESS: Queued for MinIO upload")
+
+        # 5. Index the save (queued; the index thread commits in batches)
+        if index is not None:
+            if job["minio_enabled"] == 1:
+                keys, bucket = [json_path, raw_path, res_path], uploader.storage.bucket_name
+            else:
+                keys, bucket = [path for path, _ in files], None
+            visible = frame_result.keypoint_mask(kpt_conf_threshold).sum(axis=1)
+            features = {"manual": bool(job["manual"]), "kpt_conf_threshold": kpt_conf_threshold,
+                        "max_score": float(frame_result.scores.max()), "visible_kpts": visible.tolist(),
+                        "boxes": frame_result.boxes.round(1).tolist()}
+            if frame_id is not None:
+                features["log_frame_id"] = frame_id
+            index.record(job["time"], camera, "keypoints", [os.path.basename(k) for k in keys], bucket,
+                         frame_result.track_ids if frame_result.track_ids is not None else (),
+                         len(frame_result), features=features)
+    except Exception as e:
+        metrics.inc("save_errors")
+        print(f"ERROR saving data: {e}")
+
+def save_alert(job, save_dir, uploader, metrics=NULL_METRICS, index=None, camera="0"):
+    """
+    Persistence stage: writes the annotated fall frame and queues it for MinIO.
+    With event clips enabled the JPEG is only kept locally (job["upload"] False): the clip is the upload.
+    """
+    # Create a unique alert filename
+    alert_ts = time.strftime("%Y%m%d-%H%M%S", time.localtime(job["time"]))
+    alert_ms = int((job["time"] % 1) * 1000)
+    alert_filename = f"alert_fall_{alert_ts}_{alert_ms:03d}.jpg"
+    alert_path = os.path.join(save_dir, alert_filename)
+
+    # Save alert image and upload the same encoded bytes
+    # We don't delete local to keep a record
+    with metrics.span("encode"):
+        alert_bytes = cv2.imencode(".jpg", job["display_frame"])[1].tobytes()
+    with metrics.span("disk_write"):
+        with open(alert_path, 'wb') as f:
+            f.write(alert_bytes)
+    upload = job.get("upload", True)
+    if upload:
+        uploader.put_bytes(alert_filename, alert_bytes, "image/jpeg")
+    if index is not None:
+        events = job["events"]
+        index.record(job["time"], camera, "alert", [alert_filename],
+                     uploader.storage.bucket_name if upload else None, [e.track_id for e in events],
+                     len(events), alert_type="fall", features={"events": [e._asdict() for e in events]})
+
+# Runtime thresholds: trackbars in GUI mode, config file / control socket in headless mode
+POSE_DEFAULTS = {"conf": 0.25, "iou": 0.45, "auto_save": 0, "show_id": 0,
+                 "kpt_conf_threshold": 0.5, "minio_enabled": 0}
+
+def render_frame(packet):
+    """Builds the annotated frame (plots, fall alerts, keypoint IDs) for one inference packet."""
+    results = packet["results"]
+    frame_result = packet["frame_result"]
+    current = packet["settings"]
+    if not results or len(results) == 0:
+        return packet["frame"].copy()
+
+    display_frame = results[0].plot()
+    # 1. Fall Detection Alerts (scored on the inference worker)
+    draw_fall_alerts(display_frame, packet["fall_boxes"])
+    # 2. Overlay Keypoint IDs if enabled
+    if current["show_id"] == 1 and frame_result.has_keypoints:
+        draw_keypoint_ids(display_frame, frame_result, current["kpt_conf_threshold"])
+    return display_frame
+
+def start_live_pose(source=0, queue_size=2, drop_policy=DROP_OLDEST, persist_queue_size=16,
+                    fall_hold_frames=5, keypoint_log=True, headless=False, config=None, motion_gate=None,
+                    metrics=None, stats_overlay=False, clip_pre=5.0, clip_post=5.0, clip_fps=10.0,
+                    roi_pose=None, event_index=None, camera="0", stream=None, tracker="bytetrack.yaml"):
+    """
+    Runs the live pose loop as a staged pipeline:
+      capture thread -> inference worker -> render/display (main thread) -> persistence worker
+    Stages are joined by bounded FrameQueues; drop_policy controls what happens to
+    frames when the renderer falls behind. Capture never blocks: it only keeps the newest frame.
+
+    headless=True runs without any window: thresholds come from `config` (a LiveConfig, reloaded
+    from its file / control socket), nothing is drawn unless a save or alert needs the annotated
+    image, and SIGINT/SIGTERM or {"cmd": "stop"} shut the pipeline down cleanly.
+
+    motion_gate (a MotionGate) skips inference on static frames and reuses the last results;
+    fall scoring still runs on the reused detections so a person lying still keeps counting.
+
+    metrics (a Metrics) times every stage (capture, preprocess, inference, track, fall, render,
+    encode, disk_write, upload) and counts frames, alerts, saves and drops; serve it with
+    Metrics.serve(). stats_overlay=True draws the stage timings on the displayed frame.
+
+    Fall alerts with MinIO enabled upload one video clip per event (clip_pre seconds before to
+    clip_post seconds after, sampled at clip_fps) plus a JSON sidecar instead of a single JPEG;
+    the raw frames wait in a bounded JPEG ring buffer (see ClipRecorder). clip_pre = clip_post = 0
+    turns clips off and restores the JPEG upload.
+
+    roi_pose (a RoiPoseRunner) replaces full-frame model.track with pose inference on crops around
+    the people found in the previous frame, plus a periodic full-frame pass for new people.
+    tracker is the ByteTrack YAML of the full-frame model.track path.
+
+    event_index (an EventIndex) records every save, alert and clip under `camera` so they can be
+    found by time / camera / track without listing the bucket (`python event_index.py query`).
+
+    stream (a started StreamServer) publishes the annotated frames over HTTP; frames are only
+    rendered for it (also in headless mode) while a viewer is connected and due for a frame.
+    """
+    metrics = metrics or NULL_METRICS
+    # Load + warm up the model while the camera, window and MinIO are being set up
+    model.start()
+    if config is None:
+        config = LiveConfig(POSE_DEFAULTS)
+    settings = config.settings
+    stop_event = config.stop_event
+    install_signal_handlers(stop_event)
+
     # 0 is usually the default webcam
-    cap = cv2.VideoCapture(0)
+    capture = LatestFrameCapture(source, metrics=metrics)
 
-    if not cap.isOpened():
-        print("Error: Could not open webcam.")
+    if not capture.isOpened():
+        print(f"Error: Could not open video source {source}.")
         return
 
-    # Create a window for trackbars
     window_name = "YOLO11 Live Pose Detection"
-    cv2.namedWindow(window_name)
-    # Create trackbars
-    cv2.createTrackbar("Confidence", window_name, 25, 100, nothing)
-    cv2.createTrackbar("IoU", window_name, 45, 100, nothing)
-    cv2.createTrackbar("Auto Save", window_name, 0, 1, nothing)
-    cv2.createTrackbar("Show ID", window_name, 0, 1, nothing)
-    cv2.createTrackbar("Kpt Conf", window_name, 50, 100, nothing) 
-    cv2.createTrackbar("MinIO", window_name, 0, 1, nothing) # New: Toggle MinIO upload
-
-    # Initialize MinIO Storage
-    minio_storage = MinioStorage()
-    
-    # Crucial: Give the GUI time to initialize the window before reading trackbars
-    cv2.waitKey(1)
+    if not headless:
+        # Create a window for trackbars
+        cv2.namedWindow(window_name)
+        # Create trackbars (starting from the configured values)
+        cv2.createTrackbar("Confidence", window_name, int(settings["conf"] * 100), 100, nothing)
+        cv2.createTrackbar("IoU", window_name, int(settings["iou"] * 100), 100, nothing)
+        cv2.createTrackbar("Auto Save", window_name, int(settings["auto_save"]), 1, nothing)
+        cv2.createTrackbar("Show ID", window_name, int(settings["show_id"]), 1, nothing)
+        cv2.createTrackbar("Kpt Conf", window_name, int(settings["kpt_conf_threshold"] * 100), 100, nothing)
+        cv2.createTrackbar("MinIO", window_name, int(settings["minio_enabled"]), 1, nothing) # New: Toggle MinIO upload
 
     # Create output directory for saved data
     save_dir = "d:/06-code/yolo/yolo-project/output/keypoints"
     os.makedirs(save_dir, exist_ok=True)
 
-    print("Controls:")
-    print("  - Press 'q' to exit the live stream.")
-    print("  - Press 's' to manual save current keypoints.")
-    print("  - Use 'Auto Save' trackbar to toggle automatic saving.")
-    print("  - Use 'Show ID' trackbar to overlay keypoint indices.")
-    print("  - Use 'Kpt Conf' trackbar to filter points by confidence (JSON & Display).")
+    # Initialize MinIO Storage and the background uploader (bucket check runs in the background);
+    # failed uploads are spooled next to the saved data, whatever the working directory
+    minio_storage = MinioStorage(background_init=True)
+    uploader = MinioUploader(minio_storage, spool_dir=os.path.join(os.path.dirname(save_dir), "minio_spool"),
+                             metrics=metrics)
 
-    last_save_time = 0
+    if not headless:
+        # Crucial: Give the GUI time to initialize the window before reading trackbars
+        cv2.waitKey(1)
+    # Append-only binary keypoint log (instead of one JSON file per save)
+    recorder = KeypointRecorder(os.path.join(save_dir, "log")) if keypoint_log else None
+    # Pre-/post-event clips for fall alerts (encoded and uploaded on the recorder's own threads)
+    clips = None
+    if clip_pre > 0 or clip_post > 0:
+        on_clip = None
+        if event_index is not None:
+            def on_clip(meta, keys):
+                tracks = [e["track_id"] for event in meta["events"] for e in event.get("events", [])]
+                event_index.record(meta["trigger_time"], camera, "clip", keys, minio_storage.bucket_name,
+                                   tracks, len(tracks), alert_type="fall",
+                                   features={k: meta[k] for k in ("start_time", "end_time", "frames", "bytes")})
+        clips = ClipRecorder(uploader, os.path.join(save_dir, "clips"), pre_seconds=clip_pre,
+                             post_seconds=clip_post, fps=clip_fps, on_clip=on_clip)
 
-    while True:
-        # Read a frame from the webcam
-        success, frame = cap.read()
-        if not success:
-            print("Failed to grab frame.")
-            break
+    if headless:
+        config.start()
+        print("Running headless. Stop with Ctrl+C / SIGTERM or {\"cmd\": \"stop\"} on the control socket.")
+    else:
+        print("Controls:")
+        print("  - Press 'q' to exit the live stream.")
+        print("  - Press 's' to manual save current keypoints.")
+        print("  - Use 'Auto Save' trackbar to toggle automatic saving.")
+        print("  - Use 'Show ID' trackbar to overlay keypoint indices.")
+        print("  - Use 'Kpt Conf' trackbar to filter points by confidence (JSON & Display).")
 
-        # Safety check for window and trackbars to prevent "Null pointer" crash
+    fall_detector = FallDetector(hold_frames=fall_hold_frames)
+    # Reused host buffers: one per queued packet plus the one being rendered and the one being filled
+    frame_results = FrameResultPool(queue_size + 2)
+    render_queue = FrameQueue(maxsize=queue_size, drop_policy=drop_policy)
+    # Saves must not stall the renderer: if the disk/network can't keep up, newest jobs are dropped
+    persist_queue = FrameQueue(maxsize=persist_queue_size, drop_policy=DROP_NEWEST)
+    # Read only when metrics are scraped
+    metrics.gauge("render_queue_depth", render_queue.qsize)
+    metrics.gauge("persist_queue_depth", persist_queue.qsize)
+    metrics.gauge("dropped_frames", lambda: render_queue.dropped)
+    metrics.gauge("dropped_saves", lambda: persist_queue.dropped)
+    if motion_gate is not None:
+        metrics.gauge("motion_skipped_frames", lambda: motion_gate.stats["skipped"])
+    if clips is not None:
+        for stat in ("clips", "clips_dropped", "clip_bytes", "dropped"):
+            metrics.gauge(f"clip_{stat}", lambda stat=stat: clips.stats[stat])
+    if event_index is not None:
+        for stat in ("recorded", "dropped", "failed"):
+            metrics.gauge(f"event_index_{stat}", lambda stat=stat: event_index.stats[stat])
+
+    inference_error = []
+
+    def inference_loop():
         try:
-            if cv2.getWindowProperty(window_name, cv2.WND_PROP_VISIBLE) < 1:
-                print("Window closed by user.")
-                break
-            
-            conf = cv2.getTrackbarPos("Confidence", window_name) / 100.0
-            iou = cv2.getTrackbarPos("IoU", window_name) / 100.0
-            auto_save = cv2.getTrackbarPos("Auto Save", window_name)
-            show_id = cv2.getTrackbarPos("Show ID", window_name)
-            kpt_conf_threshold = cv2.getTrackbarPos("Kpt Conf", window_name) / 100.0
-            minio_enabled = cv2.getTrackbarPos("MinIO", window_name)
-        except cv2.error:
-            # Fallback if window hasn't fully initialized yet
-            conf, iou, auto_save, show_id, kpt_conf_threshold, minio_enabled = 0.25, 0.45, 0, 0, 0.5, 0
-
-        # Run YOLO pose inference on the frame
-        results = model.predict(
-            source=frame, 
-            conf=conf, 
-            iou=iou, 
-            show=False, 
-            verbose=False
-        )
-
-        # Prepare frame for display
-        if results and len(results) > 0:
-            display_frame = results[0].plot()
-            
-            # 1. Fall Detection Logic
-            for r in results:
-                if r.boxes is not None and r.keypoints is not None:
-                    # Get box coordinates [x1, y1, x2, y2]
-                    boxes = r.boxes.xyxy.cpu().numpy()
-                    kpts = r.keypoints.data.cpu().numpy()
-                    
-                    for i, box in enumerate(boxes):
-                        x1, y1, x2, y2 = box
-                        w = x2 - x1
-                        h = y2 - y1
-                        aspect_ratio = w / h
-                        
-                        # Get keypoints for this person
-                        person_kpts = kpts[i] # [17, 3]
-                        
-                        # Points: 5,6 (Shoulders), 11,12 (Hips)
-                        # We check vertical distance between Average Shoulders and Average Hips
-                        try:
-                            s_y = (person_kpts[5][1] + person_kpts[6][1]) / 2
-                            h_y = (person_kpts[11][1] + person_kpts[12][1]) / 2
-                            v_dist = abs(h_y - s_y)
-                            
-                            # Fall Logic: 
-                            # - Aspect ratio > 1.2 (Wide box)
-                            # - Vertical distance between shoulders/hips is very small (< 10% of width)
-                            # - AND confidence of those points is reasonable
-                            is_horizontal = aspect_ratio > 1.2
-                            is_collapsed = v_dist < (w * 0.15)
-                            
-                            if is_horizontal or is_collapsed:
-                                # Draw prominent alert
-                                cv2.rectangle(display_frame, (int(x1), int(y1)), (int(x2), int(y2)), (0, 0, 255), 3)
-                                cv2.putText(display_frame, "FALL DETECTED!", (int(x1), int(y1) - 10), 
-                                            cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
-                                
-                                # Add background overlay for the whole screen alert
-                                overlay = display_frame.copy()
-                                cv2.rectangle(overlay, (0,0), (frame.shape[1], 50), (0,0,255), -1)
-                                cv2.addWeighted(overlay, 0.3, display_frame, 0.7, 0, display_frame)
-                                cv2.putText(display_frame, "WARNING: PERSON DOWN", (20, 35), 
-                                            cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 255, 255), 2)
-                                
-                                # Auto-upload to MinIO on Fall Detection
-                                if minio_enabled == 1:
-                                    # Create a unique alert filename
-                                    alert_ts = time.strftime("%Y%m%d-%H%M%S")
-                                    alert_ms = int((time.time() % 1) * 1000)
-                                    alert_filename = f"alert_fall_{alert_ts}_{alert_ms:03d}.jpg"
-                                    alert_path = os.path.join(save_dir, alert_filename)
-                                    
-                                    # Save temporary alert image and upload
-                                    cv2.imwrite(alert_path, display_frame)
-                                    minio_storage.upload_image(alert_path)
-                                    # We don't delete local to keep a record, 
-                                    # but we print feedback
-                                    cv2.putText(display_frame, "MINIO ALERT SENT", (20, 70), 
-                                                cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
-                        except IndexError:
-                            pass
-
-            # 2. Overlay Keypoint IDs if enabled
-            if show_id == 1 and results[0].keypoints is not None:
-                # Get keypoints coordinates and confidence
-                kps = results[0].keypoints.xy.cpu().numpy()
-                confs = results[0].keypoints.conf.cpu().numpy()
-                
-                for p_idx, person_kps in enumerate(kps):
-                    for i, (x, y) in enumerate(person_kps):
-                        conf_val = confs[p_idx][i]
-                        # ONLY show index if confidence matches the trackbar
-                        if x > 0 and y > 0 and conf_val >= kpt_conf_threshold:
-                            cv2.putText(display_frame, str(i), (int(x), int(y)), 
-                                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
+            seq = 0
+            last = None
+            while not stop_event.is_set():
+                frame, new_seq, frame_time = capture.read(seq)
+                if frame is None:
+                    if capture.failed:
+                        stop_event.set()
+                    continue
+                seq = new_seq
+                current = dict(settings)
+                metrics.inc("frames")
+                if clips is not None:
+                    # Capture allocates a new array per frame, so the ring can keep the reference
+                    clips.push(frame, frame_time)
+
+                if motion_gate is None or motion_gate.check(frame) or last is None:
+                    # Run YOLO pose inference + ByteTrack on the frame (track IDs drive fall persistence)
+                    start = time.perf_counter()
+                    if roi_pose is not None:
+                        results = roi_pose.run(frame, current["conf"], current["iou"], model.imgsz)
+                    else:
+                        results = model.track(
+                            source=frame, 
+                            conf=current["conf"], 
+                            iou=current["iou"], 
+                            imgsz=model.imgsz,
+                            persist=True,
+                            tracker=tracker,
+                            show=False, 
+                            verbose=False
+                        )
+                    metrics.observe_predict(results, time.perf_counter() - start)
+
+                    # Copy everything to host once; all per-frame consumers read these arrays
+                    frame_result = frame_results.next().load(results[0]) if results else None
+                    last = (results, frame_result)
+                else:
+                    # Nothing moved: reuse the last results instead of running the network
+                    results, frame_result = last
+
+                # Score every person at once; events only fire once a posture has held for a few frames
+                fall_boxes, fall_events = [], []
+                if frame_result is not None and frame_result.has_keypoints:
+                    with metrics.span("fall"):
+                        fallen, fall_events = fall_detector.update(frame_result.boxes, frame_result.keypoints,
+                                                                   frame_result.track_ids)
+                    fall_boxes = frame_result.boxes[fallen]
+                    if fall_events:
+                        metrics.inc("alerts", len(fall_events))
+                render_queue.put({"frame": frame, "results": results, "frame_result": frame_result,
+                                  "fall_boxes": fall_boxes, "fall_events": fall_events, "settings": current})
+        except Exception as e:
+            # A dead worker would leave the main loop waiting forever on an empty queue: stop the
+            # pipeline and re-raise in the main thread once everything is shut down
+            print(f"ERROR in inference stage: {e}")
+            metrics.inc("inference_errors")
+            inference_error.append(e)
+            stop_event.set()
+
+    def persist(job):
+        if job["kind"] == "alert":
+            save_alert(job, save_dir, uploader, metrics, event_index, camera)
         else:
-            display_frame = frame.copy()
+            save_keypoints(job, save_dir, uploader, recorder, metrics, event_index, camera)
 
-        # Display the frame
-        cv2.imshow(window_name, display_frame)
+    def render(packet):
+        with metrics.span("render"):
+            return render_frame(packet)
+
+    inference_worker = threading.Thread(target=inference_loop, name="inference", daemon=True)
+    persist_worker = StageWorker("persist", persist, persist_queue)
+
+    capture.start()
+    inference_worker.start()
+    persist_worker.start()
+
+    last_save_time = 0
+
+    while not stop_event.is_set():
+        if not headless:
+            # Safety check for window and trackbars to prevent "Null pointer" crash
+            try:
+                if cv2.getWindowProperty(window_name, cv2.WND_PROP_VISIBLE) < 1:
+                    print("Window closed by user.")
+                    break
+
+                config.update(
+                    conf=cv2.getTrackbarPos("Confidence", window_name) / 100.0,
+                    iou=cv2.getTrackbarPos("IoU", window_name) / 100.0,
+                    auto_save=cv2.getTrackbarPos("Auto Save", window_name),
+                    show_id=cv2.getTrackbarPos("Show ID", window_name),
+                    kpt_conf_threshold=cv2.getTrackbarPos("Kpt Conf", window_name) / 100.0,
+                    minio_enabled=cv2.getTrackbarPos("MinIO", window_name),
+                )
+            except cv2.error:
+                # Fallback if window hasn't fully initialized yet: keep the previous settings
+                pass
+
+        packet = render_queue.get(timeout=0.1)
+        if packet is None:
+            # Keep the GUI responsive while waiting for the next inference result
+            if not headless and cv2.waitKey(1) & 0xFF == ord('q'):
+                print("Exiting...")
+                break
+            continue
+
+        frame = packet["frame"]
+        frame_result = packet["frame_result"]
+        current = packet["settings"]
+        minio_enabled = current["minio_enabled"]
+
+        # Headless: nothing is drawn unless an alert or save needs the annotated image
+        display_frame = None if headless else render(packet)
+
+        if packet["fall_events"] and minio_enabled == 1:
+            if display_frame is None:
+                display_frame = render(packet)
+            # Auto-upload to MinIO once per fall event (handled by the persistence stage)
+            alert_time = time.time()
+            if clips is not None:
+                clips.trigger({"time": alert_time, "events": [event._asdict() for event in packet["fall_events"]]},
+                              packet["fall_events"][0].timestamp)
+            persist_queue.put({"kind": "alert", "time": alert_time, "events": packet["fall_events"],
+                               "upload": clips is None,
+                               "display_frame": display_frame if headless else display_frame.copy()})
+            if not headless:
+                cv2.putText(display_frame, "MINIO ALERT SENT", (20, 70), 
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+
+        if not headless:
+            # Display the frame (stats are drawn on a copy so saved images stay clean)
+            cv2.imshow(window_name, metrics.draw_overlay(display_frame.copy()) if stats_overlay else display_frame)
+
+        if stream is not None and stream.wants_frame():
+            # Remote viewers get the same annotated frame (encoded on the stream server's thread)
+            if display_frame is None:
+                display_frame = render(packet)
+            stream.publish(display_frame)
 
         # Auto-Save Logic
         current_time = time.time()
         should_save = False
         
-        if auto_save == 1 and (current_time - last_save_time) > 0.5: # Throttle to max 2 saves per second
+        if current["auto_save"] == 1 and (current_time - last_save_time) > 0.5: # Throttle to max 2 saves per second
             should_save = True
 
-        # Handle key presses
-        key = cv2.waitKey(1) & 0xFF
-        if key == ord('q'):
-            print("Exiting...")
-            break
-        elif key == ord('s') or should_save:
-            if results and len(results) > 0:
-                res = results[0]
-                if hasattr(res, 'keypoints') and res.keypoints is not None and len(res.keypoints) > 0:
-                    # Get raw data [num_persons, 17, 3]
-                    raw_kp_data = res.keypoints.data.cpu().numpy().tolist()
-                    filtered_kp_data = []
-
-                    # Filter the data for JSON to match the visual output
-                    for person_kps in raw_kp_data:
-                        filtered_person = []
-                        for kpt in person_kps:
-                            x, y, c = kpt
-                            # If confidence is too low, zero out the point
-                            if c < kpt_conf_threshold:
-                                filtered_person.append([0.0, 0.0, c]) # Keep confidence but zero coordinates
-                            else:
-                                filtered_person.append([x, y, c])
-                        filtered_kp_data.append(filtered_person)
-                    
-                    save_timestamp = time.strftime("%Y%m%d-%H%M%S")
-                    ms = int((time.time() % 1) * 1000)
-                    base_filename = f"keypoints_{save_timestamp}_{ms:03d}"
-                    
-                    json_path = os.path.join(save_dir, f"{base_filename}.json")
-                    raw_path = os.path.join(save_dir, f"{base_filename}_raw.jpg")
-                    res_path = os.path.join(save_dir, f"{base_filename}_result.jpg")
-                    
-                    try:
-                        # 1. Save JSON Keypoints (Filtered)
-                        with open(json_path, 'w') as f:
-                            json.dump({
-                                "timestamp": save_timestamp,
-                                "ms": ms,
-                                "num_persons": len(res.keypoints),
-                                "kpt_conf_threshold": kpt_conf_threshold,
-                                "keypoints": filtered_kp_data
-                            }, f, indent=4)
-                        
-                        # 2. Save Raw Image
-                        cv2.imwrite(raw_path, frame)
-                        
-                        # 3. Save Result Image (Annotated)
-                        # Use display_frame which has the plots/IDs
-                        cv2.imwrite(res_path, display_frame)
-                        
-                        if not should_save: # Manual save feedback
-                            print(f"SUCCESS: Manual save to {base_filename}")
-                            feedback_frame = display_frame.copy()
-                            cv2.putText(feedback_frame, "SAVED!", (50, 50), 
-                                        cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 255, 0), 3)
-                            cv2.imshow(window_name, feedback_frame)
-                            cv2.waitKey(300)
-                        else:
-                            last_save_time = current_time
-                            # Minor blink for auto-save feedback
-                            cv2.circle(display_frame, (30, 30), 10, (0, 0, 255), -1)
-                            cv2.imshow(window_name, display_frame)
-
-                        # 4. Upload to MinIO if enabled
-                        if minio_enabled == 1:
-                            minio_storage.upload_json(json_path)
-                            minio_storage.upload_image(raw_path)
-                            minio_storage.upload_image(res_path)
-                            if not should_save:
-                                print(f"SUCCESS: Uploaded to MinIO")
-                    except Exception as e:
-                        print(f"ERROR saving data: {e}")
-                elif not should_save:
-                    print("SAVE FAILED: No people detected.")
+        # Manual save: 's' key, or {"cmd": "save"} on the control socket
+        manual_save = config.save_requested.is_set()
+        config.save_requested.clear()
+        if not headless:
+            # Handle key presses
+            key = cv2.waitKey(1) & 0xFF
+            if key == ord('q'):
+                print("Exiting...")
+                break
+            manual_save = manual_save or key == ord('s')
+
+        if manual_save or should_save:
+            if frame_result is not None and frame_result.has_keypoints and len(frame_result) > 0:
+                if display_frame is None:
+                    display_frame = render(packet)
+                # Disk writes and uploads happen on the persistence worker (on a compact snapshot,
+                # the pooled buffer gets reused by the inference worker)
+                persist_queue.put({
+                    "kind": "keypoints",
+                    "time": current_time,
+                    "manual": manual_save,
+                    "frame_result": frame_result.copy(),
+                    "frame": frame,
+                    "display_frame": display_frame,
+                    "kpt_conf_threshold": current["kpt_conf_threshold"],
+                    "minio_enabled": minio_enabled,
+                })
+                if should_save:
+                    last_save_time = current_time
+
+                if headless:
+                    pass
+                elif manual_save: # Manual save feedback
+                    feedback_frame = display_frame.copy()
+                    cv2.putText(feedback_frame, "SAVED!", (50, 50), 
+                                cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 255, 0), 3)
+                    cv2.imshow(window_name, feedback_frame)
+                    cv2.waitKey(300)
+                else:
+                    # Minor blink for auto-save feedback (on a copy: the queued job keeps the clean frame)
+                    blink_frame = display_frame.copy()
+                    cv2.circle(blink_frame, (30, 30), 10, (0, 0, 255), -1)
+                    cv2.imshow(window_name, blink_frame)
+            elif manual_save:
+                print("SAVE FAILED: No people detected.")
+
+    # Stop the pipeline: capture first, then let pending saves drain
+    stop_event.set()
+    config.stop()
+    capture.stop()
+    inference_worker.join(timeout=5.0)
+    persist_queue.close()
+    persist_worker.join()
+    if clips is not None:
+        # Finish a running clip before the uploader drains
+        clips.close()
+    uploader.close()
+    if recorder is not None:
+        recorder.close()
+    if event_index is not None:
+        # Clips and saves above are done: commit what is still queued
+        event_index.close()
+    if stream is not None:
+        stream.close()
+    metrics.stop()
+    if motion_gate is not None:
+        gate = motion_gate.stats
+        print(f"Motion gate: {gate['inferred']} inferred ({gate['refreshes']} forced refreshes), "
+              f"{gate['skipped']} skipped of {gate['frames']} frames.")
+    if roi_pose is not None:
+        roi = roi_pose.stats
+        print(f"ROI pose: {roi['full']} full-frame and {roi['roi']} crop pass(es) ({roi['crops']} crops, "
+              f"{roi['lost']} lost), {roi['pixels'] / max(roi['full_pixels'], 1):.0%} of full-frame input pixels.")
+    if render_queue.dropped or persist_queue.dropped:
+        print(f"Pipeline dropped {render_queue.dropped} frame(s) and {persist_queue.dropped} save job(s).")
 
     # Release the webcam and close windows
-    cap.release()
-    cv2.destroyAllWindows()
+    if not headless:
+        cv2.destroyAllWindows()
+    if inference_error:
+        raise inference_error[0]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='YOLO11 Live Pose Detection')
+    parser.add_argument('--source', type=str, default=None,
+                        help='Webcam index, video file or RTSP URL (default: config file, else 0)')
+    parser.add_argument('--config', type=str, default=None,
+                        help='YAML/JSON settings file (thresholds, source); reloaded on change in headless mode')
+    parser.add_argument('--headless', action='store_true',
+                        help='Run without a window (servers): no rendering, no GUI polling')
+    parser.add_argument('--control-port', type=int, default=None,
+                        help='Localhost TCP port for JSON control commands (headless mode)')
+    parser.add_argument('--conf', type=float, default=None, help='Confidence threshold')
+    parser.add_argument('--iou', type=float, default=None, help='IoU threshold')
+    parser.add_argument('--kpt-conf', type=float, default=None, help='Keypoint confidence threshold')
+    parser.add_argument('--auto-save', action='store_true', help='Enable automatic saving')
+    parser.add_argument('--minio', action='store_true', help='Enable MinIO uploads')
+    parser.add_argument('--queue-size', type=int, default=2, help='Frames buffered between inference and rendering')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='Serve per-stage timings and counters at http://127.0.0.1:PORT/metrics (Prometheus)')
+    parser.add_argument('--stats-overlay', action='store_true',
+                        help='Draw per-stage timings on the displayed frame')
+    parser.add_argument('--backend', type=str, default='pt', choices=BACKENDS,
+                        help='Inference runtime: PyTorch, or an ONNX / OpenVINO export (cached, CPU)')
+    parser.add_argument('--imgsz', type=int, default=640, help='Model input size (export size for onnx/openvino)')
+    parser.add_argument('--int8', action='store_true', help='INT8-quantize the OpenVINO export')
+    parser.add_argument('--motion-gate', type=str, default=None, choices=['diff', 'mog2'],
+                        help='Skip inference on static frames (frame differencing or MOG2 background model)')
+    parser.add_argument('--motion-area', type=float, default=0.002,
+                        help='Fraction of changed pixels that counts as motion (per region)')
+    parser.add_argument('--refresh-interval', type=int, default=30,
+                        help='Force inference every N frames even without motion')
+    parser.add_argument('--drop-policy', type=str, default=DROP_OLDEST, choices=DROP_POLICIES,
+                        help='What to do with frames when the renderer falls behind')
+    parser.add_argument('--clip-pre', type=float, default=5.0,
+                        help='Seconds of video before a fall alert kept in the clip (0 with --clip-post 0 = JPEG alerts)')
+    parser.add_argument('--clip-post', type=float, default=5.0, help='Seconds of video after the last alert')
+    parser.add_argument('--clip-fps', type=float, default=10.0, help='Frame rate of the ring buffer and clips')
+    parser.add_argument('--roi-pose', action='store_true',
+                        help='Run pose on crops around last frame\'s people instead of the full frame')
+    parser.add_argument('--roi-imgsz', type=int, default=320, help='Input size of the person crops')
+    parser.add_argument('--roi-padding', type=float, default=0.3, help='Crop padding as a fraction of the box size')
+    parser.add_argument('--detect-interval', type=int, default=10,
+                        help='Full-frame detection every N frames in --roi-pose mode (new people)')
+    parser.add_argument('--tracker', type=str, default=None,
+                        help='ByteTrack YAML (default: bytetrack.yaml, my_bytetrack.yaml with --roi-pose)')
+    parser.add_argument('--camera', type=str, default=None,
+                        help='Camera name recorded in the event index (default: config file, else the source)')
+    parser.add_argument('--event-db', type=str, default='d:/06-code/yolo/yolo-project/output/keypoints/events.db',
+                        help='SQLite index of saves / alerts / clips (query with event_index.py); "" disables it')
+    parser.add_argument('--stream-port', type=int, default=None,
+                        help='Serve the annotated stream as MJPEG at http://HOST:PORT/ (viewers pick ?width=&fps=)')
+    parser.add_argument('--stream-host', type=str, default='127.0.0.1',
+                        help='Address of the stream server (0.0.0.0 to watch from other machines)')
+    parser.add_argument('--stream-fps', type=float, default=15.0, help='Highest frame rate a viewer can get')
+    parser.add_argument('--stream-quality', type=int, default=80, help='Default JPEG quality of the stream')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    # Exported runtimes are built (or loaded from the export cache) on the background load thread
+    model.configure(backend=args.backend, imgsz=args.imgsz, int8=args.int8)
+    # Metrics cost nothing unless the endpoint or the overlay asks for them
+    metrics = Metrics() if args.metrics_port or args.stats_overlay else None
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+    config = LiveConfig(POSE_DEFAULTS, path=args.config, control_port=args.control_port,
+                        static_keys=("source", "motion_regions", "camera"))
+    # Command line values win over the config file at startup
+    overrides = {"conf": args.conf, "iou": args.iou, "kpt_conf_threshold": args.kpt_conf,
+                 "auto_save": 1 if args.auto_save else None, "minio_enabled": 1 if args.minio else None}
+    try:
+        config.update(**{k: v for k, v in overrides.items() if v is not None})
+    except ValueError as e:
+        raise SystemExit(f"Error: invalid setting {e}")
+
+    source = args.source if args.source is not None else config.static.get("source", 0)
+    motion_gate = None
+    if args.motion_gate:
+        # Per-region thresholds: config file "motion_regions: [[x1, y1, x2, y2, area], ...]" (normalized)
+        motion_gate = MotionGate(area_thresh=args.motion_area, regions=config.static.get("motion_regions"),
+                                 refresh_interval=args.refresh_interval, method=args.motion_gate)
+    roi_pose = None
+    if args.roi_pose:
+        if args.backend != 'pt' and args.roi_imgsz != args.imgsz:
+            # Exports have a static input shape: crops at another size cannot run on them
+            raise SystemExit(f"Error: --roi-pose runs crops at --roi-imgsz {args.roi_imgsz}, but the {args.backend} "
+                             f"export has a fixed input size of {args.imgsz}; use --backend pt")
+        roi_pose = RoiPoseRunner(model, tracker=args.tracker or DEFAULT_TRACKER_CONFIG, roi_imgsz=args.roi_imgsz,
+                                 padding=args.roi_padding, detect_interval=args.detect_interval)
+    camera = args.camera or config.static.get("camera") or str(source)
+    event_index = EventIndex(args.event_db) if args.event_db else None
+    stream = None
+    if args.stream_port:
+        stream = StreamServer(args.stream_port, host=args.stream_host, quality=args.stream_quality,
+                              max_fps=args.stream_fps, metrics=metrics or NULL_METRICS).start()
+    start_live_pose(parse_source(str(source)), queue_size=args.queue_size, drop_policy=args.drop_policy,
+                    headless=args.headless, config=config, motion_gate=motion_gate, metrics=metrics,
+                    stats_overlay=args.stats_overlay, clip_pre=args.clip_pre, clip_post=args.clip_post,
+                    clip_fps=args.clip_fps, roi_pose=roi_pose, event_index=event_index, camera=camera,
+                    stream=stream, tracker=args.tracker or "bytetrack.yaml")
 
 if __name__ == "__main__":
-    start_live_pose()
+    main()
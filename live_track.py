@@ -1,77 +1,134 @@
 import cv2
-from ultralytics import YOLO
-import os
+import time
+import argparse
+from metrics import Metrics, NULL_METRICS
+from live_config import LiveConfig, install_signal_handlers, is_live_source, parse_source
+from model_export import BACKENDS
+from model_registry import get_model
+from motion_gate import MotionGate
+from pipeline_utils import LatestFrameCapture
+from tracking_utils import DEFAULT_TRACKER_CONFIG, StreamTracker, load_tracker_config
 
 # Updated to use a general detection model to support "bottle" and other objects
 # You can change this to 'yolo11n-pose.pt' for pose-only tracking
 model_path = 'd:/06-code/yolo/yolo-project/models/yolo11n.pt'
-if not os.path.exists(model_path):
-    print("Model not found locally, using online version...")
-    model = YOLO('yolo11n.pt')
-else:
-    model = YOLO(model_path)
+# Loaded lazily: the start_* functions kick off loading + warm-up in the background
+model = get_model(model_path, fallback='yolo11n.pt')
 
 def nothing(x):
     pass
 
-def start_live_track():
+TRACK_DEFAULTS = {"conf": 0.25, "iou": 0.45}
+
+def start_live_track(source=0, headless=False, config=None, report_interval=10.0,
+                     tracker=DEFAULT_TRACKER_CONFIG, motion_gate=None, metrics=None, stats_overlay=False):
+    """
+    Runs ByteTrack on a live source.
+    headless=True skips the window, trackbars and plotting entirely: thresholds come from
+    `config` (a LiveConfig reloaded from its file / control socket) and a short track summary
+    is printed every report_interval seconds. SIGINT/SIGTERM stop the loop cleanly.
+    motion_gate (a MotionGate) skips tracking on static frames and reuses the last results.
+    metrics (a Metrics) times capture / preprocess / inference / track / render and counts frames;
+    stats_overlay=True draws the timings on the displayed frame.
+    """
+    metrics = metrics or NULL_METRICS
+    # Load + warm up the model while the camera(s) open
+    model.start()
+    if config is None:
+        config = LiveConfig(TRACK_DEFAULTS)
+    stop_event = config.stop_event
+    install_signal_handlers(stop_event)
+
     # 0 is usually the default webcam
-    cap = cv2.VideoCapture(0)
+    cap = cv2.VideoCapture(source)
 
     if not cap.isOpened():
-        print("Error: Could not open webcam.")
+        print(f"Error: Could not open video source {source}.")
         return
 
-    # Create a window for trackbars
     window_name = "YOLO11 ByteTrack Live"
-    cv2.namedWindow(window_name)
-    
-    # Create trackbars for confidence and IoU
-    cv2.createTrackbar("Confidence", window_name, 25, 100, nothing)
-    cv2.createTrackbar("IoU", window_name, 45, 100, nothing)
-    
-    # Crucial: Give the GUI time to initialize the window
-    cv2.waitKey(1)
-
-    print("Press 'q' to exit the live stream.")
-
-    while True:
+    if headless:
+        config.start()
+        print("Running headless. Stop with Ctrl+C / SIGTERM or {\"cmd\": \"stop\"} on the control socket.")
+    else:
+        # Create a window for trackbars
+        cv2.namedWindow(window_name)
+
+        # Create trackbars for confidence and IoU
+        cv2.createTrackbar("Confidence", window_name, int(config.settings["conf"] * 100), 100, nothing)
+        cv2.createTrackbar("IoU", window_name, int(config.settings["iou"] * 100), 100, nothing)
+
+        # Crucial: Give the GUI time to initialize the window
+        cv2.waitKey(1)
+
+        print("Press 'q' to exit the live stream.")
+
+    frames = 0
+    track_ids = set()
+    last_report = time.time()
+    results = None
+
+    while not stop_event.is_set():
         # Read a frame from the webcam
-        success, frame = cap.read()
+        with metrics.span("capture"):
+            success, frame = cap.read()
         if not success:
             print("Failed to grab frame.")
             break
 
-        # Double check if window still exists before getting trackbar position
-        # This prevents the "Null pointer" error if the user closes the window manually
-        try:
-            if cv2.getWindowProperty(window_name, cv2.WND_PROP_VISIBLE) < 1:
-                print("Window closed by user.")
-                break
-            
-            conf = cv2.getTrackbarPos("Confidence", window_name) / 100.0
-            iou = cv2.getTrackbarPos("IoU", window_name) / 100.0
-        except cv2.error:
-            # Fallback if window properties can't be read
-            conf, iou = 0.25, 0.45
-
-        # Run ByteTrack tracking on the frame
-        # tracker="bytetrack.yaml" enables the ByteTrack algorithm
-        # persist=True maintains IDs across frames
-        results = model.track(
-            source=frame, 
-            conf=conf, 
-            iou=iou, 
-            persist=True,
-            tracker="bytetrack.yaml",
-            show=False, 
-            verbose=False
-        )
+        if not headless:
+            # Double check if window still exists before getting trackbar position
+            # This prevents the "Null pointer" error if the user closes the window manually
+            try:
+                if cv2.getWindowProperty(window_name, cv2.WND_PROP_VISIBLE) < 1:
+                    print("Window closed by user.")
+                    break
+
+                config.update(conf=cv2.getTrackbarPos("Confidence", window_name) / 100.0,
+                              iou=cv2.getTrackbarPos("IoU", window_name) / 100.0)
+            except cv2.error:
+                # Fallback if window properties can't be read: keep the previous settings
+                pass
+        current = config.get()
+        metrics.inc("frames")
+
+        if motion_gate is None or motion_gate.check(frame) or results is None:
+            # Run ByteTrack tracking on the frame
+            # tracker=my_bytetrack.yaml holds the project's ByteTrack tuning
+            # persist=True maintains IDs across frames
+            start = time.perf_counter()
+            results = model.track(
+                source=frame, 
+                conf=current["conf"], 
+                iou=current["iou"], 
+                imgsz=model.imgsz,
+                persist=True,
+                tracker=tracker,
+                show=False, 
+                verbose=False
+            )
+            metrics.observe_predict(results, time.perf_counter() - start)
+
+        if headless:
+            frames += 1
+            if results and results[0].boxes is not None and results[0].boxes.id is not None:
+                track_ids.update(results[0].boxes.id.int().tolist())
+            if time.time() - last_report >= report_interval:
+                elapsed = time.time() - last_report
+                gate = f", motion gate {motion_gate.stats}" if motion_gate is not None else ""
+                print(f"{frames / elapsed:.1f} FPS, {len(track_ids)} track(s) seen in the last {elapsed:.0f}s{gate}")
+                frames = 0
+                track_ids.clear()
+                last_report = time.time()
+            continue
 
         # Plot the results on the frame
         if results and len(results) > 0:
             # Plot will now include labels for any detected COCO objects (bottles, people, etc.)
-            annotated_frame = results[0].plot()
+            with metrics.span("render"):
+                annotated_frame = results[0].plot()
+            if stats_overlay:
+                metrics.draw_overlay(annotated_frame)
             cv2.imshow(window_name, annotated_frame)
         else:
             cv2.imshow(window_name, frame)
@@ -81,8 +138,190 @@ def start_live_track():
             break
 
     # Release the webcam and close windows
+    config.stop()
+    metrics.stop()
     cap.release()
-    cv2.destroyAllWindows()
+    if not headless:
+        cv2.destroyAllWindows()
+
+def start_multi_track(sources, headless=True, config=None, report_interval=10.0,
+                      tracker=DEFAULT_TRACKER_CONFIG, batch_wait=0.01, motion_gates=None, metrics=None):
+    """
+    Serves several cameras (e.g. RTSP) from one process and one model copy.
+    - Each source gets a decoder thread with latest-frame semantics; cameras and stream URLs
+      reconnect when they drop, video files end at EOF (tracking stops once every source ended).
+    - The scheduler gathers the newest frame of every stream that has one (waiting at most
+      batch_wait seconds for stragglers) and runs a single batched forward pass.
+    - Every stream keeps its own ByteTrack state configured from `tracker`.
+    - motion_gates (one MotionGate per stream) leave static streams out of the batch.
+    - metrics (a Metrics) gets capture / preprocess / inference / postprocess / track spans,
+      frame and batch counters, and reconnects.
+    """
+    metrics = metrics or NULL_METRICS
+    # Load + warm up the model while the camera(s) open
+    model.start()
+    if config is None:
+        config = LiveConfig(TRACK_DEFAULTS)
+    stop_event = config.stop_event
+    install_signal_handlers(stop_event)
+
+    tracker_cfg = load_tracker_config(tracker)
+    readers = [LatestFrameCapture(src, reconnect=is_live_source(src), metrics=metrics).start() for src in sources]
+    trackers = [StreamTracker(tracker_cfg) for _ in sources]
+    last_seq = [0] * len(sources)
+    reconnects = [0] * len(sources)
+    frames = [0] * len(sources)
+    track_ids = [set() for _ in sources]
+    batches = 0
+    last_report = time.time()
+
+    if headless:
+        config.start()
+        print(f"Tracking {len(sources)} stream(s) headless. Stop with Ctrl+C / SIGTERM.")
+    else:
+        print("Press 'q' to exit the live streams.")
+
+    while not stop_event.is_set():
+        # Gather one frame per ready stream; give slower streams a short window to join the batch
+        batch_idx, batch_frames = [], []
+        deadline = time.time() + batch_wait
+        while not stop_event.is_set():
+            for i, reader in enumerate(readers):
+                if i in batch_idx:
+                    continue
+                frame, seq, _ = reader.read(last_seq[i], timeout=0)
+                if frame is not None:
+                    last_seq[i] = seq
+                    if motion_gates is not None and not motion_gates[i].check(frame):
+                        continue  # static scene: keep the last tracks for this stream
+                    batch_idx.append(i)
+                    batch_frames.append(frame)
+            if not batch_idx and all(r.failed for r in readers):
+                print("All streams ended.")
+                stop_event.set()
+                break
+            # Ended files never deliver again, so don't wait for them
+            if len(batch_idx) == sum(not r.failed for r in readers) or time.time() >= deadline:
+                break
+            time.sleep(0.002)
+        if not batch_frames:
+            continue
+
+        current = config.get()
+        # One forward pass for the whole batch; tracking is applied per stream afterwards
+        start = time.perf_counter()
+        results = model.predict(source=batch_frames, conf=current["conf"], iou=current["iou"],
+                                imgsz=model.imgsz, verbose=False)
+        metrics.observe_predict(results, time.perf_counter() - start, tracked=False)
+        metrics.inc("batches")
+        metrics.inc("frames", len(batch_frames))
+        batches += 1
+
+        for i, result in zip(batch_idx, results):
+            if readers[i].reconnects != reconnects[i]:
+                # A reconnected camera starts a new track history
+                reconnects[i] = readers[i].reconnects
+                trackers[i].reset()
+            with metrics.span("track"):
+                tracked = trackers[i].update(result)
+            frames[i] += 1
+            if tracked.boxes is not None and tracked.boxes.id is not None:
+                track_ids[i].update(tracked.boxes.id.int().tolist())
+            if not headless:
+                with metrics.span("render"):
+                    annotated_frame = tracked.plot()
+                cv2.imshow(f"YOLO11 ByteTrack Live [{i}]", annotated_frame)
+
+        if not headless and cv2.waitKey(1) & 0xFF == ord('q'):
+            break
+
+        if time.time() - last_report >= report_interval:
+            elapsed = time.time() - last_report
+            print(f"{batches / elapsed:.1f} batches/s, avg batch {sum(frames) / max(batches, 1):.1f}")
+            for i, src in enumerate(sources):
+                gate = f", motion gate {motion_gates[i].stats}" if motion_gates is not None else ""
+                print(f"  [{i}] {src}: {frames[i] / elapsed:.1f} FPS, {len(track_ids[i])} track(s), "
+                      f"{readers[i].reconnects} reconnect(s){gate}")
+                frames[i] = 0
+                track_ids[i].clear()
+            batches = 0
+            last_report = time.time()
+
+    config.stop()
+    metrics.stop()
+    for reader in readers:
+        reader.stop()
+    if not headless:
+        cv2.destroyAllWindows()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='YOLO11 ByteTrack Live')
+    parser.add_argument('--source', type=str, action='append', default=None,
+                        help='Webcam index, video file or RTSP URL; repeat for multi-camera batched tracking '
+                             '(default: config file "source"/"sources", else 0)')
+    parser.add_argument('--tracker', type=str, default=DEFAULT_TRACKER_CONFIG,
+                        help='ByteTrack config YAML')
+    parser.add_argument('--batch-wait', type=float, default=0.01,
+                        help='Seconds to wait for more streams before running a batch (multi-camera)')
+    parser.add_argument('--config', type=str, default=None,
+                        help='YAML/JSON settings file (conf, iou, source); reloaded on change in headless mode')
+    parser.add_argument('--headless', action='store_true',
+                        help='Run without a window (servers): no rendering, no GUI polling')
+    parser.add_argument('--control-port', type=int, default=None,
+                        help='Localhost TCP port for JSON control commands (headless mode)')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='Serve per-stage timings and counters at http://127.0.0.1:PORT/metrics (Prometheus)')
+    parser.add_argument('--stats-overlay', action='store_true',
+                        help='Draw per-stage timings on the displayed frame')
+    parser.add_argument('--backend', type=str, default='pt', choices=BACKENDS,
+                        help='Inference runtime: PyTorch, or an ONNX / OpenVINO export (cached, CPU)')
+    parser.add_argument('--imgsz', type=int, default=640, help='Model input size (export size for onnx/openvino)')
+    parser.add_argument('--int8', action='store_true', help='INT8-quantize the OpenVINO export')
+    parser.add_argument('--motion-gate', type=str, default=None, choices=['diff', 'mog2'],
+                        help='Skip inference on static frames (frame differencing or MOG2 background model)')
+    parser.add_argument('--motion-area', type=float, default=0.002,
+                        help='Fraction of changed pixels that counts as motion (per region)')
+    parser.add_argument('--refresh-interval', type=int, default=30,
+                        help='Force inference every N frames even without motion')
+    parser.add_argument('--conf', type=float, default=None, help='Confidence threshold')
+    parser.add_argument('--iou', type=float, default=None, help='IoU threshold')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    # Exported runtimes are built (or loaded from the export cache) on the background load thread
+    model.configure(backend=args.backend, imgsz=args.imgsz, int8=args.int8)
+    # Metrics cost nothing unless the endpoint or the overlay asks for them
+    metrics = Metrics() if args.metrics_port or args.stats_overlay else None
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+    config = LiveConfig(TRACK_DEFAULTS, path=args.config, control_port=args.control_port,
+                        static_keys=("source", "sources", "motion_regions"))
+    # Command line values win over the config file at startup
+    try:
+        config.update(**{k: v for k, v in {"conf": args.conf, "iou": args.iou}.items() if v is not None})
+    except ValueError as e:
+        raise SystemExit(f"Error: invalid setting {e}")
+
+    sources = args.source
+    if sources is None:
+        sources = config.static.get("sources") or [config.static.get("source", 0)]
+    sources = [parse_source(str(src)) for src in sources]
+
+    def make_gate():
+        if not args.motion_gate:
+            return None
+        # Per-region thresholds: config file "motion_regions: [[x1, y1, x2, y2, area], ...]" (normalized)
+        return MotionGate(area_thresh=args.motion_area, regions=config.static.get("motion_regions"),
+                          refresh_interval=args.refresh_interval, method=args.motion_gate)
+
+    if len(sources) > 1:
+        motion_gates = [make_gate() for _ in sources] if args.motion_gate else None
+        start_multi_track(sources, headless=args.headless, config=config, tracker=args.tracker,
+                          batch_wait=args.batch_wait, motion_gates=motion_gates, metrics=metrics)
+    else:
+        start_live_track(sources[0], headless=args.headless, config=config, tracker=args.tracker,
+                         motion_gate=make_gate(), metrics=metrics, stats_overlay=args.stats_overlay)
 
 if __name__ == "__main__":
-    start_live_track()
+    main()
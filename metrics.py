@@ -0,0 +1,193 @@
+import time
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class _Span:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Metrics:
+    def __init__(self, enabled=True, prefix="yolo", window=512):
+        """
+        In-process metrics for the live loops.
+        - span(name): context manager timing a pipeline stage (seconds, last `window` samples kept
+          for quantiles plus running count/sum).
+        - inc(name): monotonically increasing counter.
+        - gauge(name, fn): value read from fn() only when metrics are scraped (queue depths etc.),
+          so it costs nothing per frame.
+        With enabled=False every call returns immediately (see NULL_METRICS).
+        """
+        self.enabled = enabled
+        self.prefix = prefix
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._totals = {}
+        self._counters = {}
+        self._gauges = {}
+        self._server = None
+        self.started = time.time()
+
+    def span(self, name):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def observe(self, name, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.window)
+                self._totals[name] = [0, 0.0]
+            samples.append(seconds)
+            totals = self._totals[name]
+            totals[0] += 1
+            totals[1] += seconds
+
+    def observe_predict(self, results, elapsed, tracked=True):
+        """
+        Splits one model.predict / model.track call into preprocess / inference / postprocess
+        (ultralytics' own per-image timings); for model.track the remainder is attributed to tracking.
+        """
+        if not self.enabled or not results:
+            return
+        speed = results[0].speed or {}
+        parts = 0.0
+        for stage in ("preprocess", "inference", "postprocess"):
+            if speed.get(stage) is not None:
+                seconds = speed[stage] * len(results) / 1000.0
+                self.observe(stage, seconds)
+                parts += seconds
+        if tracked:
+            self.observe("track", max(elapsed - parts, 0.0))
+
+    def inc(self, name, value=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def gauge(self, name, fn):
+        if self.enabled:
+            self._gauges[name] = fn
+
+    def snapshot(self):
+        """Current values: {"spans": {name: {count, sum, p50, p95, p99, mean}}, "counters", "gauges"}."""
+        with self._lock:
+            samples = {name: np.array(values) for name, values in self._samples.items() if values}
+            totals = {name: list(t) for name, t in self._totals.items()}
+            counters = dict(self._counters)
+        spans = {}
+        for name, values in samples.items():
+            stats = {"count": totals[name][0], "sum": totals[name][1], "mean": float(values.mean())}
+            for q, value in zip(QUANTILES, np.quantile(values, QUANTILES)):
+                stats[f"p{int(q * 100)}"] = float(value)
+            spans[name] = stats
+        gauges = {}
+        for name, fn in list(self._gauges.items()):
+            try:
+                gauges[name] = float(fn())
+            except Exception:
+                continue
+        return {"spans": spans, "counters": counters, "gauges": gauges, "uptime": time.time() - self.started}
+
+    def render_prometheus(self):
+        """Prometheus text exposition format (summaries, counters, gauges)."""
+        snap = self.snapshot()
+        p = self.prefix
+        lines = [f"# TYPE {p}_stage_seconds summary"]
+        for name, stats in sorted(snap["spans"].items()):
+            for q in QUANTILES:
+                lines.append(f'{p}_stage_seconds{{stage="{name}",quantile="{q}"}} {stats[f"p{int(q * 100)}"]:.6f}')
+            lines.append(f'{p}_stage_seconds_sum{{stage="{name}"}} {stats["sum"]:.6f}')
+            lines.append(f'{p}_stage_seconds_count{{stage="{name}"}} {stats["count"]}')
+        for name, value in sorted(snap["counters"].items()):
+            lines.append(f"# TYPE {p}_{name}_total counter")
+            lines.append(f"{p}_{name}_total {value}")
+        for name, value in sorted(snap["gauges"].items()):
+            lines.append(f"# TYPE {p}_{name} gauge")
+            lines.append(f"{p}_{name} {value:g}")
+        lines.append(f"# TYPE {p}_uptime_seconds gauge")
+        lines.append(f"{p}_uptime_seconds {snap['uptime']:.1f}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="127.0.0.1"):
+        """Serves GET /metrics on a background thread."""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = metrics.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass  # keep scrapes out of the console
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        print(f"Metrics endpoint: http://{host}:{port}/metrics")
+        return self
+
+    def draw_overlay(self, frame, stages=None, origin=(10, 70)):
+        """Draws mean ms per stage (and counters) below the alert banner area."""
+        if not self.enabled:
+            return frame
+        import cv2
+        snap = self.snapshot()
+        lines = [f"{name}: {stats['mean'] * 1000:.1f} ms" for name, stats in snap["spans"].items()
+                 if stages is None or name in stages]
+        lines += [f"{name}: {value}" for name, value in snap["counters"].items()]
+        x, y = origin
+        for i, text in enumerate(lines):
+            pos = (x, y + 18 * i)
+            cv2.putText(frame, text, pos, cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0, 0, 0), 3)
+            cv2.putText(frame, text, pos, cv2.FONT_HERSHEY_SIMPLEX, 0.45, (255, 255, 0), 1)
+        return frame
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+NULL_METRICS = Metrics(enabled=False)
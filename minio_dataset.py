@@ -0,0 +1,343 @@
+import os
+import io
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+import yaml
+from ultralytics.data import build as data_build
+from ultralytics.data import utils as data_utils
+from ultralytics.data.dataset import YOLODataset
+from ultralytics.data.utils import IMG_FORMATS, img2label_paths
+
+DEFAULT_CACHE_DIR = os.environ.get("YOLO_DATA_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "yolo-minio"))
+DEFAULT_MAX_BYTES = 50 << 30
+HEADER_BYTES = 64 << 10
+
+
+def _is_image(name):
+    return name.rpartition(".")[-1].lower() in IMG_FORMATS
+
+
+class DiskLRUCache:
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Size-bounded on-disk object cache shared by every job on the node (same root).
+        Files are written atomically (temp file + rename), reads bump the mtime, and when the images
+        under root exceed max_bytes the least recently used ones are deleted. Labels, list files and
+        ultralytics' label caches are small and never evicted.
+        """
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self._bytes = sum(size for _, size, _ in self._scan())
+
+    def _scan(self):
+        for folder, _, names in os.walk(self.root):
+            for name in names:
+                if _is_image(name):
+                    path = os.path.join(folder, name)
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue  # evicted by another job meanwhile
+                    yield path, st.st_size, st.st_mtime
+
+    def touch(self, path):
+        """Marks a cached file as recently used. Returns False if it is not (or no longer) cached."""
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def put(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        if _is_image(path):
+            with self._lock:
+                self._bytes += len(data)
+                if self._bytes > self.max_bytes:
+                    self._evict()
+
+    def _evict(self):
+        # Re-scan: other jobs on the node share the directory, so the running total is only an estimate
+        files = sorted(self._scan(), key=lambda f: f[2])
+        total = sum(size for _, size, _ in files)
+        target = int(self.max_bytes * 0.9)
+        for path, size, _ in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+        self._bytes = total
+
+
+class MinioDatasetSource:
+    def __init__(self, bucket, prefix, cache, endpoint="127.0.0.1:9000", access_key="minioadmin",
+                 secret_key="minioadmin", secure=False, workers=16, client=None):
+        """
+        One dataset split stored in MinIO under <bucket>/<prefix> (images/...) with YOLO labels in the
+        matching labels/... prefix, mirrored on demand into a DiskLRUCache at <root>/<bucket>/<key>.
+        - list() pages through the objects once and syncs the labels up front (they are small; unchanged
+          ETags are not downloaded again), image shapes come from a ranged read of the first HEADER_BYTES.
+        - start_prefetch() downloads images in the background on `workers` pooled connections, up to
+          what fits in the cache; ensure(path) fetches an image right away if it is not there yet.
+        Picklable for dataloader workers (connections and threads are re-created per process).
+        """
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.cache = cache
+        self.endpoint = endpoint
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.secure = secure
+        self.workers = workers
+        self.objects = {}
+        self.labels = {}
+        self.stats = {"hits": 0, "fetched": 0, "fetched_bytes": 0, "header_reads": 0}
+        self._client = client
+        self._pool = None
+        self._pending = {}
+        self._pid = os.getpid()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state.update(_client=None, _pool=None, _pending={})
+        return state
+
+    @property
+    def client(self):
+        if self._client is None or self._pid != os.getpid():
+            import urllib3
+            from minio import Minio
+            # One pooled connection per download thread
+            http = urllib3.PoolManager(maxsize=self.workers, retries=urllib3.Retry(total=3, backoff_factor=0.2),
+                                       timeout=urllib3.Timeout(connect=5, read=60))
+            self._client = Minio(self.endpoint, access_key=self.access_key, secret_key=self.secret_key,
+                                 secure=self.secure, http_client=http)
+            self._pid = os.getpid()
+        return self._client
+
+    @property
+    def pool(self):
+        if self._pool is None or self._pid != os.getpid():
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="minio-data")
+            self._pending = {}
+        return self._pool
+
+    def local_path(self, key):
+        return os.path.join(self.cache.root, self.bucket, *key.split("/"))
+
+    def key(self, path):
+        return os.path.relpath(path, os.path.join(self.cache.root, self.bucket)).replace(os.sep, "/")
+
+    def _get(self, key, offset=0, length=0):
+        response = self.client.get_object(self.bucket, key, offset=offset, length=length)
+        try:
+            return response.read()
+        finally:
+            response.close()
+            response.release_conn()
+
+    def list(self):
+        """Lists the split's images and syncs its label files. Returns the local image paths."""
+        start = time.time()
+        for obj in self.client.list_objects(self.bucket, prefix=self.prefix + "/", recursive=True):
+            if _is_image(obj.object_name):
+                self.objects[obj.object_name] = (obj.etag, obj.size)
+        images = sorted(self.local_path(key) for key in self.objects)
+
+        # Labels follow ultralytics' layout (/images/ -> /labels/, .txt); images without one are backgrounds
+        wanted = set(img2label_paths(images))
+        label_prefix = self.key(img2label_paths([self.local_path(self.prefix + "/x.jpg")])[0]).rpartition("/")[0]
+        for obj in self.client.list_objects(self.bucket, prefix=label_prefix + "/", recursive=True):
+            if self.local_path(obj.object_name) in wanted:
+                self.labels[obj.object_name] = obj.etag
+        manifest = self.local_path(label_prefix) + ".etags.json"
+        try:
+            with open(manifest) as f:
+                synced = json.load(f)
+        except (FileNotFoundError, ValueError):
+            synced = {}
+        stale = [key for key, etag in self.labels.items()
+                 if synced.get(key) != etag or not os.path.exists(self.local_path(key))]
+        list(self.pool.map(lambda key: self.cache.put(self.local_path(key), self._get(key)), stale))
+        self.cache.put(manifest, json.dumps(self.labels).encode())
+        print(f"📋 minio://{self.bucket}/{self.prefix}: {len(images)} images, {len(self.labels)} labels "
+              f"({len(stale)} downloaded) in {time.time() - start:.1f}s")
+        return images
+
+    def fingerprint(self):
+        """Changes whenever an image or label object changes (ETags), independent of what is cached locally."""
+        h = hashlib.sha256()
+        for key in sorted(self.objects):
+            h.update(f"{key}:{self.objects[key][0]}\0".encode())
+        for key in sorted(self.labels):
+            h.update(f"{key}:{self.labels[key]}\0".encode())
+        return h.hexdigest()
+
+    def image_shape(self, path):
+        """(h, w) from the image header, without downloading the whole object."""
+        from PIL import Image
+        self.stats["header_reads"] += 1
+        key = self.key(path)
+        try:
+            im = Image.open(io.BytesIO(self._get(key, 0, HEADER_BYTES)))
+            w, h = data_utils.exif_size(im)
+        except Exception:
+            # Header larger than the ranged read (big EXIF blocks etc.): fall back to the full object
+            self.ensure(path)
+            w, h = data_utils.exif_size(Image.open(path))
+        return h, w
+
+    def _fetch(self, path):
+        data = self._get(self.key(path))
+        self.cache.put(path, data)
+        self.stats["fetched"] += 1
+        self.stats["fetched_bytes"] += len(data)
+        return path
+
+    def ensure(self, path):
+        """Makes sure `path` is in the local cache (waiting for an in-flight prefetch if there is one)."""
+        if self.cache.touch(path):
+            self.stats["hits"] += 1
+            return path
+        future = self._pending.get(path) if self._pid == os.getpid() else None
+        if future is not None and (future.running() or future.done()):
+            try:
+                future.result()
+                if os.path.exists(path):
+                    return path
+            except Exception:
+                pass  # retried below
+        elif future is not None:
+            future.cancel()  # still queued: fetch it now instead of waiting behind the queue
+        return self._fetch(path)
+
+    def start_prefetch(self, paths, budget=None):
+        """Queues background downloads in order, stopping at `budget` bytes (default 80% of the cache)."""
+        budget = int(self.cache.max_bytes * 0.8) if budget is None else budget
+        queued = 0
+        for path in paths:
+            size = self.objects.get(self.key(path), (None, 0))[1]
+            if queued + size > budget:
+                break
+            if not os.path.exists(path):
+                self._pending[path] = self.pool.submit(self._fetch, path)
+                queued += size
+        return queued
+
+
+@contextmanager
+def _remote_shapes(source):
+    """While ultralytics scans labels, read the shapes of not-yet-downloaded images from MinIO headers."""
+    original = data_utils.check_image
+
+    def check_image(im_file):
+        if os.path.exists(im_file):
+            return original(im_file)
+        return "", source.image_shape(im_file)
+
+    data_utils.check_image = check_image
+    try:
+        yield
+    finally:
+        data_utils.check_image = original
+
+
+class MinioYOLODataset(YOLODataset):
+    def __init__(self, *args, source=None, **kwargs):
+        """YOLODataset over a MinioDatasetSource: label scan from object headers, images fetched on first use."""
+        self.source = source
+        super().__init__(*args, **kwargs)
+
+    def get_cache_hash(self):
+        # Object ETags instead of local file stats: images come and go with the LRU cache
+        nc = self.data.get("bg_class_idx") or len(self.data["names"])
+        scan_args = (self.use_keypoints, nc, self.data.get("kpt_shape"), self.single_cls)
+        return hashlib.sha256(f"{self.source.fingerprint()}{scan_args}".encode()).hexdigest()
+
+    def cache_labels(self, path=Path("./labels.cache")):
+        with _remote_shapes(self.source):
+            return super().cache_labels(path)
+
+    def load_image(self, i, rect_mode=True, resize_short=False):
+        if self.ims[i] is None:
+            self.source.ensure(self.im_files[i])
+        return super().load_image(i, rect_mode, resize_short)
+
+
+def parse_minio_path(path):
+    """'minio://bucket/prefix' -> (bucket, prefix) or None for ordinary paths."""
+    if not isinstance(path, str) or not path.startswith("minio://"):
+        return None
+    bucket, _, prefix = path[len("minio://"):].partition("/")
+    return bucket, prefix.strip("/")
+
+
+def prepare_minio_dataset(data_yaml, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, workers=16):
+    """
+    For a dataset YAML whose `path` is minio://bucket/prefix (connection settings under an optional
+    `minio:` key), lists every split, syncs the labels and writes a local YAML whose splits are image
+    list files in the cache. Returns (local YAML path, {list file: MinioDatasetSource}).
+    """
+    with open(data_yaml) as f:
+        cfg = yaml.safe_load(f) or {}
+    bucket, prefix = parse_minio_path(cfg.get("path"))
+    conn = cfg.pop("minio", None) or {}
+    cache = DiskLRUCache(cache_dir, max_bytes)
+    local_root = os.path.join(cache.root, bucket, *prefix.split("/"))
+    os.makedirs(local_root, exist_ok=True)
+
+    sources = {}
+    for split in ("train", "val", "test"):
+        entry = cfg.get(split)
+        if not isinstance(entry, str):
+            continue
+        source = MinioDatasetSource(bucket, f"{prefix}/{entry}" if prefix else entry, cache, workers=workers, **conn)
+        list_path = os.path.join(local_root, f"{split}.txt")
+        with open(list_path, "w") as f:
+            f.write("\n".join(source.list()) + "\n")
+        cfg[split] = list_path
+        sources[os.path.abspath(list_path)] = source
+    cfg["path"] = local_root
+    local_yaml = os.path.join(local_root, "dataset.yaml")
+    with open(local_yaml, "w") as f:
+        yaml.safe_dump(cfg, f, sort_keys=False)
+    return local_yaml, sources
+
+
+def minio_trainer(base, sources):
+    """Trainer class (for model.train(trainer=...)) that builds MinioYOLODatasets for the MinIO splits."""
+    lock = threading.Lock()
+
+    class MinioTrainer(base):
+        def build_dataset(self, img_path, mode="train", batch=None):
+            source = sources.get(os.path.abspath(str(img_path)))
+            if source is None:
+                return super().build_dataset(img_path, mode, batch)
+            # build_yolo_dataset picks the class by name; swap in ours for this call only
+            with lock:
+                original = data_build.YOLODataset
+                data_build.YOLODataset = lambda *args, **kwargs: MinioYOLODataset(*args, source=source, **kwargs)
+                try:
+                    dataset = super().build_dataset(img_path, mode, batch)
+                finally:
+                    data_build.YOLODataset = original
+            if mode == "train":
+                queued = source.start_prefetch(dataset.im_files)
+                print(f"⬇️ Prefetching {queued / 2 ** 20:.0f} MiB of training images in the background")
+            return dataset
+
+    return MinioTrainer
@@ -1,12 +1,25 @@
 from minio import Minio
 import os
+import io
+import json
+import time
+import queue
+import threading
+import mimetypes
 import logging
+from metrics import NULL_METRICS
+
+# Default spool location (next to the project, independent of the working directory)
+DEFAULT_SPOOL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output", "minio_spool")
 
 class MinioStorage:
-    def __init__(self, endpoint="127.0.0.1:9000", access_key="minioadmin", secret_key="minioadmin", secure=False):
+    def __init__(self, endpoint="127.0.0.1:9000", access_key="minioadmin", secret_key="minioadmin", secure=False,
+                 background_init=False):
         """
-        Initialize MinIO client. 
+        Initialize MinIO client.
         Default credentials are 'minioadmin' for both user and password in standard Docker setups.
+        background_init=True runs the bucket check on a thread instead of blocking the caller;
+        uploads wait for it (up to init_timeout seconds) before sending.
         """
         self.client = Minio(
             endpoint,
@@ -15,7 +28,12 @@ class MinioStorage:
             secure=secure
         )
         self.bucket_name = "yolo-detections"
-        self._ensure_bucket()
+        self.init_timeout = 30.0
+        self._ready = threading.Event()
+        if background_init:
+            threading.Thread(target=self._ensure_bucket, name="minio-init", daemon=True).start()
+        else:
+            self._ensure_bucket()
 
     def _ensure_bucket(self):
         try:
@@ -24,12 +42,19 @@ class MinioStorage:
                 print(f"Created MinIO bucket: {self.bucket_name}")
         except Exception as e:
             print(f"Error connecting to MinIO: {e}")
+        finally:
+            self._ready.set()
+
+    def wait_ready(self, timeout=None):
+        """Waits for the initial bucket check to finish (successfully or not)."""
+        return self._ready.wait(self.init_timeout if timeout is None else timeout)
 
     def upload_file(self, file_path, object_name=None):
         """Uploads a file to the MinIO bucket."""
         if object_name is None:
             object_name = os.path.basename(file_path)
-        
+
+        self.wait_ready()
         try:
             self.client.fput_object(self.bucket_name, object_name, file_path)
             return True
@@ -37,8 +62,264 @@ class MinioStorage:
             print(f"Failed to upload {file_path} to MinIO: {e}")
             return False
 
+    def put_bytes(self, object_name, data, content_type=None):
+        """Uploads an in-memory buffer with put_object. Raises on failure."""
+        if content_type is None:
+            content_type = mimetypes.guess_type(object_name)[0] or "application/octet-stream"
+        self.wait_ready()
+        self.client.put_object(self.bucket_name, object_name, io.BytesIO(data), len(data),
+                               content_type=content_type)
+
+    def upload_bytes(self, object_name, data, content_type=None):
+        """Uploads an in-memory buffer to the MinIO bucket (no temporary file)."""
+        try:
+            self.put_bytes(object_name, data, content_type)
+            return True
+        except Exception as e:
+            print(f"Failed to upload {object_name} to MinIO: {e}")
+            return False
+
     def upload_json(self, json_path):
         return self.upload_file(json_path)
 
     def upload_image(self, image_path):
         return self.upload_file(image_path)
+
+
+class MinioUploader:
+    def __init__(self, storage, num_workers=2, max_queue=64, batch_size=8, max_retries=3,
+                 backoff=0.5, spool_dir=DEFAULT_SPOOL_DIR, spool_retry_interval=10.0, metrics=NULL_METRICS):
+        """
+        Background upload service on top of a MinioStorage.
+        - put_bytes / put_json / put_frame only enqueue work and never touch the network,
+          so they are safe to call from the frame loop.
+        - A pool of workers drains the bounded queue (up to batch_size jobs per wake-up),
+          encodes frames and uploads with put_object, retrying with exponential backoff.
+        - When the queue is full (e.g. workers stuck in backoff during an outage), jobs go to an
+          overflow thread that encodes and spools them instead of dropping them ("overflowed").
+        - Objects that still fail are spooled to spool_dir and re-sent once MinIO is reachable
+          (also those left by an earlier run; counted as "replayed").
+        - close() flushes everything still queued before returning.
+        Each put_object is recorded as the "upload" span of `metrics`; `stats` and the queue depth
+        are exposed as gauges.
+        """
+        self.storage = storage
+        self.metrics = metrics
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.batch_size = batch_size
+        self.spool_dir = spool_dir
+        self.spool_retry_interval = spool_retry_interval
+        os.makedirs(spool_dir, exist_ok=True)
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        # Unbounded, but drained straight to disk by its own thread
+        self._overflow = queue.Queue()
+        self._stop = threading.Event()
+        self._spool_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self.stats = {"queued": 0, "uploaded": 0, "retries": 0, "spooled": 0, "replayed": 0,
+                      "overflowed": 0, "failed": 0}
+
+        self._workers = [threading.Thread(target=self._worker, name=f"minio-upload-{i}", daemon=True)
+                         for i in range(num_workers)]
+        self._spool_thread = threading.Thread(target=self._spool_loop, name="minio-spool", daemon=True)
+        self._overflow_thread = threading.Thread(target=self._overflow_loop, name="minio-overflow", daemon=True)
+        for w in self._workers:
+            w.start()
+        self._spool_thread.start()
+        self._overflow_thread.start()
+        for key in self.stats:
+            metrics.gauge(f"upload_{key}", lambda key=key: self.stats[key])
+        metrics.gauge("upload_queue_depth", self.pending)
+
+    # --- Producer API (hot path) ---
+
+    def put_bytes(self, object_name, data, content_type=None):
+        """Queues raw bytes for upload (spooled if the queue is full). Returns False after close()."""
+        return self._enqueue({"object_name": object_name, "data": data, "content_type": content_type})
+
+    def put_json(self, object_name, obj):
+        """Queues a JSON-serialisable object; serialisation happens on the worker."""
+        return self._enqueue({"object_name": object_name, "json": obj,
+                              "content_type": "application/json"})
+
+    def put_frame(self, object_name, frame, ext=".jpg", quality=90):
+        """Queues a BGR numpy frame; JPEG/PNG encoding happens on the worker."""
+        return self._enqueue({"object_name": object_name, "frame": frame, "ext": ext,
+                              "quality": quality, "content_type": mimetypes.guess_type("x" + ext)[0]})
+
+    def _enqueue(self, job):
+        if self._stop.is_set():
+            return False
+        try:
+            self._queue.put_nowait(job)
+            self._count("queued")
+            return True
+        except queue.Full:
+            # Don't lose it: the overflow thread spools it and the spool loop re-sends it later
+            self._overflow.put(job)
+            self._count("overflowed")
+            return True
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def pending(self):
+        return self._queue.qsize() + self._overflow.qsize()
+
+    # --- Workers ---
+
+    @staticmethod
+    def _encode(job):
+        if "data" in job:
+            return job["data"]
+        if "json" in job:
+            return json.dumps(job["json"], separators=(",", ":")).encode("utf-8")
+        import cv2
+        params = [cv2.IMWRITE_JPEG_QUALITY, job["quality"]] if job["ext"] in (".jpg", ".jpeg") else []
+        ok, buf = cv2.imencode(job["ext"], job["frame"], params)
+        if not ok:
+            raise ValueError(f"Could not encode frame for {job['object_name']}")
+        return buf.tobytes()
+
+    def _upload_with_retry(self, object_name, data, content_type):
+        delay = self.backoff
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.metrics.span("upload"):
+                    self.storage.put_bytes(object_name, data, content_type)
+                self._count("uploaded")
+                return True
+            except Exception as e:
+                if attempt == self.max_retries:
+                    print(f"Failed to upload {object_name} to MinIO after {attempt + 1} attempt(s): {e}")
+                    return False
+                self._count("retries")
+                # Don't sleep through a shutdown: remaining jobs will be spooled instead
+                if self._stop.wait(delay):
+                    return False
+                delay *= 2
+        return False
+
+    def _worker(self):
+        while True:
+            try:
+                batch = [self._queue.get(timeout=0.2)]
+            except queue.Empty:
+                if self._stop.is_set():
+                    break
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            for job in batch:
+                try:
+                    data = self._encode(job)
+                except Exception as e:
+                    print(f"Failed to prepare {job['object_name']} for MinIO: {e}")
+                    self._count("failed")
+                    self._queue.task_done()
+                    continue
+                if not self._upload_with_retry(job["object_name"], data, job["content_type"]):
+                    self._spool(job["object_name"], data)
+                self._queue.task_done()
+
+    def _overflow_loop(self):
+        while True:
+            try:
+                job = self._overflow.get(timeout=0.2)
+            except queue.Empty:
+                if self._stop.is_set():
+                    break
+                continue
+            self._spool_job(job)
+            self._overflow.task_done()
+
+    # --- Local spool ---
+
+    def _spool_job(self, job):
+        try:
+            data = self._encode(job)
+        except Exception as e:
+            self._count("failed")
+            print(f"Failed to spool {job['object_name']}: {e}")
+            return
+        self._spool(job["object_name"], data)
+
+    def _spool(self, object_name, data):
+        path = os.path.join(self.spool_dir, object_name)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = path + ".part"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self._count("spooled")
+        except OSError as e:
+            self._count("failed")
+            print(f"Failed to spool {object_name}: {e}")
+
+    def _spooled_objects(self):
+        for root, _, files in os.walk(self.spool_dir):
+            for name in files:
+                if name.endswith(".part"):
+                    continue
+                path = os.path.join(root, name)
+                yield os.path.relpath(path, self.spool_dir).replace(os.sep, "/"), path
+
+    def replay_spool(self):
+        """Re-sends spooled objects. Stops at the first failure (MinIO is probably still down)."""
+        sent = 0
+        with self._spool_lock:
+            for object_name, path in self._spooled_objects():
+                with open(path, "rb") as f:
+                    data = f.read()
+                try:
+                    self.storage.put_bytes(object_name, data)
+                except Exception:
+                    break
+                os.remove(path)
+                self._count("replayed")
+                sent += 1
+        return sent
+
+    def _spool_loop(self):
+        while not self._stop.wait(self.spool_retry_interval):
+            if self._queue.empty() and self._overflow.empty():
+                sent = self.replay_spool()
+                if sent:
+                    print(f"Re-sent {sent} spooled object(s) to MinIO")
+
+    # --- Shutdown ---
+
+    def flush(self, timeout=None):
+        """Blocks until every queued job has been uploaded or spooled."""
+        deadline = None if timeout is None else time.time() + timeout
+        while self._queue.unfinished_tasks or self._overflow.unfinished_tasks:
+            if deadline is not None and time.time() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def close(self, timeout=30.0):
+        """Flushes the queue, stops the workers and leaves anything undelivered in the spool."""
+        self.flush(timeout)
+        self._stop.set()
+        for w in self._workers:
+            w.join(timeout=5.0)
+        self._spool_thread.join(timeout=1.0)
+        self._overflow_thread.join(timeout=5.0)
+        # Whatever is still queued after the timeout goes to the spool rather than being lost
+        for q in (self._queue, self._overflow):
+            while True:
+                try:
+                    job = q.get_nowait()
+                except queue.Empty:
+                    break
+                self._spool_job(job)
+                q.task_done()
@@ -0,0 +1,212 @@
+import os
+import glob
+import json
+import shutil
+import hashlib
+import argparse
+import yaml
+import numpy as np
+
+BACKENDS = ("pt", "onnx", "openvino")
+DEFAULT_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "dataset.yaml")
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def file_sha256(path, chunk=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def export_key(weights, backend, imgsz, int8, data):
+    """Cache key: model contents + every setting that changes the exported artifact."""
+    import ultralytics
+    settings = {"model": file_sha256(weights), "backend": backend, "imgsz": imgsz, "int8": bool(int8),
+                "data": file_sha256(data) if int8 and data and os.path.isfile(data) else None,
+                "ultralytics": ultralytics.__version__}
+    return hashlib.sha1(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:16], settings
+
+
+def dataset_images(data=DEFAULT_DATA, split="val", limit=32):
+    """Image paths from a dataset YAML split (used for the accuracy check)."""
+    if not data or not os.path.isfile(data):
+        return []
+    with open(data) as f:
+        cfg = yaml.safe_load(f) or {}
+    root = cfg.get("path") or os.path.dirname(os.path.abspath(data))
+    entry = cfg.get(split)
+    if not isinstance(entry, str):
+        return []
+    folder = entry if os.path.isabs(entry) else os.path.join(root, entry)
+    files = sorted(p for p in glob.glob(os.path.join(folder, "**", "*"), recursive=True)
+                   if p.lower().endswith(IMAGE_EXTS))
+    return files[:limit]
+
+
+def _box_iou(a, b):
+    """IoU matrix between two [N, 4] / [M, 4] xyxy arrays."""
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.clip(br - tl, 0, None).prod(2)
+    area_a = (a[:, 2:] - a[:, :2]).prod(1)
+    area_b = (b[:, 2:] - b[:, :2]).prod(1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def compare_results(reference, candidate, iou_thresh=0.5):
+    """
+    Greedy same-class matching of candidate boxes against the reference (FP32) boxes.
+    Returns (matched, n_reference, n_candidate, sum of matched IoUs, max confidence difference).
+    """
+    ref = reference.boxes.cpu().numpy() if reference.boxes is not None else None
+    cand = candidate.boxes.cpu().numpy() if candidate.boxes is not None else None
+    n_ref = len(ref) if ref is not None else 0
+    n_cand = len(cand) if cand is not None else 0
+    if not n_ref or not n_cand:
+        return 0, n_ref, n_cand, 0.0, 0.0
+
+    iou = _box_iou(ref.xyxy, cand.xyxy)
+    iou[ref.cls[:, None] != cand.cls[None, :]] = 0
+    matched, iou_sum, conf_diff = 0, 0.0, 0.0
+    for i in np.argsort(-ref.conf):
+        j = int(iou[i].argmax())
+        if iou[i, j] < iou_thresh:
+            continue
+        matched += 1
+        iou_sum += float(iou[i, j])
+        conf_diff = max(conf_diff, abs(float(ref.conf[i]) - float(cand.conf[j])))
+        iou[:, j] = 0
+    return matched, n_ref, n_cand, iou_sum, conf_diff
+
+
+def check_accuracy(reference_model, exported_model, images, imgsz=640, conf=0.25, iou_thresh=0.5):
+    """
+    Runs both models on the same images and reports how well the exported model reproduces
+    the FP32 detections: recall / precision against the reference boxes, mean IoU of matches
+    and the largest confidence difference.
+    """
+    matched = n_ref = n_cand = 0
+    iou_sum = conf_diff = 0.0
+    for path in images:
+        ref = reference_model.predict(path, imgsz=imgsz, conf=conf, verbose=False)[0]
+        cand = exported_model.predict(path, imgsz=imgsz, conf=conf, verbose=False)[0]
+        m, r, c, s, d = compare_results(ref, cand, iou_thresh)
+        matched, n_ref, n_cand, iou_sum = matched + m, n_ref + r, n_cand + c, iou_sum + s
+        conf_diff = max(conf_diff, d)
+    return {
+        "images": len(images),
+        "reference_boxes": n_ref,
+        "exported_boxes": n_cand,
+        "recall": matched / n_ref if n_ref else 1.0,
+        "precision": matched / n_cand if n_cand else 1.0,
+        "mean_iou": iou_sum / matched if matched else None,
+        "max_conf_diff": conf_diff,
+    }
+
+
+def export_model(weights, backend="onnx", imgsz=640, int8=False, data=DEFAULT_DATA, cache_dir=None,
+                 check_images=None, min_recall=0.9):
+    """
+    Exports weights to ONNX or OpenVINO once and returns the path of the exported model.
+    - Artifacts live in <cache_dir>/<stem>-<key>/ (default: an 'exported' folder next to the weights);
+      the key covers the model file hash and all export settings, so changed weights re-export.
+    - int8=True (OpenVINO) calibrates on the dataset YAML given by `data`.
+    - After export the model is compared with the FP32 .pt model on check_images (default: the
+      dataset's val images). If recall drops below min_recall the .pt path is returned instead.
+    The export report (settings + accuracy) is stored in meta.json in the cache entry.
+    """
+    if backend == "pt":
+        return weights
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend: {backend}")
+    if int8 and backend != "openvino":
+        raise ValueError("INT8 export is only supported for the openvino backend here")
+    from ultralytics import YOLO
+    from ultralytics.utils.downloads import attempt_download_asset
+
+    # Resolve the weights first (downloads official models like yolo11n-pose.pt), then hash them
+    weights = str(attempt_download_asset(weights))
+    key, settings = export_key(weights, backend, imgsz, int8, data)
+    stem = os.path.splitext(os.path.basename(weights))[0]
+    cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(weights)), "exported")
+    entry = os.path.join(cache_dir, f"{stem}-{key}")
+    meta_path = os.path.join(entry, "meta.json")
+
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+    else:
+        print(f"📦 Exporting {weights} to {backend} (imgsz={imgsz}{', int8' if int8 else ''})...")
+        tmp = entry + ".part"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        # Export from a private copy so the artifact lands inside the cache entry
+        local = os.path.join(tmp, os.path.basename(weights))
+        shutil.copy2(weights, local)
+        reference = YOLO(weights)
+        quantize = {"int8": True, "data": data} if int8 else {}
+        exported = YOLO(local).export(format=backend, imgsz=imgsz, verbose=False, **quantize)
+        os.remove(local)
+
+        images = check_images if check_images is not None else dataset_images(data)
+        if images:
+            accuracy = check_accuracy(reference, YOLO(str(exported), task=reference.task), images, imgsz)
+        else:
+            accuracy = None
+            print("⚠️ No images found for the accuracy check, skipping it")
+        meta = {"settings": settings, "task": reference.task, "accuracy": accuracy,
+                "model": os.path.relpath(str(exported), tmp)}
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=2)
+        shutil.rmtree(entry, ignore_errors=True)
+        os.replace(tmp, entry)
+
+    accuracy = meta.get("accuracy")
+    if accuracy:
+        print(f"📊 {backend} vs FP32: recall {accuracy['recall']:.3f}, precision {accuracy['precision']:.3f}, "
+              f"max conf diff {accuracy['max_conf_diff']:.3f} on {accuracy['images']} image(s)")
+        if accuracy["recall"] < min_recall:
+            print(f"⚠️ Exported model recall {accuracy['recall']:.3f} < {min_recall}, falling back to {weights}")
+            return weights
+    return os.path.join(entry, meta["model"])
+
+
+def exported_task(exported):
+    """Task ("detect", "pose", ...) recorded in the meta.json of an export cache entry, or None."""
+    entry = os.path.dirname(os.path.abspath(exported))
+    for _ in range(3):
+        meta_path = os.path.join(entry, "meta.json")
+        if os.path.exists(meta_path):
+            try:
+                with open(meta_path) as f:
+                    return json.load(f).get("task")
+            except (OSError, ValueError):
+                return None
+        entry = os.path.dirname(entry)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export a YOLO model to a cached CPU runtime (ONNX / OpenVINO)')
+    parser.add_argument('--model', type=str, required=True, help='Path to the .pt model')
+    parser.add_argument('--backend', type=str, default='openvino', choices=BACKENDS[1:])
+    parser.add_argument('--imgsz', type=int, default=640, help='Export input size')
+    parser.add_argument('--int8', action='store_true', help='INT8 quantization (OpenVINO, calibrated on --data)')
+    parser.add_argument('--data', type=str, default=DEFAULT_DATA, help='Dataset YAML for calibration / accuracy check')
+    parser.add_argument('--cache-dir', type=str, default=None, help='Export cache directory')
+    parser.add_argument('--check-images', type=str, default=None,
+                        help='Directory or glob of images for the accuracy check (default: dataset val split)')
+    args = parser.parse_args()
+
+    images = None
+    if args.check_images:
+        pattern = os.path.join(args.check_images, "*") if os.path.isdir(args.check_images) else args.check_images
+        images = sorted(p for p in glob.glob(pattern) if p.lower().endswith(IMAGE_EXTS))
+    path = export_model(args.model, args.backend, args.imgsz, args.int8, args.data, args.cache_dir, images)
+    print(f"✅ Model ready: {path}")
+
+
+if __name__ == "__main__":
+    main()
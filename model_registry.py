@@ -0,0 +1,172 @@
+import os
+import time
+import hashlib
+import threading
+import numpy as np
+
+# Optional directory for fused checkpoints (set YOLO_MODEL_CACHE to enable)
+DEFAULT_CACHE_DIR = os.environ.get("YOLO_MODEL_CACHE") or None
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def resolve_weights(weights, fallback=None):
+    """Local weights if they exist, else the fallback name (downloaded by ultralytics)."""
+    if fallback is None or os.path.exists(weights):
+        return weights
+    print(f"Model not found at {weights}, using online version {fallback}...")
+    return fallback
+
+
+def fused_cache_path(weights, cache_dir):
+    """Cache file name tied to the source file's size / mtime and the ultralytics version."""
+    import ultralytics
+    st = os.stat(weights)
+    key = f"{os.path.abspath(weights)}|{st.st_size}|{st.st_mtime_ns}|{ultralytics.__version__}"
+    digest = hashlib.sha1(key.encode()).hexdigest()[:12]
+    stem = os.path.splitext(os.path.basename(weights))[0]
+    return os.path.join(cache_dir, f"{stem}-{digest}.fused.pt")
+
+
+def load_model(weights, device=None, cache_dir=None, backend="pt", imgsz=640, int8=False, data=None):
+    """
+    Loads a YOLO model. With cache_dir, the Conv+BN fused model is saved there on first use and
+    loaded directly next time (skips fusing at startup).
+    backend='onnx' / 'openvino' exports once (cached, see model_export.export_model) and loads
+    the exported runtime instead; it only runs on CPU, so `device` is ignored.
+    """
+    from ultralytics import YOLO
+    if backend != "pt":
+        from model_export import DEFAULT_DATA, export_model, exported_task
+        exported = export_model(weights, backend, imgsz, int8, data or DEFAULT_DATA)
+        if exported != weights:
+            # The export entry records the task; only older entries need the .pt model to find it
+            task = exported_task(exported) or YOLO(weights).task
+            return YOLO(exported, task=task)
+    cached = fused_cache_path(weights, cache_dir) if cache_dir and os.path.isfile(weights) else None
+    if cached and os.path.exists(cached):
+        model = YOLO(cached)
+    else:
+        model = YOLO(weights)
+        if cached:
+            try:
+                model.fuse()
+                os.makedirs(cache_dir, exist_ok=True)
+                model.save(cached + ".part")
+                os.replace(cached + ".part", cached)
+                print(f"Cached fused model: {cached}")
+            except Exception as e:
+                print(f"Could not cache fused model: {e}")
+    if device is not None:
+        model.to(device)
+    return model
+
+
+def warmup_model(model, imgsz=640, shape=None, batch=1, **predict_kwargs):
+    """
+    Runs dummy inference so predictor setup, CUDA context / kernel selection and NMS imports
+    happen before the first real frame. shape=(h, w) matches a known camera resolution.
+    """
+    h, w = shape if shape is not None else (imgsz, imgsz)
+    frame = np.zeros((h, w, 3), dtype=np.uint8)
+    model.predict([frame] * batch, imgsz=imgsz, verbose=False, **predict_kwargs)
+    return model
+
+
+class LazyModel:
+    def __init__(self, weights, fallback=None, device=None, imgsz=640, warmup=True, cache_dir=DEFAULT_CACHE_DIR,
+                 save_fallback=False, backend="pt", int8=False, data=None):
+        """
+        Proxy for a YOLO model that is loaded on first use instead of at import time.
+        start() loads and warms it up on a background thread; any attribute access (predict,
+        track, names, ...) waits for that to finish, or loads synchronously if start() was never called.
+        save_fallback=True stores a downloaded fallback model at `weights` for next time.
+        backend / int8 / data select an exported CPU runtime (see load_model); configure() can
+        change them, e.g. from command line flags, until loading starts.
+        """
+        self.weights = weights
+        self.fallback = fallback
+        self.device = device
+        self.imgsz = imgsz
+        self.warmup = warmup
+        self.cache_dir = cache_dir
+        self.save_fallback = save_fallback
+        self.backend = backend
+        self.int8 = int8
+        self.data = data
+        self.load_time = None
+        self._model = None
+        self._error = None
+        self._ready = threading.Event()
+        self._start_lock = threading.Lock()
+        self._thread = None
+
+    def _load(self):
+        start = time.time()
+        try:
+            weights = resolve_weights(self.weights, self.fallback)
+            model = load_model(weights, self.device, self.cache_dir, self.backend, self.imgsz, self.int8, self.data)
+            if self.save_fallback and weights != self.weights and self.backend == "pt":
+                os.makedirs(os.path.dirname(self.weights) or ".", exist_ok=True)
+                model.save(self.weights)
+            if self.warmup:
+                warmup_model(model, self.imgsz)
+            self._model = model
+            self.load_time = time.time() - start
+            print(f"Model {os.path.basename(weights)} ready in {self.load_time:.2f}s")
+        except Exception as e:
+            self._error = e
+            print(f"Failed to load model {self.weights}: {e}")
+        finally:
+            self._ready.set()
+
+    def configure(self, **options):
+        """Changes load options (backend, imgsz, int8, device, ...) before the model is loaded."""
+        with self._start_lock:
+            if self._thread is not None:
+                raise RuntimeError("Model is already loading, configure it before start()")
+            for key, value in options.items():
+                if key not in ("fallback", "device", "imgsz", "warmup", "cache_dir", "backend", "int8", "data"):
+                    raise TypeError(f"Unknown model option: {key}")
+                setattr(self, key, value)
+        return self
+
+    def start(self):
+        """Starts background loading + warm-up (idempotent)."""
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._load, name="model-load", daemon=True)
+                self._thread.start()
+        return self
+
+    @property
+    def ready(self):
+        return self._ready.is_set() and self._model is not None
+
+    def get(self, timeout=None):
+        """Returns the loaded YOLO model, waiting for the background load if necessary."""
+        self.start()
+        if not self._ready.wait(timeout):
+            raise TimeoutError(f"Model {self.weights} not loaded after {timeout}s")
+        if self._error is not None:
+            raise self._error
+        return self._model
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.get(), name)
+
+
+def get_model(weights, fallback=None, device=None, **kwargs):
+    """
+    Shared LazyModel per (weights, device) in this process, so several modules / threads that
+    ask for the same model get one copy. Extra kwargs only apply on first creation.
+    """
+    key = (weights, device)
+    with _registry_lock:
+        model = _registry.get(key)
+        if model is None:
+            model = _registry[key] = LazyModel(weights, fallback=fallback, device=device, **kwargs)
+        return model
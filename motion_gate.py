@@ -0,0 +1,86 @@
+import cv2
+
+FULL_FRAME = (0.0, 0.0, 1.0, 1.0)
+
+
+class MotionGate:
+    def __init__(self, width=160, pixel_thresh=25, area_thresh=0.002, regions=None,
+                 refresh_interval=30, method="diff", blur=5):
+        """
+        Cheap pre-filter that decides whether a frame needs YOLO at all.
+        Frames are downscaled to `width` pixels, converted to grayscale and blurred, then compared
+        either with the frame that was last sent to inference (method='diff', catches slow drift)
+        or with a MOG2 background model (method='mog2').
+        regions: list of (x1, y1, x2, y2) or (x1, y1, x2, y2, area_thresh) in normalized [0, 1]
+        coordinates; motion in any region whose changed-pixel fraction exceeds its threshold
+        triggers inference. Default: the whole frame with `area_thresh`.
+        refresh_interval forces inference every N frames so tracks never go stale (0 disables).
+        """
+        if method not in ("diff", "mog2"):
+            raise ValueError(f"Unknown motion gate method: {method}")
+        self.width = width
+        self.pixel_thresh = pixel_thresh
+        self.refresh_interval = refresh_interval
+        self.method = method
+        self.blur = blur
+        self.regions = [tuple(r[:4]) + ((r[4] if len(r) > 4 else area_thresh),) for r in (regions or [FULL_FRAME])]
+
+        self._reference = None
+        self._region_slices = None
+        self._since_inference = 0
+        self._subtractor = cv2.createBackgroundSubtractorMOG2(detectShadows=False) if method == "mog2" else None
+        self.stats = {"frames": 0, "inferred": 0, "skipped": 0, "refreshes": 0}
+
+    def _prepare(self, frame):
+        h, w = frame.shape[:2]
+        height = max(1, int(round(h * self.width / w)))
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        if self.blur:
+            small = cv2.GaussianBlur(small, (self.blur, self.blur), 0)
+        if self._region_slices is None or self._region_slices[0] != small.shape:
+            self._region_slices = (small.shape, [
+                (slice(int(y1 * height), max(int(y2 * height), int(y1 * height) + 1)),
+                 slice(int(x1 * self.width), max(int(x2 * self.width), int(x1 * self.width) + 1)), thresh)
+                for x1, y1, x2, y2, thresh in self.regions
+            ])
+        return small
+
+    def _has_motion(self, small):
+        if self.method == "mog2":
+            mask = self._subtractor.apply(small) > 0
+        else:
+            if self._reference is None or self._reference.shape != small.shape:
+                return True
+            mask = cv2.absdiff(small, self._reference) > self.pixel_thresh
+        for rows, cols, thresh in self._region_slices[1]:
+            if mask[rows, cols].mean() > thresh:
+                return True
+        return False
+
+    def check(self, frame):
+        """
+        Returns True if this frame should go through inference, False if the previous results
+        can be reused. Counters are kept in `stats`.
+        """
+        self.stats["frames"] += 1
+        small = self._prepare(frame)
+        motion = self._has_motion(small)
+        self._since_inference += 1
+
+        refresh = self.refresh_interval and self._since_inference >= self.refresh_interval
+        if not motion and not refresh:
+            self.stats["skipped"] += 1
+            return False
+
+        if refresh and not motion:
+            self.stats["refreshes"] += 1
+        self.stats["inferred"] += 1
+        self._since_inference = 0
+        self._reference = small
+        return True
+
+    @property
+    def skip_ratio(self):
+        return self.stats["skipped"] / self.stats["frames"] if self.stats["frames"] else 0.0
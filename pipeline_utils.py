@@ -0,0 +1,211 @@
+import threading
+import time
+import queue
+import cv2
+from metrics import NULL_METRICS
+
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+BLOCK = "block"
+DROP_POLICIES = (DROP_OLDEST, DROP_NEWEST, BLOCK)
+
+
+class FrameQueue:
+    def __init__(self, maxsize=2, drop_policy=DROP_OLDEST):
+        """
+        Bounded queue joining two pipeline stages.
+        drop_policy decides what happens when the consumer falls behind:
+          - 'drop_oldest': discard the oldest queued item to make room (lowest latency)
+          - 'drop_newest': discard the incoming item (keeps queued work intact)
+          - 'block':       wait for room (never drops, may stall the producer)
+        """
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy: {drop_policy}")
+        self._queue = queue.Queue(maxsize=maxsize)
+        self.drop_policy = drop_policy
+        self.dropped = 0
+        self._closed = threading.Event()
+
+    def put(self, item, timeout=None):
+        """Returns True if the item was queued, False if it was dropped."""
+        if self._closed.is_set():
+            return False
+
+        if self.drop_policy == BLOCK:
+            while not self._closed.is_set():
+                try:
+                    self._queue.put(item, timeout=0.1 if timeout is None else timeout)
+                    return True
+                except queue.Full:
+                    if timeout is not None:
+                        self.dropped += 1
+                        return False
+            return False
+
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            pass
+
+        if self.drop_policy == DROP_NEWEST:
+            self.dropped += 1
+            return False
+
+        # drop_oldest: evict until the new item fits (another producer may race us)
+        while True:
+            try:
+                self._queue.get_nowait()
+                self.dropped += 1
+            except queue.Empty:
+                pass
+            try:
+                self._queue.put_nowait(item)
+                return True
+            except queue.Full:
+                continue
+
+    def get(self, timeout=None):
+        """Returns the next item, or None on timeout / after close() once drained."""
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            try:
+                return self._queue.get(timeout=0.1)
+            except queue.Empty:
+                if self._closed.is_set():
+                    return None
+                if deadline is not None and time.time() >= deadline:
+                    return None
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def close(self):
+        self._closed.set()
+
+    @property
+    def closed(self):
+        return self._closed.is_set()
+
+
+class LatestFrameCapture:
+    def __init__(self, source=0, reconnect=False, reconnect_delay=1.0, max_reconnect_delay=30.0,
+                 metrics=NULL_METRICS):
+        """
+        Reads frames from a cv2.VideoCapture on a background thread and keeps only
+        the newest one, so a slow consumer never makes the camera buffer pile up.
+        With reconnect=True (RTSP cameras) a failed read re-opens the source with
+        exponential backoff instead of ending the stream.
+        Decode time is recorded as the "capture" span of `metrics`.
+        """
+        self.source = source
+        self.metrics = metrics
+        self.reconnect = reconnect
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.reconnects = 0
+        self.cap = self._open()
+        self._lock = threading.Condition()
+        self._frame = None
+        self._seq = 0
+        self._timestamp = 0.0
+        self._running = False
+        self._thread = None
+        self.failed = False
+        self.frames_read = 0
+
+    def _open(self):
+        cap = cv2.VideoCapture(self.source)
+        # Keep the decoder's own buffer minimal: we only ever want the newest frame
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        return cap
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._reader, name="capture", daemon=True)
+        self._thread.start()
+        return self
+
+    def _reader(self):
+        delay = self.reconnect_delay
+        while self._running:
+            with self.metrics.span("capture"):
+                success, frame = self.cap.read()
+            if not success:
+                if self.reconnect:
+                    self.metrics.inc("reconnects")
+                    print(f"Lost stream {self.source}, reconnecting in {delay:.0f}s...")
+                    self.cap.release()
+                    time.sleep(delay)
+                    delay = min(delay * 2, self.max_reconnect_delay)
+                    self.cap = self._open()
+                    self.reconnects += 1
+                    continue
+                print("Failed to grab frame.")
+                with self._lock:
+                    self.failed = True
+                    self._lock.notify_all()
+                break
+            delay = self.reconnect_delay
+            with self._lock:
+                self._frame = frame
+                self._seq += 1
+                self._timestamp = time.time()
+                self.frames_read += 1
+                self._lock.notify_all()
+
+    def read(self, last_seq=0, timeout=1.0):
+        """
+        Waits for a frame newer than last_seq.
+        Returns (frame, seq, timestamp); frame is None on timeout or capture failure.
+        Frames skipped between two calls are simply overwritten (latest-frame semantics).
+        timeout=0 polls without waiting.
+        """
+        with self._lock:
+            if timeout:
+                self._lock.wait_for(lambda: self._seq > last_seq or self.failed or not self._running,
+                                    timeout=timeout)
+            if self._seq > last_seq:
+                return self._frame, self._seq, self._timestamp
+            return None, last_seq, 0.0
+
+    def stop(self):
+        self._running = False
+        with self._lock:
+            self._lock.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+        self.cap.release()
+
+
+class StageWorker(threading.Thread):
+    def __init__(self, name, fn, in_queue, out_queue=None):
+        """
+        Runs fn(item) for every item pulled from in_queue on its own thread.
+        A non-None return value is forwarded to out_queue (if given).
+        Exceptions are logged and the stage keeps going, like the old single loop did.
+        """
+        super().__init__(name=name, daemon=True)
+        self.fn = fn
+        self.in_queue = in_queue
+        self.out_queue = out_queue
+        self.processed = 0
+
+    def run(self):
+        while True:
+            item = self.in_queue.get()
+            if item is None:
+                if self.in_queue.closed:
+                    break
+                continue
+            try:
+                out = self.fn(item)
+            except Exception as e:
+                print(f"ERROR in {self.name} stage: {e}")
+                continue
+            self.processed += 1
+            if out is not None and self.out_queue is not None:
+                self.out_queue.put(out)
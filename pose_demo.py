@@ -1,44 +1,37 @@
 import gradio as gr
-from ultralytics import YOLO
 import PIL.Image as Image
 import os
 import cv2
 import numpy as np
+from model_registry import get_model
+from result_cache import CachedPredictor, ResultCache
 
 # Load the pose model
 model_path = 'd:/06-code/yolo/yolo-project/models/yolo11n-pose.pt'
-if not os.path.exists(model_path):
-    print(f"Model not found at {model_path}, downloading...")
-    model = YOLO('yolo11n-pose.pt')
-    model.save(model_path)
-else:
-    model = YOLO(model_path)
+# Downloaded + saved on first run; loading and warm-up run in the background while Gradio starts
+model = get_model(model_path, fallback='yolo11n-pose.pt', save_fallback=True).start()
+
+# Raw outputs per image (LRU by content hash): repeat calls and slider moves skip the network
+predictor = CachedPredictor(model, ResultCache(max_entries=32, max_bytes=512 * 1024 * 1024))
 
 def predict_pose(img, conf_threshold, iou_threshold):
     if img is None:
         return None, "No image received. Please upload or snap a photo."
         
     try:
-        # Run inference
-        results = model.predict(
-            source=img,
-            conf=conf_threshold,
-            iou=iou_threshold,
-            save=False
-        )
-        
-        if not results or len(results) == 0:
-            return img, "Model returned no results."
+        # Run inference (or reuse the cached raw output and only redo filtering + NMS)
+        r, hit = predictor.predict(img, conf=conf_threshold, iou=iou_threshold)
 
         # Plot results on the image
-        r = results[0]
         im_array = r.plot() # BGR numpy array
         
         # Convert BGR to RGB
         im_rgb = im_array[..., ::-1]
         
         num_boxes = len(r.boxes) if hasattr(r, 'boxes') else 0
-        status = f"Success! Found {num_boxes} person(s)."
+        cache = predictor.cache.stats()
+        status = (f"Success! Found {num_boxes} person(s). "
+                  f"[cache {'hit' if hit else 'miss'} | hits: {cache['hits']}, misses: {cache['misses']}]")
         return Image.fromarray(im_rgb), status
     except Exception as e:
         return img, f"Error: {str(e)}"
@@ -80,6 +73,14 @@ with gr.Blocks(title="🕺 YOLO11 Pose Estimation") as demo:
         outputs=[output_img, status_text]
     )
 
+    # Threshold changes are served from the cache (filtering + NMS only)
+    for slider in (conf_slider, iou_slider):
+        slider.release(
+            fn=predict_pose,
+            inputs=[input_img, conf_slider, iou_slider],
+            outputs=[output_img, status_text]
+        )
+
 if __name__ == "__main__":
     print("Launching Gradio Blocks demo...")
     demo.launch(share=False)
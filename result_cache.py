@@ -0,0 +1,134 @@
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+def image_key(img):
+    """Content hash of a PIL image or numpy array (same pixels -> same key)."""
+    if hasattr(img, "tobytes") and hasattr(img, "mode"):
+        header = f"{img.mode}{img.size}".encode()
+        data = img.tobytes()
+    else:
+        arr = np.ascontiguousarray(img)
+        header = f"{arr.dtype}{arr.shape}".encode()
+        data = arr.data
+    h = hashlib.blake2b(header, digest_size=16)
+    h.update(data)
+    return h.hexdigest()
+
+
+class ResultCache:
+    def __init__(self, max_entries=32, max_bytes=512 * 1024 * 1024):
+        """
+        LRU cache keyed by image content hash, bounded by entry count and by approximate memory.
+        Counters: hits, misses, evictions.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, nbytes=0):
+        with self._lock:
+            if key in self._entries:
+                self.bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, nbytes)
+            self.bytes += nbytes
+            while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self.bytes > self.max_bytes):
+                _, (_, old_size) = self._entries.popitem(last=False)
+                self.bytes -= old_size
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class CachedPredictor:
+    def __init__(self, model, cache=None, **predict_kwargs):
+        """
+        Wraps model.predict so an image only goes through the network once.
+        On a miss the raw head output (before confidence filtering and NMS) is captured from the
+        predictor and cached with the original image; later calls with any conf / iou replay only
+        the predictor's own postprocess (NMS + box scaling), so results are identical to a fresh
+        model.predict call.
+        """
+        self.model = model
+        self.cache = cache if cache is not None else ResultCache()
+        self.predict_kwargs = predict_kwargs
+        self._lock = threading.Lock()
+        self._captured = None
+        self._postprocess = None
+        self._hooked = False
+
+    def _install_capture(self, predictor):
+        if getattr(predictor, "_raw_capture", False):
+            return
+        original = predictor.postprocess
+
+        def postprocess(preds, img, orig_imgs, **kwargs):
+            raw = preds[0] if isinstance(preds, (list, tuple)) else preds
+            # Only the input shape is needed to scale boxes back, not the pixels
+            shape_only = img.new_zeros(1).expand(img.shape)
+            self._captured = (raw.clone(), shape_only, orig_imgs, predictor.batch[0])
+            return original(preds, img, orig_imgs, **kwargs)
+
+        predictor.postprocess = postprocess
+        predictor._raw_capture = True
+        self._postprocess = original
+
+    def _replay(self, entry, conf, iou):
+        raw, img, orig_imgs, paths = entry
+        predictor = self.model.predictor
+        predictor.args.conf = conf
+        predictor.args.iou = iou
+        predictor.batch = (paths, orig_imgs, [""])
+        # non_max_suppression converts boxes in place, so hand it a copy
+        return self._postprocess(raw.clone(), img, orig_imgs)[0]
+
+    def predict(self, img, conf=0.25, iou=0.45):
+        """Returns (result, cache_hit) for an image at the given thresholds."""
+        key = image_key(img)
+        with self._lock:
+            entry = self.cache.get(key)
+            if entry is not None and self._postprocess is not None:
+                return self._replay(entry, conf, iou), True
+
+            if not self._hooked:
+                # Registered on first use so a lazily loaded model isn't forced to load early
+                self.model.add_callback("on_predict_start", self._install_capture)
+                self._hooked = True
+            self._captured = None
+            result = self.model.predict(source=img, conf=conf, iou=iou, save=False, verbose=False,
+                                        **self.predict_kwargs)[0]
+            if self._captured is not None:
+                raw, _, orig_imgs, _ = self._captured
+                nbytes = raw.numel() * raw.element_size() + sum(im.nbytes for im in orig_imgs)
+                self.cache.put(key, self._captured, nbytes)
+                self._captured = None
+            return result, False
@@ -0,0 +1,126 @@
+import numpy as np
+from tracking_utils import DEFAULT_TRACKER_CONFIG, StreamTracker, load_tracker_config
+
+
+def roi_boxes(boxes, frame_shape, padding=0.3, min_size=64):
+    """
+    Padded, square crop windows (int xyxy, clipped to the frame) around person boxes.
+    Square crops keep the pose model's letterbox from wasting most of its input on padding.
+    """
+    h, w = frame_shape[:2]
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+    sides = np.maximum((boxes[:, 2:] - boxes[:, :2]).max(1) * (1 + 2 * padding), min_size)
+    rois = np.concatenate([centers - sides[:, None] / 2, centers + sides[:, None] / 2], axis=1)
+    rois = np.round(rois).astype(int)
+    rois[:, [0, 2]] = np.clip(rois[:, [0, 2]], 0, w)
+    rois[:, [1, 3]] = np.clip(rois[:, [1, 3]], 0, h)
+    return rois
+
+
+def _iou(box, boxes):
+    tl = np.maximum(box[:2], boxes[:, :2])
+    br = np.minimum(box[2:], boxes[:, 2:])
+    inter = np.clip(br - tl, 0, None).prod(1)
+    area = (box[2:] - box[:2]).prod()
+    areas = (boxes[:, 2:] - boxes[:, :2]).prod(1)
+    return inter / (area + areas - inter + 1e-9)
+
+
+class RoiPoseRunner:
+    def __init__(self, model, tracker=DEFAULT_TRACKER_CONFIG, roi_imgsz=320, padding=0.3, detect_interval=10,
+                 max_rois=4, min_roi=64, min_iou=0.1):
+        """
+        Track-guided pose inference: instead of running the pose model on the full frame every
+        frame, last frame's person boxes are cropped (padded, square) and the crops are batched
+        at roi_imgsz; keypoints are mapped back into frame coordinates.
+        A full-frame pass (at the model's imgsz) still runs
+          - every detect_interval frames, to pick up people who just entered the scene,
+          - when there is nobody to follow or more than max_rois people,
+          - on the frame after a crop lost its person.
+        Detections from both paths go through one StreamTracker (ByteTrack), so track IDs and the
+        Kalman state stay continuous. run() returns the same [Results] as model.track.
+        tracker is a ByteTrack YAML (default: my_bytetrack.yaml) or an already loaded config dict.
+        Crops run at roi_imgsz, so the model needs dynamic input shapes (not a static ONNX/OpenVINO
+        export at another size).
+        """
+        self.model = model
+        self.tracker = StreamTracker(tracker if isinstance(tracker, dict) else load_tracker_config(tracker))
+        self.roi_imgsz = roi_imgsz
+        self.padding = padding
+        self.detect_interval = detect_interval
+        self.max_rois = max_rois
+        self.min_roi = min_roi
+        self.min_iou = min_iou
+        self._boxes = np.zeros((0, 4), np.float32)
+        self._since_full = 0
+        self._lost = True
+        self.stats = {"frames": 0, "full": 0, "roi": 0, "crops": 0, "lost": 0, "pixels": 0, "full_pixels": 0}
+
+    def reset(self):
+        """Forgets all people (e.g. after the stream reconnects)."""
+        self.tracker.reset()
+        self._boxes = np.zeros((0, 4), np.float32)
+        self._lost = True
+
+    def _needs_full(self):
+        return (self._lost or len(self._boxes) == 0 or len(self._boxes) > self.max_rois
+                or self._since_full >= self.detect_interval)
+
+    def run(self, frame, conf=0.25, iou=0.45, imgsz=640):
+        self.stats["frames"] += 1
+        self.stats["full_pixels"] += imgsz * imgsz
+        if self._needs_full():
+            result = self.model.predict(frame, conf=conf, iou=iou, imgsz=imgsz, verbose=False)[0]
+            self._since_full = 0
+            self._lost = False
+            self.stats["full"] += 1
+            self.stats["pixels"] += imgsz * imgsz
+        else:
+            result = self._run_rois(frame, conf, iou)
+            self._since_full += 1
+
+        # Follow every detection (not only confirmed tracks), so a new person gets confirmed
+        # by the crop on the next frame
+        self._boxes = result.boxes.xyxy.cpu().numpy() if result.boxes is not None else self._boxes[:0]
+        return [self.tracker.update(result)]
+
+    def _run_rois(self, frame, conf, iou):
+        import torch
+        from ultralytics.engine.results import Results
+
+        rois = roi_boxes(self._boxes, frame.shape, self.padding, self.min_roi)
+        # Crops are views into the frame; the predictor letterboxes them into one batch
+        crops = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in rois]
+        crop_results = self.model.predict(crops, conf=conf, iou=iou, imgsz=self.roi_imgsz, verbose=False)
+        self.stats["roi"] += 1
+        self.stats["crops"] += len(crops)
+        self.stats["pixels"] += len(crops) * self.roi_imgsz * self.roi_imgsz
+
+        boxes, keypoints = [], []
+        for expected, roi, res in zip(self._boxes, rois, crop_results):
+            det = res.boxes.data.cpu().numpy() if res.boxes is not None else np.zeros((0, 6), np.float32)
+            offset = np.array([roi[0], roi[1]], np.float32)
+            if len(det):
+                xyxy = det[:, :4] + np.tile(offset, 2)
+                # The person this crop was made for: best overlap with last frame's box
+                overlap = _iou(expected, xyxy)
+                best = int(overlap.argmax())
+            if not len(det) or overlap[best] < self.min_iou:
+                self._lost = True
+                self.stats["lost"] += 1
+                continue
+            boxes.append(np.concatenate([xyxy[best], det[best, 4:6]]))
+            kpts = res.keypoints.data[best].cpu().numpy().copy()
+            kpts[:, :2] += offset
+            keypoints.append(kpts)
+
+        kpt_shape = crop_results[0].keypoints.data.shape[1:] if crop_results[0].keypoints is not None else (17, 3)
+        result = Results(
+            orig_img=frame, path=crop_results[0].path, names=self.model.names,
+            boxes=torch.as_tensor(np.array(boxes, np.float32).reshape(-1, 6)),
+            keypoints=torch.as_tensor(np.array(keypoints, np.float32).reshape(-1, *kpt_shape)),
+        )
+        # Per-image timings of the whole crop batch, in the same shape model.predict reports them
+        result.speed = {k: v * len(crops) for k, v in crop_results[0].speed.items() if v is not None}
+        return result
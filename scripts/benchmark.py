@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark for the live pose pipeline
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import resource
+import tempfile
+import subprocess
+import tracemalloc
+import numpy as np
+import cv2
+
+# Project modules live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fall_detection import FallDetector
+from frame_results import FrameResultPool
+from keypoint_log import KeypointRecorder
+from minio_utils import MinioUploader
+from model_export import BACKENDS
+from model_registry import load_model, warmup_model
+from live_pose import draw_fall_alerts, draw_keypoint_ids, save_keypoints
+
+STAGES = ("capture", "predict", "results", "fall", "plot", "serialize", "upload")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark the pose pipeline on recorded or synthetic video')
+    parser.add_argument('--model', type=str, default='yolo11n-pose.pt', help='Pose model')
+    parser.add_argument('--source', type=str, default=None, help='Recorded video file (default: synthetic frames)')
+    parser.add_argument('--frames', type=int, default=300, help='Frames to measure (video: at most)')
+    parser.add_argument('--warmup', type=int, default=10, help='Frames run before measuring')
+    parser.add_argument('--width', type=int, default=640, help='Synthetic frame width')
+    parser.add_argument('--height', type=int, default=480, help='Synthetic frame height')
+    parser.add_argument('--imgsz', type=int, default=640, help='Inference size')
+    parser.add_argument('--backend', type=str, default='pt', choices=BACKENDS, help='Inference runtime')
+    parser.add_argument('--device', type=str, default=None, help='Device for the .pt backend')
+    parser.add_argument('--conf', type=float, default=0.25, help='Confidence threshold')
+    parser.add_argument('--iou', type=float, default=0.45, help='IoU threshold')
+    parser.add_argument('--no-track', action='store_true', help='model.predict instead of model.track')
+    parser.add_argument('--save-every', type=int, default=1,
+                        help='Serialize + upload every N-th frame (0 = never)')
+    parser.add_argument('--upload-latency', type=float, default=0.0,
+                        help='Simulated seconds per object in the stub store')
+    parser.add_argument('--alloc', action='store_true',
+                        help='Track Python/numpy allocations per frame (tracemalloc, slows the run)')
+    parser.add_argument('--json', type=str, default=None, help='Write the report to this JSON file')
+    parser.add_argument('--baseline', type=str, default=None, help='Earlier JSON report to compare against')
+    parser.add_argument('--max-regression', type=float, default=0.10,
+                        help='Fail if FPS, a stage p95 or peak RSS is worse than the baseline by this fraction')
+    parser.add_argument('--min-ms', type=float, default=0.5,
+                        help='Ignore stages whose baseline p95 is below this (too noisy to compare)')
+    return parser.parse_args()
+
+class StubStorage:
+    """Stands in for MinioStorage: keeps object sizes and per-put latencies in memory."""
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.objects = {}
+        self.put_times = []
+
+    def put_bytes(self, object_name, data, content_type=None):
+        start = time.perf_counter()
+        if self.latency:
+            time.sleep(self.latency)
+        self.objects[object_name] = len(data)
+        self.put_times.append(time.perf_counter() - start)
+
+def synthetic_frames(width, height, count, seed=0):
+    """Noise background with a few moving rectangles, so frames differ like real video."""
+    rng = np.random.default_rng(seed)
+    background = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+    for i in range(count):
+        frame = background.copy()
+        for k in range(3):
+            x = int((i * (3 + k) + k * width / 3) % max(1, width - 80))
+            y = int(height / 4 + k * height / 5)
+            cv2.rectangle(frame, (x, y), (x + 60, y + 120), (40 * k, 200, 255 - 40 * k), -1)
+        yield frame
+
+def video_frames(path, count):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise SystemExit(f"❌ Could not open video {path}")
+    try:
+        for _ in range(count):
+            ok, frame = cap.read()
+            if not ok:
+                break
+            yield frame
+    finally:
+        cap.release()
+
+def percentiles(values):
+    if not values:
+        return None
+    arr = np.asarray(values) * 1000.0
+    return {"p50": float(np.percentile(arr, 50)), "p95": float(np.percentile(arr, 95)),
+            "p99": float(np.percentile(arr, 99)), "mean": float(arr.mean()), "count": len(values)}
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except Exception:
+        return None
+
+def run_benchmark(args):
+    model = load_model(args.model, args.device, backend=args.backend, imgsz=args.imgsz)
+    warmup_model(model, args.imgsz)
+
+    total = args.warmup + args.frames
+    frames = video_frames(args.source, total) if args.source else \
+        synthetic_frames(args.width, args.height, total)
+
+    save_dir = tempfile.mkdtemp(prefix="pose_bench_")
+    storage = StubStorage(args.upload_latency)
+    uploader = MinioUploader(storage, spool_dir=os.path.join(save_dir, "spool"))
+    recorder = KeypointRecorder(os.path.join(save_dir, "log"))
+    fall_detector = FallDetector()
+    pool = FrameResultPool(2)
+    timings = {stage: [] for stage in STAGES if stage != "upload"}
+    frame_times, alloc_bytes = [], []
+    if args.alloc:
+        tracemalloc.start()
+
+    measured = 0
+    wall_start = None
+    index = 0
+    while True:
+        t0 = time.perf_counter()
+        frame = next(frames, None)
+        if frame is None:
+            break
+        t_capture = time.perf_counter()
+        measuring = index >= args.warmup
+        if measuring and wall_start is None:
+            wall_start = t0
+            storage.put_times.clear()
+        if args.alloc:
+            tracemalloc.reset_peak()
+            alloc_base = tracemalloc.get_traced_memory()[0]
+
+        # Same stages as live_pose.py's inference worker, renderer and persistence worker
+        if args.no_track:
+            results = model.predict(frame, conf=args.conf, iou=args.iou, imgsz=args.imgsz, verbose=False)
+        else:
+            results = model.track(frame, conf=args.conf, iou=args.iou, imgsz=args.imgsz, persist=True,
+                                  tracker="bytetrack.yaml", verbose=False)
+        t_predict = time.perf_counter()
+
+        frame_result = pool.next().load(results[0])
+        t_results = time.perf_counter()
+
+        fall_boxes = []
+        if frame_result.has_keypoints:
+            fallen, _ = fall_detector.update(frame_result.boxes, frame_result.keypoints, frame_result.track_ids)
+            fall_boxes = frame_result.boxes[fallen]
+        t_fall = time.perf_counter()
+
+        display_frame = results[0].plot()
+        draw_fall_alerts(display_frame, fall_boxes)
+        if frame_result.has_keypoints:
+            draw_keypoint_ids(display_frame, frame_result, 0.5)
+        t_plot = time.perf_counter()
+
+        saved = args.save_every and index % args.save_every == 0
+        if saved:
+            save_keypoints({"frame": frame, "display_frame": display_frame, "frame_result": frame_result,
+                            "kpt_conf_threshold": 0.5, "time": time.time(), "minio_enabled": 1,
+                            "manual": False}, save_dir, uploader, recorder)
+        t_serialize = time.perf_counter()
+
+        if measuring:
+            measured += 1
+            timings["capture"].append(t_capture - t0)
+            timings["predict"].append(t_predict - t_capture)
+            timings["results"].append(t_results - t_predict)
+            timings["fall"].append(t_fall - t_results)
+            timings["plot"].append(t_plot - t_fall)
+            if saved:
+                timings["serialize"].append(t_serialize - t_plot)
+            frame_times.append(t_serialize - t0)
+            if args.alloc:
+                alloc_bytes.append(tracemalloc.get_traced_memory()[1] - alloc_base)
+        index += 1
+
+    wall = time.perf_counter() - wall_start if wall_start else 0.0
+    flush_start = time.perf_counter()
+    uploader.close()
+    flush_time = time.perf_counter() - flush_start
+    recorder.close()
+    if args.alloc:
+        tracemalloc.stop()
+    shutil.rmtree(save_dir, ignore_errors=True)
+
+    stages = {stage: percentiles(values) for stage, values in timings.items()}
+    stages["upload"] = percentiles(storage.put_times)
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(),
+                    "cpus": os.cpu_count()},
+        "settings": {"model": args.model, "backend": args.backend, "imgsz": args.imgsz,
+                     "source": args.source or f"synthetic {args.width}x{args.height}",
+                     "track": not args.no_track, "conf": args.conf, "iou": args.iou,
+                     "save_every": args.save_every, "upload_latency": args.upload_latency},
+        "frames": measured,
+        "fps": measured / wall if wall else 0.0,
+        "frame_latency": percentiles(frame_times),
+        "stages": stages,
+        "upload_flush_s": flush_time,
+        "uploaded_objects": len(storage.objects),
+        # ru_maxrss is KiB on Linux (bytes on macOS)
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024.0 if sys.platform != "darwin"
+                                                                            else 1024.0 ** 2),
+        "alloc_bytes_per_frame": float(np.mean(alloc_bytes)) if alloc_bytes else None,
+    }
+
+def print_report(report):
+    print(f"\n📊 {report['frames']} frame(s), {report['fps']:.2f} FPS end-to-end, "
+          f"peak RSS {report['peak_rss_mb']:.1f} MB")
+    print(f"{'stage':<12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'mean ms':>10}")
+    rows = list(report["stages"].items()) + [("frame", report["frame_latency"])]
+    for stage, stats in rows:
+        if stats:
+            print(f"{stage:<12}{stats['p50']:>10.2f}{stats['p95']:>10.2f}{stats['p99']:>10.2f}{stats['mean']:>10.2f}")
+    if report["alloc_bytes_per_frame"] is not None:
+        print(f"Allocations: {report['alloc_bytes_per_frame'] / 1024:.1f} KiB per frame (peak Python/numpy heap)")
+    print(f"Upload: {report['uploaded_objects']} object(s), {report['upload_flush_s']:.2f}s to flush at exit")
+
+def compare(report, baseline, max_regression, min_ms):
+    """Returns a list of human-readable regressions beyond max_regression."""
+    regressions = []
+
+    def check(name, new, old, higher_is_worse=True):
+        if not new or not old:
+            return
+        change = (new - old) / old if higher_is_worse else (old - new) / old
+        marker = "❌" if change > max_regression else "  "
+        print(f"{marker} {name:<22}{old:>10.2f} -> {new:>10.2f} ({change * 100:+.1f}%)")
+        if change > max_regression:
+            regressions.append(f"{name} {change * 100:.1f}% worse")
+
+    print(f"\n🔍 Compared with baseline {baseline.get('commit') or ''} ({baseline.get('timestamp', '')}), "
+          f"positive = worse:")
+    check("fps", report["fps"], baseline.get("fps"), higher_is_worse=False)
+    for stage, stats in report["stages"].items():
+        old = (baseline.get("stages") or {}).get(stage)
+        if stats and old and old["p95"] >= min_ms:
+            check(f"{stage} p95 ms", stats["p95"], old["p95"])
+    check("peak_rss_mb", report["peak_rss_mb"], baseline.get("peak_rss_mb"))
+    return regressions
+
+def main():
+    args = parse_args()
+    print(f"🚀 Benchmarking {args.model} ({args.backend}) on {args.source or 'synthetic frames'}")
+    report = run_benchmark(args)
+    print_report(report)
+
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"📁 Report written to {args.json}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.max_regression, args.min_ms)
+        if regressions:
+            print(f"❌ Performance regression: {', '.join(regressions)}")
+            sys.exit(1)
+        print("✅ No regression beyond the threshold")
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,23 @@
 YOLO Object Detection Inference Script
 """
 import os
+import sys
+import glob
+import time
+import json
+import hashlib
 import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import cv2
+import numpy as np
 from ultralytics import YOLO
 
+# Project modules live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from model_export import BACKENDS, DEFAULT_DATA, export_model
+from tiled_inference import MERGE_METHODS, TiledPredictor
+
 def parse_args():
     parser = argparse.ArgumentParser(description='YOLO Inference Script')
     parser.add_argument('--model', type=str, default='yolo-project/models/yolov8n.pt',
@@ -19,9 +32,43 @@ def parse_args():
                         help='Confidence threshold')
     parser.add_argument('--device', type=str, default='cpu',
                         help='Device to use (0 for GPU, cpu for CPU)')
+    parser.add_argument('--stream', action='store_true',
+                        help='Consume results as a generator (constant memory on long videos / large directories)')
+    parser.add_argument('--batch-size', type=int, default=1,
+                        help='Images per forward pass in stream mode (directories, videos, .txt lists)')
+    parser.add_argument('--results', type=str, default=None,
+                        help='Detections file written incrementally in stream mode (.jsonl or .parquet), '
+                             'default: <output>/exp/detections.jsonl')
+    parser.add_argument('--no-save', action='store_true',
+                        help='Do not save annotated images/videos')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='Shard a directory, glob or video across N processes (0 = single process)')
+    parser.add_argument('--threads-per-worker', type=int, default=0,
+                        help='torch intra-op threads per worker (0 = CPU cores / workers)')
+    parser.add_argument('--chunk-size', type=int, default=64,
+                        help='Images per work item in sharded mode')
+    parser.add_argument('--segment-frames', type=int, default=0,
+                        help='Frames per video segment in sharded mode (0 = auto)')
+    parser.add_argument('--backend', type=str, default='pt', choices=BACKENDS,
+                        help='Inference runtime: PyTorch, or an ONNX / OpenVINO export (cached, CPU)')
+    parser.add_argument('--imgsz', type=int, default=640,
+                        help='Inference size (also the input size of --backend onnx/openvino exports)')
+    parser.add_argument('--int8', action='store_true',
+                        help='INT8-quantize the OpenVINO export, calibrated on --data')
+    parser.add_argument('--data', type=str, default=DEFAULT_DATA,
+                        help='Dataset YAML for INT8 calibration and the export accuracy check')
+    parser.add_argument('--tile', type=int, default=0,
+                        help='Tiled inference for high-resolution sources: tile size in pixels (0 = off)')
+    parser.add_argument('--tile-overlap', type=float, default=0.2, help='Overlap between neighbouring tiles')
+    parser.add_argument('--tile-batch', type=int, default=8, help='Tiles per forward pass')
+    parser.add_argument('--tile-merge', type=str, default='nms', choices=MERGE_METHODS,
+                        help='Merge tile detections with class-aware NMS or weighted box fusion')
+    parser.add_argument('--merge-iou', type=float, default=0.5, help='Overlap at which tile detections are merged')
+    parser.add_argument('--no-full-pass', action='store_true',
+                        help='Skip the extra full-image pass (it keeps large objects whole)')
     return parser.parse_args()
 
-def run_inference(model_name, source, output_dir, conf=0.25, device='cpu'):
+def run_inference(model_name, source, output_dir, conf=0.25, device='cpu', save_images=True, imgsz=640):
     print(f"🚀 Starting YOLO Inference")
     print(f"📊 Model: {model_name}")
     print(f"📷 Source: {source}")
@@ -30,15 +77,392 @@ def run_inference(model_name, source, output_dir, conf=0.25, device='cpu'):
     yolo_model = YOLO(model_name)
     
     # Run inference
-    results = yolo_model.predict(source=source, conf=conf, device=device, save=True, project=output_dir, name='exp')
+    results = yolo_model.predict(source=source, conf=conf, imgsz=imgsz, device=device, save=save_images,
+                                 project=output_dir, name='exp')
     
     print(f"✅ Inference completed. Results saved in {output_dir}/exp")
     return results
 
+class DetectionWriter:
+    def __init__(self, path, flush_rows=10000):
+        """
+        Writes detections incrementally, one record per image/frame.
+        .jsonl: one JSON line per frame; .parquet: one row per detection, written in row groups
+        (requires pyarrow). Nothing accumulates beyond flush_rows.
+        """
+        self.path = path
+        self.flush_rows = flush_rows
+        self.frames = 0
+        self.detections = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.parquet = path.endswith(".parquet")
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            self._pa = pa
+            self._schema = pa.schema([
+                ("source", pa.string()), ("frame", pa.int64()),
+                ("x1", pa.float32()), ("y1", pa.float32()), ("x2", pa.float32()), ("y2", pa.float32()),
+                ("conf", pa.float32()), ("cls", pa.int32()), ("name", pa.string()),
+            ])
+            self._writer = pq.ParquetWriter(path, self._schema)
+            self._rows = {name: [] for name in self._schema.names}
+        else:
+            self._file = open(path, "w")
+
+    def write(self, result, frame_index, source=None):
+        source = source or result.path
+        boxes = result.boxes
+        # Models without boxes (e.g. classification) still get one record per frame
+        data = boxes.data.cpu().numpy() if boxes is not None else np.zeros((0, 6), dtype=np.float32)
+        names = result.names
+        self.frames += 1
+        self.detections += len(data)
+        if self.parquet:
+            for x1, y1, x2, y2, *rest in data.tolist():
+                conf, cls = rest[-2], int(rest[-1])
+                for key, value in zip(self._schema.names,
+                                      (source, frame_index, x1, y1, x2, y2, conf, cls, names[cls])):
+                    self._rows[key].append(value)
+            if len(self._rows["source"]) >= self.flush_rows:
+                self._flush_parquet()
+        else:
+            record = {
+                "source": source,
+                "frame": frame_index,
+                "shape": list(result.orig_shape),
+                "detections": [
+                    {"box": [round(v, 2) for v in row[:4]], "conf": round(row[-2], 4),
+                     "cls": int(row[-1]), "name": names[int(row[-1])]}
+                    for row in data.tolist()
+                ],
+            }
+            self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    def _flush_parquet(self):
+        if self._rows["source"]:
+            self._writer.write_table(self._pa.table(self._rows, schema=self._schema))
+            self._rows = {name: [] for name in self._schema.names}
+
+    def close(self):
+        if self.parquet:
+            self._flush_parquet()
+            self._writer.close()
+        else:
+            self._file.close()
+
+def run_streaming_inference(model_name, source, output_dir, conf=0.25, device='cpu', batch_size=1,
+                            save_images=True, results_path=None, imgsz=640):
+    """
+    Memory-bounded inference: results are consumed one at a time from the predict generator,
+    written to results_path as they arrive and then released.
+    """
+    print(f"🚀 Starting YOLO Streaming Inference")
+    print(f"📊 Model: {model_name}")
+    print(f"📷 Source: {source}")
+
+    if results_path is None:
+        results_path = os.path.join(output_dir, 'exp', 'detections.jsonl')
+
+    yolo_model = YOLO(model_name)
+    writer = DetectionWriter(results_path)
+    frame_counters = {}
+
+    start = time.time()
+    try:
+        for r in yolo_model.predict(source=source, conf=conf, imgsz=imgsz, device=device, stream=True, batch=batch_size,
+                                    save=save_images, project=output_dir, name='exp', exist_ok=True,
+                                    verbose=False):
+            # Frame index within each source file (0 for still images)
+            frame_index = frame_counters.get(r.path, 0)
+            frame_counters[r.path] = frame_index + 1
+            writer.write(r, frame_index)
+    finally:
+        writer.close()
+    elapsed = time.time() - start
+
+    fps = writer.frames / elapsed if elapsed > 0 else 0.0
+    print(f"✅ Streaming inference completed: {writer.frames} frame(s), {writer.detections} detection(s)")
+    print(f"⏱️ {elapsed:.1f}s total, {fps:.2f} frames/s (batch size {batch_size})")
+    print(f"📁 Detections written to {results_path}")
+    return {"frames": writer.frames, "detections": writer.detections, "seconds": elapsed, "fps": fps}
+
+def _iter_frames(paths):
+    """Yields (path, frame_index, image) for image files and every frame of video files."""
+    from ultralytics.data.utils import VID_FORMATS
+    for path in paths:
+        if os.path.splitext(path)[1][1:].lower() in VID_FORMATS:
+            cap = cv2.VideoCapture(path)
+            frame_index = 0
+            while True:
+                success, frame = cap.read()
+                if not success:
+                    break
+                yield path, frame_index, frame
+                frame_index += 1
+            cap.release()
+        else:
+            image = cv2.imread(path)
+            if image is None:
+                print(f"⚠️ Could not read {path}, skipping")
+                continue
+            yield path, 0, image
+
+def run_tiled_inference(model_name, source, output_dir, conf=0.25, device='cpu', tile=640, overlap=0.2,
+                        tile_batch=8, merge='nms', merge_iou=0.5, full_pass=True, save_images=True,
+                        results_path=None, imgsz=None):
+    """
+    Sliced inference for high-resolution images/videos: each frame is cut into overlapping tiles
+    that are batched through the model, and the detections are merged back into one result.
+    """
+    from ultralytics.data.utils import VID_FORMATS
+    print(f"🚀 Starting YOLO Tiled Inference (tile {tile}px, overlap {overlap:.0%}, merge {merge})")
+    print(f"📊 Model: {model_name}")
+    print(f"📷 Source: {source}")
+
+    exp_dir = os.path.join(output_dir, 'exp')
+    os.makedirs(exp_dir, exist_ok=True)
+    if results_path is None:
+        results_path = os.path.join(exp_dir, 'detections.jsonl')
+
+    # Exported models have a fixed input size: tiles are fed at that size
+    predictor = TiledPredictor(YOLO(model_name), tile, overlap, tile_batch, full_pass, merge, merge_iou,
+                               imgsz=imgsz, device=device)
+    writer = DetectionWriter(results_path)
+    start = time.time()
+    try:
+        for path, frame_index, image in _iter_frames(expand_source(source)):
+            r = predictor.predict(image, conf, path=path)
+            writer.write(r, frame_index)
+            if save_images:
+                stem, ext = os.path.splitext(os.path.basename(path))
+                name = f"{stem}_{frame_index:06d}.jpg" if ext[1:].lower() in VID_FORMATS else f"{stem}{ext}"
+                r.save(filename=os.path.join(exp_dir, name))
+    finally:
+        writer.close()
+    elapsed = time.time() - start
+
+    stats = predictor.stats
+    fps = writer.frames / elapsed if elapsed > 0 else 0.0
+    print(f"✅ Tiled inference completed: {writer.frames} frame(s), {writer.detections} detection(s)")
+    print(f"⏱️ {elapsed:.1f}s total, {fps:.2f} frames/s, {stats['tiles'] / max(stats['images'], 1):.1f} tiles "
+          f"and {stats['forward_passes'] / max(stats['images'], 1):.1f} forward pass(es) per frame")
+    print(f"📁 Detections written to {results_path}")
+    return {"frames": writer.frames, "detections": writer.detections, "seconds": elapsed, "fps": fps}
+
+# --- Sharded multi-process inference ---
+
+_worker_model = None
+_worker_options = None
+
+def expand_source(source):
+    """Directory, glob pattern or single file -> sorted list of image/video files."""
+    from ultralytics.data.utils import IMG_FORMATS, VID_FORMATS
+    if os.path.isdir(source):
+        paths = [os.path.join(source, name) for name in os.listdir(source)]
+    elif any(ch in source for ch in "*?["):
+        paths = glob.glob(source, recursive=True)
+    else:
+        paths = [source]
+    media = [p for p in paths if os.path.isfile(p) and
+             os.path.splitext(p)[1][1:].lower() in IMG_FORMATS | VID_FORMATS]
+    return sorted(media)
+
+def source_root(source):
+    """Directory the files of a source are found under (the fixed prefix of a glob pattern)."""
+    if os.path.isdir(source):
+        return source
+    if any(ch in source for ch in "*?["):
+        prefix = []
+        for part in source.replace("\\", "/").split("/"):
+            if any(ch in part for ch in "*?["):
+                break
+            prefix.append(part)
+        return "/".join(prefix) or "."
+    return os.path.dirname(source) or "."
+
+def plan_work_items(paths, workers, chunk_size=64, segment_frames=0, root=None):
+    """
+    Splits the input into deterministic work items:
+      - images are grouped into chunks of chunk_size files
+      - videos are split into frame ranges of segment_frames (auto: ~4 segments per worker)
+    Each item has a stable key so a resumed run recognises completed work. Video keys use the
+    path relative to root, so same-named videos in different sub-directories stay apart.
+    """
+    from ultralytics.data.utils import VID_FORMATS
+    images = [p for p in paths if os.path.splitext(p)[1][1:].lower() not in VID_FORMATS]
+    videos = [p for p in paths if os.path.splitext(p)[1][1:].lower() in VID_FORMATS]
+
+    items = []
+    for i in range(0, len(images), chunk_size):
+        chunk = images[i:i + chunk_size]
+        digest = hashlib.sha1("\n".join(chunk).encode("utf-8")).hexdigest()[:12]
+        items.append({"key": f"images-{i // chunk_size:05d}-{digest}", "kind": "images", "paths": chunk})
+
+    for video in videos:
+        cap = cv2.VideoCapture(video)
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        if total <= 0:
+            print(f"⚠️ Could not read frame count of {video}, skipping")
+            continue
+        seg = segment_frames or max(1, -(-total // (workers * 4)))
+        rel = os.path.relpath(video, root) if root else video
+        digest = hashlib.sha1(rel.replace(os.sep, "/").encode("utf-8")).hexdigest()[:8]
+        for start in range(0, total, seg):
+            end = min(start + seg, total)
+            items.append({"key": f"video-{os.path.basename(video)}-{digest}-{start:08d}-{end:08d}",
+                          "kind": "video", "path": video, "start": start, "end": end})
+    return items
+
+def _init_worker(model_name, device, conf, batch_size, threads, imgsz=640):
+    """Runs once per worker process: pin the torch thread count and load the model once."""
+    global _worker_model, _worker_options
+    import torch
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # already set in this process
+    _worker_model = YOLO(model_name)
+    _worker_options = {"device": device, "conf": conf, "batch_size": batch_size, "imgsz": imgsz}
+
+def _read_video_segment(path, start, end, batch_size):
+    """Yields (frame_index, frame) batches for frames [start, end) of a video."""
+    cap = cv2.VideoCapture(path)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    batch = []
+    for frame_index in range(start, end):
+        success, frame = cap.read()
+        if not success:
+            break
+        batch.append((frame_index, frame))
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+    cap.release()
+
+def _process_item(item, part_path, save_images, output_dir):
+    """Worker entry point: runs one work item and writes its detections to part_path."""
+    opts = _worker_options
+    writer = DetectionWriter(part_path + ".tmp" + os.path.splitext(part_path)[1])
+    if item["kind"] == "images":
+        for r in _worker_model.predict(source=item["paths"], conf=opts["conf"], imgsz=opts["imgsz"],
+                                       device=opts["device"], stream=True, batch=opts["batch_size"], save=save_images,
+                                       project=output_dir, name='exp', exist_ok=True, verbose=False):
+            writer.write(r, 0)
+    else:
+        for batch in _read_video_segment(item["path"], item["start"], item["end"], opts["batch_size"]):
+            results = _worker_model.predict(source=[frame for _, frame in batch], conf=opts["conf"],
+                                            imgsz=opts["imgsz"], device=opts["device"], verbose=False)
+            for (frame_index, _), r in zip(batch, results):
+                writer.write(r, frame_index, source=item["path"])
+    writer.close()
+    # Only a complete part becomes visible, so a crash never leaves half a shard behind
+    os.replace(writer.path, part_path)
+    return item["key"], writer.frames, writer.detections
+
+def _merge_parts(part_paths, results_path):
+    """Concatenates part files in work-item order, so the output is identical across runs."""
+    if results_path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        writer = None
+        for path in part_paths:
+            table = pq.read_table(path)
+            if writer is None:
+                writer = pq.ParquetWriter(results_path, table.schema)
+            writer.write_table(table)
+        if writer is not None:
+            writer.close()
+    else:
+        with open(results_path, "wb") as out:
+            for path in part_paths:
+                with open(path, "rb") as f:
+                    out.write(f.read())
+
+def run_sharded_inference(model_name, source, output_dir, conf=0.25, device='cpu', workers=4,
+                          batch_size=1, save_images=False, results_path=None, threads_per_worker=0,
+                          chunk_size=64, segment_frames=0, imgsz=640):
+    """
+    Shards a directory, glob or video across a process pool.
+    Each worker loads the model once; completed items are recorded in a manifest so an
+    interrupted run resumes where it stopped. Parts are merged in plan order at the end.
+    """
+    print(f"🚀 Starting YOLO Sharded Inference ({workers} workers)")
+    print(f"📊 Model: {model_name}")
+    print(f"📷 Source: {source}")
+
+    exp_dir = os.path.join(output_dir, 'exp')
+    parts_dir = os.path.join(exp_dir, 'parts')
+    os.makedirs(parts_dir, exist_ok=True)
+    if results_path is None:
+        results_path = os.path.join(exp_dir, 'detections.jsonl')
+    ext = os.path.splitext(results_path)[1]
+    manifest_path = os.path.join(exp_dir, 'manifest.jsonl')
+
+    items = plan_work_items(expand_source(source), workers, chunk_size, segment_frames, source_root(source))
+    part_paths = {item["key"]: os.path.join(parts_dir, f"{item['key']}{ext}") for item in items}
+
+    done = set()
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            done = {json.loads(line)["key"] for line in f if line.strip()}
+        done &= {key for key, path in part_paths.items() if os.path.exists(path)}
+    pending = [item for item in items if item["key"] not in done]
+    print(f"📋 {len(items)} work item(s), {len(done)} already done, {len(pending)} to run")
+
+    threads = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+    frames = detections = 0
+    start = time.time()
+    if pending:
+        # spawn: each worker starts clean and owns its torch thread pool
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                                 initargs=(model_name, device, conf, batch_size, threads, imgsz)) as pool, \
+                open(manifest_path, "a") as manifest:
+            futures = [pool.submit(_process_item, item, part_paths[item["key"]], save_images, output_dir)
+                       for item in pending]
+            for future in as_completed(futures):
+                key, n_frames, n_dets = future.result()
+                frames += n_frames
+                detections += n_dets
+                manifest.write(json.dumps({"key": key, "frames": n_frames, "detections": n_dets}) + "\n")
+                manifest.flush()
+    elapsed = time.time() - start
+
+    _merge_parts([part_paths[item["key"]] for item in items], results_path)
+
+    fps = frames / elapsed if elapsed > 0 else 0.0
+    print(f"✅ Sharded inference completed: {frames} new frame(s), {detections} detection(s)")
+    print(f"⏱️ {elapsed:.1f}s total, {fps:.2f} frames/s ({workers} workers x {threads} threads)")
+    print(f"📁 Detections written to {results_path}")
+    return {"frames": frames, "detections": detections, "seconds": elapsed, "fps": fps}
+
 def main():
     args = parse_args()
+    if args.tile > 0 and args.workers > 0:
+        raise SystemExit("❌ --tile runs in a single process and cannot be combined with --workers")
     os.makedirs(args.output, exist_ok=True)
-    run_inference(args.model, args.source, args.output, args.conf, args.device)
+    if args.backend != 'pt':
+        # Export once (cached by model hash + settings); every mode below just loads the exported model
+        args.model = export_model(args.model, args.backend, args.imgsz, args.int8, args.data)
+        print(f"📦 Using {args.backend} model: {args.model}")
+    if args.tile > 0:
+        run_tiled_inference(args.model, args.source, args.output, args.conf, args.device, args.tile,
+                            args.tile_overlap, args.tile_batch, args.tile_merge, args.merge_iou,
+                            not args.no_full_pass, not args.no_save, args.results,
+                            args.imgsz if args.backend != 'pt' else None)
+    elif args.workers > 0:
+        run_sharded_inference(args.model, args.source, args.output, args.conf, args.device, args.workers,
+                              args.batch_size, not args.no_save, args.results, args.threads_per_worker,
+                              args.chunk_size, args.segment_frames, args.imgsz)
+    elif args.stream:
+        run_streaming_inference(args.model, args.source, args.output, args.conf, args.device,
+                                args.batch_size, not args.no_save, args.results, args.imgsz)
+    else:
+        run_inference(args.model, args.source, args.output, args.conf, args.device, not args.no_save, args.imgsz)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Offline re-tracking: cache detections once, then sweep ByteTrack parameters in seconds
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import yaml
+
+# Project modules live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from detection_cache import DetectionCache, build_detection_cache, gt_stats, load_mot_gt, retrack, track_stats
+from tracking_utils import DEFAULT_TRACKER_CONFIG, load_tracker_config
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Cache detections and sweep ByteTrack parameters offline')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    cache = sub.add_parser('cache', help='Run the detector once and store per-frame detections')
+    cache.add_argument('--model', type=str, default='yolo11n.pt', help='Detection model')
+    cache.add_argument('--source', type=str, required=True, help='Video file')
+    cache.add_argument('--out', type=str, default=None, help='Cache file (default: <video>.detections.npz)')
+    cache.add_argument('--conf', type=float, default=0.05,
+                       help='Confidence floor (keep it below the lowest track_low_thresh to sweep)')
+    cache.add_argument('--iou', type=float, default=0.7, help='NMS IoU threshold')
+    cache.add_argument('--imgsz', type=int, default=640, help='Inference size')
+    cache.add_argument('--classes', type=int, nargs='*', default=None, help='Only keep these class IDs')
+    cache.add_argument('--device', type=str, default=None, help='Device (cpu, 0, ...)')
+
+    sweep = sub.add_parser('sweep', help='Replay a detection cache through many tracker configs')
+    sweep.add_argument('--cache', type=str, required=True, help='Detection cache from the "cache" command')
+    sweep.add_argument('--tracker', type=str, default=DEFAULT_TRACKER_CONFIG, help='Base ByteTrack YAML')
+    sweep.add_argument('--set', dest='grid', action='append', default=[], metavar='KEY=V1,V2,...',
+                       help='Values to sweep for one tracker key (repeat for a grid), '
+                            'e.g. --set track_buffer=30,60,100 --set match_thresh=0.7,0.8')
+    sweep.add_argument('--gt', type=str, default=None,
+                       help='MOTChallenge gt.txt for true ID switches / fragmentations')
+    sweep.add_argument('--handover-gap', type=int, default=30,
+                       help='Frames within which a new ID on top of an ended track counts as an ID switch '
+                            '(same for every config, so keep it >= the largest track_buffer swept)')
+    sweep.add_argument('--coverage-conf', type=float, default=0.5,
+                       help='Cached detections at or above this confidence should end up in a track (coverage)')
+    sweep.add_argument('--min-coverage', type=float, default=0.5,
+                       help='Configs tracking less than this share of those detections rank last and are '
+                            'never written by --write-best (tracking nothing also means no ID switches)')
+    sweep.add_argument('--workers', type=int, default=0, help='Processes (0 = CPU cores)')
+    sweep.add_argument('--json', type=str, default=None, help='Write all results to this JSON file')
+    sweep.add_argument('--write-best', type=str, default=None,
+                       help='Save the best config as a tracker YAML (usable with live_track.py --tracker)')
+    return parser.parse_args()
+
+def parse_grid(items):
+    """['track_buffer=30,60', 'match_thresh=0.7,0.8'] -> list of override dicts (cartesian product)."""
+    keys, values = [], []
+    for item in items:
+        key, _, raw = item.partition('=')
+        if not raw:
+            raise SystemExit(f"❌ Expected KEY=V1,V2,... got '{item}'")
+        keys.append(key.strip())
+        values.append([yaml.safe_load(v) for v in raw.split(',')])
+    return [dict(zip(keys, combo)) for combo in itertools.product(*values)]
+
+# --- Sweep workers: each process loads the cache once ---
+
+_worker_cache = None
+_worker_gt = None
+_worker_gap = 30
+_worker_detections = 0
+
+def _init_worker(cache_path, gt_path, handover_gap, coverage_conf):
+    global _worker_cache, _worker_gt, _worker_gap, _worker_detections
+    _worker_cache = DetectionCache(cache_path)
+    _worker_gt = load_mot_gt(gt_path) if gt_path else None
+    _worker_gap = handover_gap
+    _worker_detections = int((_worker_cache.scores >= coverage_conf).sum())
+
+def _run_config(index, overrides, cfg):
+    frames, seconds = retrack(_worker_cache, cfg)
+    stats = track_stats(frames, handover_gap=_worker_gap, detections=_worker_detections)
+    if _worker_gt is not None:
+        stats.update(gt_stats(frames, _worker_gt))
+    stats["seconds"] = seconds
+    stats["fps"] = len(frames) / seconds if seconds > 0 else 0.0
+    return index, overrides, stats
+
+def run_sweep(args):
+    cache = DetectionCache(args.cache)
+    combos = parse_grid(args.grid) or [{}]
+    configs = [load_tracker_config(args.tracker, **combo) for combo in combos]
+    print(f"🚀 Re-tracking {len(cache)} cached frame(s) of {cache.meta['source']} with {len(configs)} config(s)")
+
+    workers = min(args.workers or os.cpu_count() or 1, len(configs))
+    start = time.time()
+    # spawn: each worker starts clean (same as scripts/predict.py sharding)
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                             initargs=(args.cache, args.gt, args.handover_gap, args.coverage_conf)) as pool:
+        futures = [pool.submit(_run_config, i, combo, cfg) for i, (combo, cfg) in enumerate(zip(combos, configs))]
+        rows = sorted(f.result() for f in futures)
+    elapsed = time.time() - start
+
+    # Configs below the coverage floor go last. Then fewest ID switches (ground truth if given); with
+    # ground truth, then fewest fragmentations; without it, fewer and longer tracks (a re-acquired ID
+    # is a success, not a fragment)
+    def low(stats):
+        return stats["coverage"] < args.min_coverage
+
+    if args.gt:
+        key, second = "gt_id_switches", "gt_fragments"
+        ranked = sorted(rows, key=lambda r: (low(r[2]), r[2][key], r[2][second], r[2]["short_tracks"]))
+    else:
+        key, second = "id_switches", "reacquired"
+        ranked = sorted(rows, key=lambda r: (low(r[2]), r[2][key], r[2]["tracks"], -r[2]["mean_length"]))
+
+    second_name = "frag" if args.gt else "reacq"
+    print(f"\n{'config':<44}{'IDsw':>6}{second_name:>6}{'tracks':>8}{'short':>7}{'len':>7}{'cover':>7}{'ms':>8}")
+    for _, overrides, stats in ranked:
+        name = ", ".join(f"{k}={v}" for k, v in overrides.items()) or "(base config)"
+        flag = " ⚠️ low coverage" if low(stats) else ""
+        print(f"{name:<44}{stats[key]:>6}{stats[second]:>6}{stats['tracks']:>8}{stats['short_tracks']:>7}"
+              f"{stats['mean_length']:>7.1f}{stats['coverage']:>7.0%}{stats['seconds'] * 1000:>8.1f}{flag}")
+    print(f"\n✅ {len(configs)} config(s) in {elapsed:.1f}s with {workers} worker(s)")
+    if not args.gt:
+        print(f"ℹ️ Without --gt, ID switches are estimated: new IDs that start on top of a track that ended "
+              f"within {args.handover_gap} frames")
+
+    best_index, best_overrides, best_stats = ranked[0]
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w") as f:
+            json.dump({"cache": cache.meta, "base": args.tracker,
+                       "results": [{"overrides": o, "stats": s} for _, o, s in rows]}, f, indent=2)
+        print(f"📁 Results written to {args.json}")
+    if args.write_best and low(best_stats):
+        print(f"⚠️ No config tracks at least {args.min_coverage:.0%} of the detections with conf >= "
+              f"{args.coverage_conf}; not writing {args.write_best}")
+    elif args.write_best:
+        with open(args.write_best, "w") as f:
+            f.write(f"# Best of {len(configs)} config(s) from scripts/retrack.py on {cache.meta['source']}\n")
+            yaml.safe_dump(configs[best_index], f, sort_keys=False)
+        print(f"📁 Best config ({best_overrides or 'base'}) written to {args.write_best}")
+
+def run_cache(args):
+    from ultralytics import YOLO
+    out = args.out or os.path.splitext(args.source)[0] + ".detections.npz"
+    print(f"🚀 Caching detections of {args.source} with {args.model} (conf >= {args.conf})")
+    meta = build_detection_cache(YOLO(args.model), args.source, out, args.conf, args.iou, args.imgsz,
+                                 args.classes, args.device)
+    size = os.path.getsize(out) / 1024
+    print(f"✅ {meta['frames']} frame(s) in {meta['seconds']:.1f}s -> {out} ({size:.0f} KiB)")
+
+def main():
+    args = parse_args()
+    if args.command == 'cache':
+        run_cache(args)
+    else:
+        run_sweep(args)
+
+if __name__ == "__main__":
+    main()
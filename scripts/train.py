@@ -9,6 +9,9 @@ import yaml
 from datetime import datetime
 from ultralytics import YOLO
 
+# Project modules live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 def parse_args():
     parser = argparse.ArgumentParser(description='YOLO Training Script')
     parser.add_argument('--data', type=str, default='data/dataset.yaml',
@@ -29,6 +32,28 @@ def parse_args():
                         help='Experiment name')
     parser.add_argument('--workers', type=int, default=4,
                         help='Number of worker threads')
+    parser.add_argument('--cache', type=str, default='none', choices=['mmap', 'ram', 'disk', 'none'],
+                        help='Image cache: mmap = decoded + resized once into shared memory-mapped shards '
+                             '(reused across runs), ram/disk = ultralytics caches, none = decode every epoch')
+    parser.add_argument('--cache-dir', type=str, default=None,
+                        help='Where the mmap image cache lives (default: .mmap_cache next to the dataset YAML)')
+    parser.add_argument('--minio-cache-dir', type=str, default=None,
+                        help='Local LRU cache for datasets streamed from MinIO (path: minio://bucket/prefix), '
+                             'shared by all jobs on the node (default: $YOLO_DATA_CACHE or ~/.cache/yolo-minio)')
+    parser.add_argument('--minio-cache-gb', type=float, default=50,
+                        help='Size limit of the MinIO image cache in GB (least recently used images are evicted)')
+    parser.add_argument('--minio-workers', type=int, default=16,
+                        help='Parallel MinIO downloads (pooled connections)')
+    parser.add_argument('--profile', action='store_true',
+                        help='Log images/sec, dataloader wait vs compute, peak memory and epoch time per epoch')
+    parser.add_argument('--autotune', action='store_true',
+                        help='Probe batch size / worker combinations first and train with the fastest stable one')
+    parser.add_argument('--tune-batches', type=str, default='8,16,32',
+                        help='Batch sizes tried by --autotune')
+    parser.add_argument('--tune-workers', type=str, default=None,
+                        help='Dataloader workers tried by --autotune (default: 0,2,4,... up to the CPU count)')
+    parser.add_argument('--tune-steps', type=int, default=20,
+                        help='Measured steps per --autotune probe')
     return parser.parse_args()
 
 def setup_logging():
@@ -46,6 +71,14 @@ def setup_logging():
     
     return log_file
 
+def default_tune_workers():
+    cpus = os.cpu_count() or 1
+    workers, n = [0], 2
+    while n < cpus:
+        workers.append(n)
+        n *= 2
+    return workers + [cpus] if cpus > 1 else workers
+
 def main():
     args = parse_args()
     log_file = setup_logging()
@@ -82,21 +115,68 @@ def main():
         # Load model
         print("📥 Loading model...")
         model = YOLO(args.model)
-        
+        trainer = None
+
+        # Dataset in MinIO: sync labels + list images, then stream images into the local LRU cache
+        with open(args.data) as f:
+            data_path = (yaml.safe_load(f) or {}).get('path')
+        if isinstance(data_path, str) and data_path.startswith('minio://'):
+            from minio_dataset import DEFAULT_CACHE_DIR, minio_trainer, prepare_minio_dataset
+            cache_dir = args.minio_cache_dir or DEFAULT_CACHE_DIR
+            args.data, sources = prepare_minio_dataset(args.data, cache_dir, int(args.minio_cache_gb * 2 ** 30),
+                                                       args.minio_workers)
+            trainer = minio_trainer(model.task_map[model.task]['trainer'], sources)
+            print(f"🪣 Streaming {data_path} via {cache_dir} ({args.minio_cache_gb:g} GB LRU cache)")
+            if args.cache == 'mmap':
+                # The mmap cache needs every image up front, which defeats streaming
+                print("ℹ️ --cache mmap is not used for MinIO datasets")
+                args.cache = 'none'
+
+        # Decode + resize every image once; all epochs and later runs slice the memory-mapped shards
+        if args.cache == 'mmap':
+            from train_cache import mmap_trainer
+            cache_dir = args.cache_dir or os.path.join(os.path.dirname(os.path.abspath(args.data)), '.mmap_cache')
+            trainer = mmap_trainer(model.task_map[model.task]['trainer'], cache_dir, workers=max(args.workers, 1))
+            print(f"🗄️ Image cache: {cache_dir}")
+
+        # Structured per-epoch throughput log next to the text log
+        profile_log = os.path.splitext(log_file)[0] + '.profile.jsonl'
+        if args.autotune:
+            from train_profiler import autotune
+            batches = [int(b) for b in args.tune_batches.split(',')]
+            workers = [int(w) for w in args.tune_workers.split(',')] if args.tune_workers else default_tune_workers()
+            print(f"🔧 Auto-tuning batch {batches} x workers {workers} ({args.tune_steps} steps each)...")
+            best, _ = autotune(args.model, args.data, batches, workers, imgsz=args.imgsz, device=args.device,
+                               steps=args.tune_steps, trainer=trainer, log_path=profile_log,
+                               train_args={'cache': args.cache if args.cache in ('ram', 'disk') else False})
+            if best is None:
+                print(f"⚠️ No stable setting found, keeping batch={args.batch_size} workers={args.workers}")
+            else:
+                args.batch_size, args.workers = best['batch'], best['workers']
+                print(f"✅ Fastest stable setting: batch={args.batch_size} workers={args.workers} "
+                      f"({best['images_per_sec_median']:.1f} img/s)")
+                with open(log_file, 'a') as f:
+                    f.write(f"Autotune: batch={args.batch_size} workers={args.workers}\n")
+        if args.profile:
+            from train_profiler import TrainProfiler
+            TrainProfiler(profile_log).attach(model)
+            print(f"⏱️ Profiling to {profile_log}")
+
         # Start training
         print("🏃 Starting training...")
         results = model.train(
+            trainer=trainer,
             data=args.data,
             epochs=args.epochs,
             imgsz=args.imgsz,
-            batch_size=args.batch_size,
+            batch=args.batch_size,
             device=args.device,
             project=args.project,
             name=args.name,
             workers=args.workers,
             save=True,
             save_period=5,
-            cache=False,
+            cache=args.cache if args.cache in ('ram', 'disk') else False,
             verbose=True,
             seed=42
         )
@@ -128,7 +208,7 @@ def main():
         try:
             model = YOLO('yolov8n.pt')
             # Use COCO dataset for demo
-            results = model.train(data='coco128.yaml', epochs=5, imgsz=320, batch_size=8)
+            results = model.train(data='coco128.yaml', epochs=5, imgsz=320, batch=8)
             print("✅ Demo training completed successfully!")
         except Exception as demo_e:
             print(f"❌ Demo training also failed: {str(demo_e)}")
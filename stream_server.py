@@ -0,0 +1,253 @@
+import time
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import cv2
+from metrics import NULL_METRICS
+
+BOUNDARY = "frame"
+PAGE = """<!doctype html><html><head><title>{title}</title></head>
+<body style="margin:0;background:#111;color:#ccc;font-family:sans-serif">
+<p style="margin:8px">{title} &middot; <a style="color:#8cf" href="/stream?width=640&fps=5">640px @ 5 fps</a>
+&middot; <a style="color:#8cf" href="/stream?width=320&fps=2&quality=60">320px @ 2 fps</a>
+&middot; <a style="color:#8cf" href="/snapshot.jpg">snapshot</a></p>
+<img src="/stream" style="max-width:100%"></body></html>"""
+
+
+class StreamServer:
+    def __init__(self, port=8080, host="127.0.0.1", quality=80, max_fps=15.0, widths=(320, 480, 640, 960, 1280),
+                 send_timeout=10.0, title="YOLO11 Live Pose", metrics=NULL_METRICS):
+        """
+        MJPEG server for the annotated stream: GET /stream (multipart/x-mixed-replace, plays in
+        any browser <img>), /snapshot.jpg and a small index page at /.
+        - publish(frame) only swaps a reference; one encoder thread JPEG-encodes each frame once
+          per tier (width, quality) that has viewers, and every viewer of a tier gets the same bytes.
+        - Viewers choose ?width=, ?fps= and ?quality= (snapped to `widths` / steps of 10, fps capped
+          at max_fps). Each viewer always sends the newest JPEG: a slow client skips frames instead
+          of queueing them, and one that stalls for send_timeout seconds is disconnected.
+        - With no viewers wants_frame() is False, so the caller can skip rendering and nothing is
+          encoded; tiers are also only encoded as often as their fastest viewer asks for.
+        """
+        self.port = port
+        self.host = host
+        self.quality = quality
+        self.max_fps = max_fps
+        self.widths = tuple(sorted(widths))
+        self.send_timeout = send_timeout
+        self.title = title
+        self.metrics = metrics
+
+        self._cond = threading.Condition()
+        self._viewers = {}
+        self._tiers = {}
+        self._next_viewer = 0
+        self._viewer_fps = 0.0  # fastest viewer, 0 = nobody watching
+        self._frame = None
+        self._frame_seq = 0
+        self._last_publish = 0.0
+        self._running = False
+        self._server = None
+        self.stats = {"published": 0, "encoded": 0, "sent": 0, "skipped": 0, "bytes": 0, "viewers_total": 0}
+        metrics.gauge("stream_viewers", lambda: self.viewers)
+        for key in ("published", "encoded", "sent", "skipped", "bytes"):
+            metrics.gauge(f"stream_{key}", lambda key=key: self.stats[key])
+
+    # --- Producer API (render loop) ---
+
+    @property
+    def viewers(self):
+        return len(self._viewers)
+
+    def wants_frame(self, now=None):
+        """True if someone is watching and the fastest viewer is due for a new frame."""
+        fps = self._viewer_fps
+        if not fps:
+            return False
+        now = time.monotonic() if now is None else now
+        return now - self._last_publish >= 0.9 / fps
+
+    def publish(self, frame):
+        """Hands the newest annotated frame to the encoder (the array must not be modified afterwards)."""
+        with self._cond:
+            self._frame = frame
+            self._frame_seq += 1
+            self._last_publish = time.monotonic()
+            self.stats["published"] += 1
+            self._cond.notify_all()
+
+    # --- Encoder thread ---
+
+    def _encoder(self):
+        seen = 0
+        while self._running:
+            with self._cond:
+                self._cond.wait_for(lambda: self._frame_seq != seen or not self._running, timeout=1.0)
+                if self._frame_seq == seen:
+                    continue
+                frame, seen = self._frame, self._frame_seq
+                self._frame = None
+                now = time.monotonic()
+                due = [(key, tier) for key, tier in self._tiers.items()
+                       if tier["viewers"] and now - tier["encoded_at"] >= 0.9 / tier["fps"]]
+            for (width, quality), tier in due:
+                with self.metrics.span("stream_encode"):
+                    h, w = frame.shape[:2]
+                    image = frame
+                    if width and width < w:
+                        image = cv2.resize(frame, (width, max(1, round(h * width / w))), interpolation=cv2.INTER_AREA)
+                    ok, buf = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+                if not ok:
+                    continue
+                with self._cond:
+                    tier["jpeg"] = buf.tobytes()
+                    tier["seq"] += 1
+                    tier["encoded_at"] = now
+                    self.stats["encoded"] += 1
+                    self._cond.notify_all()
+
+    # --- Viewers ---
+
+    def _tier_key(self, query):
+        def number(name, default, cast=float):
+            try:
+                return cast(query.get(name, [default])[0])
+            except (TypeError, ValueError):
+                return default
+        width = number("width", 0, int)
+        # Snap to the largest configured width that fits, so viewers share tiers (0 = full size)
+        if width > 0:
+            width = max([w for w in self.widths if w <= width] or [self.widths[0]])
+        quality = int(round(min(max(number("quality", self.quality, int), 10), 95) / 10.0) * 10)
+        fps = min(max(number("fps", self.max_fps), 0.2), self.max_fps)
+        return (width, quality), fps
+
+    def _add_viewer(self, key, fps):
+        with self._cond:
+            viewer_id = self._next_viewer
+            self._next_viewer += 1
+            tier = self._tiers.setdefault(key, {"jpeg": None, "seq": 0, "encoded_at": 0.0, "viewers": 0, "fps": fps})
+            tier["viewers"] += 1
+            self._viewers[viewer_id] = {"tier": key, "fps": fps}
+            tier["fps"] = max(v["fps"] for v in self._viewers.values() if v["tier"] == key)
+            self._viewer_fps = max(self._viewer_fps, fps)
+            self.stats["viewers_total"] += 1
+            return viewer_id, tier
+
+    def _remove_viewer(self, viewer_id):
+        with self._cond:
+            key = self._viewers.pop(viewer_id)["tier"]
+            tier = self._tiers[key]
+            tier["viewers"] -= 1
+            if tier["viewers"]:
+                tier["fps"] = max(v["fps"] for v in self._viewers.values() if v["tier"] == key)
+            else:
+                del self._tiers[key]
+            self._viewer_fps = max((v["fps"] for v in self._viewers.values()), default=0.0)
+
+    def _next_jpeg(self, tier, last_seq, timeout):
+        """Newest JPEG of the tier once it is newer than last_seq (None on timeout / shutdown)."""
+        with self._cond:
+            self._cond.wait_for(lambda: tier["seq"] != last_seq or not self._running, timeout=timeout)
+            if tier["seq"] == last_seq or tier["jpeg"] is None:
+                return None, last_seq
+            return tier["jpeg"], tier["seq"]
+
+    def _stream(self, handler, query):
+        key, fps = self._tier_key(query)
+        handler.send_response(200)
+        handler.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+        handler.send_header("Cache-Control", "no-cache, private")
+        handler.send_header("Pragma", "no-cache")
+        handler.end_headers()
+        viewer_id, tier = self._add_viewer(key, fps)
+        period = 1.0 / fps
+        last_seq, next_due = 0, time.monotonic()
+        try:
+            while self._running:
+                wait = next_due - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)  # pace to the viewer's fps; frames encoded meanwhile are skipped
+                jpeg, seq = self._next_jpeg(tier, last_seq, timeout=5.0)
+                if jpeg is None:
+                    continue
+                if last_seq and seq > last_seq + 1:
+                    self.stats["skipped"] += seq - last_seq - 1
+                handler.wfile.write(f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                                    f"Content-Length: {len(jpeg)}\r\n\r\n".encode("ascii"))
+                handler.wfile.write(jpeg)
+                handler.wfile.write(b"\r\n")
+                handler.wfile.flush()
+                last_seq = seq
+                self.stats["sent"] += 1
+                self.stats["bytes"] += len(jpeg)
+                # Fixed cadence; a late frame does not cause a burst to catch up
+                next_due = max(next_due, time.monotonic() - 0.5 * period) + period
+        except (BrokenPipeError, ConnectionResetError, socket.timeout, OSError):
+            pass  # viewer went away or stalled longer than send_timeout
+        finally:
+            self._remove_viewer(viewer_id)
+
+    def _snapshot(self, handler, query):
+        key, _ = self._tier_key(query)
+        viewer_id, tier = self._add_viewer(key, self.max_fps)
+        try:
+            jpeg, _ = self._next_jpeg(tier, 0, timeout=5.0)
+        finally:
+            self._remove_viewer(viewer_id)
+        if jpeg is None:
+            handler.send_error(503, "No frame available")
+            return
+        handler.send_response(200)
+        handler.send_header("Content-Type", "image/jpeg")
+        handler.send_header("Content-Length", str(len(jpeg)))
+        handler.send_header("Cache-Control", "no-cache, private")
+        handler.end_headers()
+        handler.wfile.write(jpeg)
+
+    # --- Lifecycle ---
+
+    def start(self):
+        """Starts the HTTP server and the encoder on background threads."""
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def setup(self):
+                super().setup()
+                self.connection.settimeout(server.send_timeout)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                if url.path == "/stream":
+                    server._stream(self, query)
+                elif url.path == "/snapshot.jpg":
+                    server._snapshot(self, query)
+                elif url.path == "/":
+                    body = PAGE.format(title=server.title).encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/html; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                else:
+                    self.send_error(404)
+
+            def log_message(self, *args):
+                pass  # keep viewers out of the console
+
+        self._running = True
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="stream-http", daemon=True).start()
+        threading.Thread(target=self._encoder, name="stream-encoder", daemon=True).start()
+        print(f"Live stream: http://{self.host}:{self.port}/ (MJPEG at /stream?width=640&fps=5)")
+        return self
+
+    def close(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
@@ -0,0 +1,127 @@
+import time
+import numpy as np
+
+MERGE_METHODS = ("nms", "wbf")
+
+
+def tile_windows(height, width, tile=640, overlap=0.2):
+    """
+    Tile windows (x1, y1, x2, y2) covering an image with the given fractional overlap.
+    Every tile has the full tile size (the last row/column is shifted back to the border),
+    so all tiles letterbox to the same input shape and stack into one batch.
+    """
+    step = max(1, int(tile * (1 - overlap)))
+
+    def starts(size):
+        if size <= tile:
+            return [0]
+        positions = list(range(0, size - tile, step))
+        return positions + [size - tile]
+
+    return [(x, y, min(x + tile, width), min(y + tile, height))
+            for y in starts(height) for x in starts(width)]
+
+
+def _overlaps(box, boxes, metric="iou"):
+    """IoU (or intersection over the smaller box, 'ios') of one xyxy box against [N, 4] boxes."""
+    tl = np.maximum(box[:2], boxes[:, :2])
+    br = np.minimum(box[2:], boxes[:, 2:])
+    inter = np.clip(br - tl, 0, None).prod(1)
+    area = (box[2:] - box[:2]).prod()
+    areas = (boxes[:, 2:] - boxes[:, :2]).prod(1)
+    if metric == "ios":
+        return inter / (np.minimum(area, areas) + 1e-9)
+    return inter / (area + areas - inter + 1e-9)
+
+
+def merge_detections(det, method="nms", iou=0.5, metric="iou"):
+    """
+    Merges [N, 6] (x1, y1, x2, y2, conf, cls) detections gathered from overlapping tiles, per class.
+    - nms: keeps the most confident box of every overlapping group.
+    - wbf: weighted box fusion, averaging the group's coordinates by confidence (conf = group max).
+    metric='ios' matches on intersection over the smaller box, which also merges the partial box
+    of an object cut by a tile border into the full one.
+    """
+    if len(det) == 0:
+        return det.reshape(0, 6)
+    merged = []
+    for cls in np.unique(det[:, 5]):
+        group = det[det[:, 5] == cls]
+        group = group[np.argsort(-group[:, 4], kind="stable")]
+        boxes = group[:, :4]
+        remaining = np.ones(len(group), bool)
+        for i in range(len(group)):
+            if not remaining[i]:
+                continue
+            match = remaining & (_overlaps(boxes[i], boxes, metric) >= iou)
+            match[i] = True
+            remaining &= ~match
+            if method == "wbf":
+                weights = group[match, 4:5]
+                fused = (boxes[match] * weights).sum(0) / weights.sum()
+                merged.append(np.concatenate([fused, group[i, 4:6]]))
+            else:
+                merged.append(group[i])
+    merged = np.array(merged, np.float32)
+    return merged[np.argsort(-merged[:, 4], kind="stable")]
+
+
+class TiledPredictor:
+    def __init__(self, model, tile=640, overlap=0.2, batch=8, full_image=True, merge="nms", merge_iou=0.5,
+                 metric="ios", imgsz=None, device=None):
+        """
+        Sliced inference for images much larger than the model input (4K frames, aerial shots):
+        small objects survive because every tile is seen at native resolution.
+        - Tiles are views into the source array (no copies) and go through the model `batch`
+          tiles per forward pass.
+        - Tile detections are shifted to image coordinates and merged across tiles (and with an
+          optional full-image pass that keeps large objects whole) with class-aware NMS or WBF.
+        predict() returns an ultralytics Results over the original image (boxes only), so it can be
+        plotted, saved and written like a normal predict result.
+        """
+        if merge not in MERGE_METHODS:
+            raise ValueError(f"Unknown merge method: {merge}")
+        self.model = model
+        self.tile = tile
+        self.overlap = overlap
+        self.batch = batch
+        self.full_image = full_image
+        self.merge = merge
+        self.merge_iou = merge_iou
+        self.metric = metric
+        self.imgsz = imgsz or tile
+        self.device = device
+        self.stats = {"images": 0, "tiles": 0, "forward_passes": 0, "seconds": 0.0}
+
+    def _predict(self, source, conf, iou, imgsz):
+        self.stats["forward_passes"] += 1
+        return self.model.predict(source, conf=conf, iou=iou, imgsz=imgsz, device=self.device, verbose=False)
+
+    def predict(self, image, conf=0.25, iou=0.45, path=""):
+        import torch
+        from ultralytics.engine.results import Results
+
+        start = time.perf_counter()
+        h, w = image.shape[:2]
+        windows = tile_windows(h, w, self.tile, self.overlap)
+        detections = []
+        for i in range(0, len(windows), self.batch):
+            chunk = windows[i:i + self.batch]
+            results = self._predict([image[y1:y2, x1:x2] for x1, y1, x2, y2 in chunk], conf, iou, self.imgsz)
+            for (x1, y1, _, _), r in zip(chunk, results):
+                if r.boxes is not None and len(r.boxes):
+                    det = r.boxes.data.cpu().numpy()[:, [0, 1, 2, 3, -2, -1]].copy()
+                    det[:, [0, 2]] += x1
+                    det[:, [1, 3]] += y1
+                    detections.append(det)
+        if self.full_image and len(windows) > 1:
+            r = self._predict(image, conf, iou, self.imgsz)[0]
+            if r.boxes is not None and len(r.boxes):
+                detections.append(r.boxes.data.cpu().numpy()[:, [0, 1, 2, 3, -2, -1]])
+
+        det = np.concatenate(detections) if detections else np.zeros((0, 6), np.float32)
+        merged = merge_detections(det, self.merge, self.merge_iou, self.metric)
+        self.stats["images"] += 1
+        self.stats["tiles"] += len(windows)
+        self.stats["seconds"] += time.perf_counter() - start
+        return Results(orig_img=image, path=path, names=self.model.names, boxes=torch.as_tensor(merged))
@@ -0,0 +1,106 @@
+import os
+import yaml
+import numpy as np
+
+DEFAULT_TRACKER_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "my_bytetrack.yaml")
+
+# Fallback for keys BYTETracker reads that older project YAMLs may not define
+BYTETRACK_DEFAULTS = {
+    "tracker_type": "bytetrack",
+    "track_high_thresh": 0.25,
+    "track_low_thresh": 0.1,
+    "new_track_thresh": 0.25,
+    "track_buffer": 30,
+    "match_thresh": 0.8,
+    "fuse_score": True,
+}
+
+
+def load_tracker_config(path=DEFAULT_TRACKER_CONFIG, **overrides):
+    """
+    Reads a ByteTrack YAML (default: my_bytetrack.yaml) on top of BYTETRACK_DEFAULTS.
+    Returns a plain dict; keyword overrides win over the file (used for parameter sweeps).
+    """
+    cfg = dict(BYTETRACK_DEFAULTS)
+    if path:
+        with open(path) as f:
+            cfg.update(yaml.safe_load(f) or {})
+    cfg.update(overrides)
+    if cfg["tracker_type"] != "bytetrack":
+        raise ValueError(f"Only bytetrack is supported here, got '{cfg['tracker_type']}'")
+    return cfg
+
+
+def create_tracker(cfg, frame_rate=30):
+    """Builds a standalone ultralytics BYTETracker from a config dict."""
+    from ultralytics.trackers.byte_tracker import BYTETracker
+    from ultralytics.utils import IterableSimpleNamespace
+    args = IterableSimpleNamespace(**cfg)
+    try:
+        return BYTETracker(args=args, frame_rate=frame_rate)
+    except TypeError:
+        # Newer ultralytics releases dropped the frame_rate argument
+        return BYTETracker(args=args)
+
+
+class _ArrayDetections:
+    """
+    Minimal stand-in for ultralytics Boxes (numpy) as BYTETracker reads it: conf, cls, xyxy / xywh,
+    len() and boolean/index selection. Lets cached detections be tracked without Results objects.
+    """
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        self.conf = np.asarray(conf, dtype=np.float32).reshape(-1)
+        self.cls = np.asarray(cls, dtype=np.float32).reshape(-1)
+
+    @property
+    def xywh(self):
+        xywh = self.xyxy.copy()
+        xywh[:, 2:] -= xywh[:, :2]
+        xywh[:, :2] += xywh[:, 2:] / 2
+        return xywh
+
+    def __len__(self):
+        return len(self.conf)
+
+    def __getitem__(self, index):
+        return _ArrayDetections(self.xyxy[index], self.conf[index], self.cls[index])
+
+
+class StreamTracker:
+    def __init__(self, cfg, frame_rate=30):
+        """
+        Independent ByteTrack state for one camera, so detections from a batched forward pass
+        can be tracked per stream (model.track keeps a single tracker per predictor).
+        """
+        self.cfg = cfg
+        self.frame_rate = frame_rate
+        self.tracker = create_tracker(cfg, frame_rate)
+
+    def reset(self):
+        """Drops all tracks (e.g. after a stream reconnects)."""
+        self.tracker = create_tracker(self.cfg, self.frame_rate)
+
+    def update(self, result):
+        """
+        Runs the tracker on one ultralytics Results object and returns a Results restricted to
+        tracked boxes, with track IDs filled in (same shape as model.track output).
+        """
+        import torch
+        det = result.boxes.cpu().numpy()
+        tracks = self.tracker.update(det, result.orig_img)
+        if len(tracks) == 0:
+            return result[:0]
+        idx = tracks[:, -1].astype(int)
+        tracked = result[idx]
+        tracked.update(boxes=torch.as_tensor(tracks[:, :-1], dtype=torch.float32,
+                                             device=result.boxes.data.device))
+        return tracked
+
+    def update_arrays(self, xyxy, conf, cls, img=None):
+        """
+        Runs the tracker on plain arrays (e.g. from a detection cache).
+        Returns [N, 8] rows of (x1, y1, x2, y2, track_id, score, cls, detection index).
+        """
+        tracks = self.tracker.update(_ArrayDetections(xyxy, conf, cls), img)
+        return np.asarray(tracks, dtype=np.float32).reshape(-1, 8)
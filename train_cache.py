@@ -0,0 +1,280 @@
+import os
+import json
+import math
+import uuid
+import shutil
+import hashlib
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from ultralytics.data.dataset import YOLODataset
+
+CACHE_VERSION = 1
+DEFAULT_SHARD_BYTES = 2 << 30
+
+
+def _file_digest(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _load_resized(path, imgsz):
+    """Decode + resize exactly like ultralytics' load_image (long side to imgsz, INTER_LINEAR)."""
+    with open(path, "rb") as f:
+        data = f.read()
+    im = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if im is None:
+        raise FileNotFoundError(f"Image Not Found {path}")
+    h0, w0 = im.shape[:2]
+    r = imgsz / max(h0, w0)
+    if r != 1:
+        w, h = min(math.ceil(w0 * r), imgsz), min(math.ceil(h0 * r), imgsz)
+        im = cv2.resize(im, (w, h), interpolation=cv2.INTER_LINEAR)
+    return np.ascontiguousarray(im), (h0, w0), _file_digest(data)
+
+
+class MmapImageCache:
+    def __init__(self, path):
+        """
+        Pre-decoded, pre-resized training images packed into flat uint8 shard files.
+        get(file) returns (view, (h0, w0), (h, w)) where view is a zero-copy slice of a memory-mapped
+        shard; shards are mapped copy-on-write, so in-place augmentations never touch the cache.
+        Picklable: dataloader workers re-open the shards themselves (and refuse a cache that another
+        run has rebuilt in the meantime). The opening process maps every shard up front, so a rebuild
+        never changes what it reads.
+        """
+        self.path = path
+        with open(os.path.join(path, "index.json")) as f:
+            self.meta = json.load(f)
+        self.imgsz = self.meta["imgsz"]
+        self.entries = {e["file"]: e for e in self.meta["entries"]}
+        self._shards = {}
+        for index in range(self.meta["shards"]):
+            self._shard(index)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["_shards"] = {}
+        return state
+
+    def _shard(self, index):
+        shard = self._shards.get(index)
+        if shard is None:
+            if not self._shards:
+                self._check_key()
+            shard = self._shards[index] = np.memmap(os.path.join(self.path, f"shard_{index:03d}.bin"),
+                                                    dtype=np.uint8, mode="c")
+        return shard
+
+    def _check_key(self):
+        try:
+            with open(os.path.join(self.path, "index.json")) as f:
+                key = json.load(f)["key"]
+        except (OSError, ValueError, KeyError):
+            key = None
+        if key != self.meta["key"]:
+            raise RuntimeError(f"Image cache {self.path} was rebuilt by another run; restart this run to use it")
+
+    def get(self, file):
+        e = self.entries.get(file)
+        if e is None:
+            return None
+        h, w = e["hw"]
+        im = self._shard(e["shard"])[e["offset"]:e["offset"] + h * w * 3].reshape(h, w, 3)
+        return im, tuple(e["hw0"]), (h, w)
+
+
+def _stat_key(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _content_key(files, digests, imgsz):
+    h = hashlib.sha1(json.dumps({"version": CACHE_VERSION, "imgsz": imgsz}).encode())
+    for file in files:
+        h.update(file.encode("utf-8"))
+        h.update(digests[file].encode())
+    return h.hexdigest()
+
+
+@contextmanager
+def _build_lock(path):
+    """Exclusive lock (a <path>.lock file) so concurrent runs build a cache only once."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + ".lock", "a+") as f:
+        try:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        except ImportError:
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            try:
+                import fcntl
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            except ImportError:
+                import msvcrt
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _open_if_current(files, imgsz, path):
+    """MmapImageCache at path if it exists and matches the current file contents, else None."""
+    index_path = os.path.join(path, "index.json")
+    if not os.path.exists(index_path):
+        return None
+    with open(index_path) as f:
+        meta = json.load(f)
+    known = {e["file"]: e for e in meta["entries"]}
+    digests, changed = {}, False
+    for file in files:
+        e = known.get(file)
+        if e is not None and e["stat"] == _stat_key(file):
+            digests[file] = e["digest"]
+        else:
+            with open(file, "rb") as fh:
+                digests[file] = _file_digest(fh.read())
+            changed = True
+    if _content_key(files, digests, imgsz) != meta["key"]:
+        print(f"♻️ Dataset changed, rebuilding image cache {path}")
+        return None
+    if changed:
+        # Touched but identical files: remember the new stats so they are not re-read next time
+        for file in files:
+            known[file]["stat"] = _stat_key(file)
+        tmp_index = f"{index_path}.{os.getpid()}.{uuid.uuid4().hex}.part"
+        with open(tmp_index, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_index, index_path)
+    print(f"📦 Using image cache {path} ({len(files)} images)")
+    return MmapImageCache(path)
+
+
+def build_image_cache(files, imgsz, cache_dir, shard_bytes=DEFAULT_SHARD_BYTES, workers=8):
+    """
+    Returns an MmapImageCache for `files` at `imgsz`, building it only when needed.
+    - The cache key is a hash over every image's content (plus imgsz); per-file digests are kept in
+      the index together with size/mtime, so unchanged files are never re-read to check the key.
+    - One cache directory per file list (train / val) and imgsz under cache_dir, shared by all runs
+      and experiments on the same data; a changed dataset rebuilds it in place.
+    - Concurrent runs serialise on a lock file: one builds (into its own temp directory) while the
+      others wait and then use its result. A rebuild swaps the directory atomically; runs already
+      using the old cache keep their mapped shards.
+    """
+    files = list(files)
+    list_id = hashlib.sha1("\n".join(files).encode("utf-8")).hexdigest()[:12]
+    path = os.path.join(cache_dir, f"{list_id}-{imgsz}")
+
+    with _build_lock(path):
+        # Another run may have finished the build while this one waited for the lock
+        cache = _open_if_current(files, imgsz, path)
+        if cache is None:
+            _build(files, imgsz, path, shard_bytes, workers)
+            cache = MmapImageCache(path)
+    return cache
+
+
+def _build(files, imgsz, path, shard_bytes, workers):
+    print(f"📦 Building image cache for {len(files)} images at imgsz={imgsz} -> {path}")
+    tmp = f"{path}.{os.getpid()}.{uuid.uuid4().hex}.part"
+    os.makedirs(tmp)
+    try:
+        meta = _write_shards(files, imgsz, tmp, shard_bytes, workers)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    # Move the old version aside before swapping: processes that mapped its shards keep reading them
+    old = None
+    if os.path.exists(path):
+        old = f"{path}.{os.getpid()}.{uuid.uuid4().hex}.old"
+        os.replace(path, old)
+    os.replace(tmp, path)
+    if old is not None:
+        shutil.rmtree(old, ignore_errors=True)
+    print(f"✅ Image cache ready: {len(files)} images, {meta['bytes'] / 2 ** 30:.2f} GiB in {meta['shards']} shard(s)")
+
+
+def _write_shards(files, imgsz, out_dir, shard_bytes, workers):
+    entries, digests = [], {}
+    shard, offset, out = 0, 0, None
+    total = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # cv2 decode/resize release the GIL; shards are written sequentially in file order
+        for file, (im, hw0, digest) in zip(files, pool.map(lambda p: _load_resized(p, imgsz), files)):
+            data = im.tobytes()
+            if out is None or (offset and offset + len(data) > shard_bytes):
+                if out is not None:
+                    out.close()
+                    shard += 1
+                out = open(os.path.join(out_dir, f"shard_{shard:03d}.bin"), "wb")
+                offset = 0
+            out.write(data)
+            entries.append({"file": file, "shard": shard, "offset": offset, "hw": list(im.shape[:2]),
+                            "hw0": list(hw0), "digest": digest, "stat": _stat_key(file)})
+            digests[file] = digest
+            offset += len(data)
+            total += len(data)
+    if out is not None:
+        out.close()
+
+    meta = {"version": CACHE_VERSION, "imgsz": imgsz, "key": _content_key(files, digests, imgsz),
+            "images": len(files), "bytes": total, "shards": shard + 1 if entries else 0, "entries": entries}
+    with open(os.path.join(out_dir, "index.json"), "w") as f:
+        json.dump(meta, f)
+    return meta
+
+
+class MmapYOLODataset(YOLODataset):
+    """YOLODataset whose images come from an MmapImageCache (set as .mmap_cache) instead of JPEG decoding."""
+
+    def load_image(self, i, rect_mode=True, resize_short=False):
+        cache = getattr(self, "mmap_cache", None)
+        if cache is not None and rect_mode and not resize_short and cache.imgsz == self.imgsz:
+            if self.ims[i] is not None:
+                return self.ims[i], self.im_hw0[i], self.im_hw[i]
+            cached = cache.get(self.im_files[i])
+            if cached is not None:
+                im, hw0, hw = cached
+                # Same buffer bookkeeping as BaseDataset.load_image: mosaic/mixup sample extra images from it
+                if self.augment and self.cache != "ram":
+                    self.ims[i], self.im_hw0[i], self.im_hw[i] = im, hw0, hw
+                    self.buffer.append(i)
+                    if 1 < len(self.buffer) >= self.max_buffer_length:
+                        j = self.buffer.pop(0)
+                        self.ims[j], self.im_hw0[j], self.im_hw[j] = None, None, None
+                return cached
+        return super().load_image(i, rect_mode, resize_short)
+
+
+def attach_image_cache(dataset, cache_dir, shard_bytes=DEFAULT_SHARD_BYTES, workers=8):
+    """Switches a freshly built YOLODataset to memory-mapped images (other dataset types are left alone)."""
+    if type(dataset) is not YOLODataset or getattr(dataset, "channels", 3) != 3:
+        print(f"⚠️ Image cache not supported for {type(dataset).__name__}, decoding images as usual")
+        return dataset
+    dataset.mmap_cache = build_image_cache(dataset.im_files, dataset.imgsz, cache_dir, shard_bytes, workers)
+    dataset.__class__ = MmapYOLODataset
+    if len(dataset):
+        # Smoke check: one sample through the full transform pipeline (mosaic included when augmenting)
+        try:
+            dataset[0]
+        except Exception as e:
+            print(f"⚠️ Image cache check failed ({type(e).__name__}: {e}), decoding images as usual")
+            dataset.__class__ = YOLODataset
+            del dataset.mmap_cache
+            dataset.ims, dataset.im_hw0, dataset.im_hw = [None] * dataset.ni, [None] * dataset.ni, [None] * dataset.ni
+            dataset.buffer = []
+    return dataset
+
+
+def mmap_trainer(base, cache_dir, shard_bytes=DEFAULT_SHARD_BYTES, workers=8):
+    """Trainer class (for model.train(trainer=...)) whose train/val datasets read the image cache."""
+
+    class MmapTrainer(base):
+        def build_dataset(self, img_path, mode="train", batch=None):
+            dataset = super().build_dataset(img_path, mode, batch)
+            return attach_image_cache(dataset, cache_dir, shard_bytes, workers)
+
+    return MmapTrainer
@@ -0,0 +1,243 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import numpy as np
+
+
+def _rss_bytes():
+    """Resident memory of this process plus its children (dataloader workers)."""
+    import psutil
+    proc = psutil.Process()
+    total = proc.memory_info().rss
+    for child in proc.children(recursive=True):
+        try:
+            total += child.memory_info().rss
+        except psutil.Error:
+            pass
+    return total
+
+
+def _finite(loss):
+    if loss is None:
+        return True
+    values = loss.values() if isinstance(loss, dict) else [loss]
+    return all(np.isfinite(np.asarray(v.detach().cpu() if hasattr(v, "detach") else v, dtype=np.float64)).all()
+               for v in values)
+
+
+class TrainProfiler:
+    def __init__(self, log_path=None, max_steps=None, warmup_steps=3, rss_every=10, verbose=True):
+        """
+        Training throughput profiler built on ultralytics callbacks (attach(model) before model.train).
+        Per step it splits wall time into dataloader wait (previous batch end -> next batch start) and
+        compute (forward/backward/optimizer); per epoch it reports images/sec, step percentiles, peak
+        accelerator memory, peak RSS incl. dataloader workers and epoch wall time (incl. validation).
+        Records are appended as JSON lines to log_path. With max_steps the run stops after that many
+        measured steps (used by autotune); the first warmup_steps of each run are not measured.
+        """
+        self.log_path = log_path
+        self.max_steps = max_steps
+        self.warmup_steps = warmup_steps
+        self.rss_every = rss_every
+        self.verbose = verbose
+        self.epochs = []
+        self.context = {}
+        self._reset_epoch()
+        self._total_steps = 0
+        self._last_end = None
+
+    def _reset_epoch(self):
+        self._wait, self._compute, self._images = [], [], 0
+        self._peak_rss = 0
+        self._step = 0
+
+    def attach(self, model):
+        for event in ("on_train_start", "on_train_epoch_start", "on_train_batch_start", "on_train_batch_end",
+                      "on_train_epoch_end", "on_fit_epoch_end", "on_train_end"):
+            model.add_callback(event, getattr(self, event))
+        return self
+
+    def write(self, record):
+        if self.log_path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.log_path)), exist_ok=True)
+            with open(self.log_path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+
+    def _sync(self, trainer):
+        if trainer.device.type == "cuda":
+            import torch
+            torch.cuda.synchronize(trainer.device)
+
+    def on_train_start(self, trainer):
+        if trainer.device.type == "cuda":
+            import torch
+            torch.cuda.reset_peak_memory_stats(trainer.device)
+        self.context = {"batch": trainer.batch_size, "workers": trainer.args.workers, "imgsz": trainer.args.imgsz,
+                        "device": str(trainer.device), "dataset_images": len(trainer.train_loader.dataset)}
+
+    def on_train_epoch_start(self, trainer):
+        self._reset_epoch()
+        self._epoch_start = self._last_end = time.perf_counter()
+
+    def on_train_batch_start(self, trainer):
+        self._batch_start = time.perf_counter()
+        self._batch_wait = self._batch_start - self._last_end
+
+    def on_train_batch_end(self, trainer):
+        self._sync(trainer)
+        now = self._last_end = time.perf_counter()
+        self._total_steps += 1
+        n = len(trainer.train_loader.dataset)
+        images = max(min(trainer.batch_size, n - self._step * trainer.batch_size), 0)
+        if self._step % self.rss_every == 0:
+            self._peak_rss = max(self._peak_rss, _rss_bytes())
+        self._step += 1
+        if self._total_steps <= self.warmup_steps:
+            return
+        self._wait.append(self._batch_wait)
+        self._compute.append(now - self._batch_start)
+        self._images += images
+        if not _finite(getattr(trainer, "tloss", None)):
+            self.context["nan"] = True
+        if self.max_steps and len(self._wait) >= self.max_steps:
+            trainer.stop = True
+
+    def summary(self):
+        """Stats of the current (or just finished) epoch."""
+        wait, compute = np.array(self._wait), np.array(self._compute)
+        step = wait + compute
+        busy = float(step.sum())
+        return {
+            "steps": len(step),
+            "images": self._images,
+            "images_per_sec": self._images / busy if busy > 0 else 0.0,
+            "data_wait_s": float(wait.sum()),
+            "compute_s": float(compute.sum()),
+            "data_wait_fraction": float(wait.sum()) / busy if busy > 0 else 0.0,
+            "step_ms_p50": float(np.median(step)) * 1000 if len(step) else 0.0,
+            "step_ms_p95": float(np.percentile(step, 95)) * 1000 if len(step) else 0.0,
+            # Median-based rate: robust to the odd slow step (checkpointing, GC, cold disk cache)
+            "images_per_sec_median": (self._images / len(step)) / float(np.median(step)) if len(step) else 0.0,
+            "step_cv": float(step.std() / step.mean()) if len(step) > 1 and step.mean() > 0 else 0.0,
+            "peak_rss_gb": self._peak_rss / 2 ** 30,
+        }
+
+    def on_train_epoch_end(self, trainer):
+        stats = self.summary()
+        if trainer.device.type == "cuda":
+            import torch
+            stats["peak_mem_gb"] = torch.cuda.max_memory_allocated(trainer.device) / 2 ** 30
+        stats["epoch"] = trainer.epoch + 1
+        self._pending = stats
+
+    def on_fit_epoch_end(self, trainer):
+        stats = getattr(self, "_pending", None)
+        if stats is None:
+            return
+        self._pending = None
+        stats["epoch_wall_s"] = time.perf_counter() - self._epoch_start
+        self.epochs.append(stats)
+        self.write({"type": "epoch", "time": time.time(), **self.context, **stats})
+        if self.verbose:
+            print(f"⏱️ Epoch {stats['epoch']}: {stats['images_per_sec']:.1f} img/s, "
+                  f"data wait {stats['data_wait_fraction'] * 100:.0f}% of step time, "
+                  f"step p50/p95 {stats['step_ms_p50']:.0f}/{stats['step_ms_p95']:.0f} ms, "
+                  f"epoch {stats['epoch_wall_s']:.1f}s, RSS {stats['peak_rss_gb']:.2f} GB"
+                  + (f", GPU {stats['peak_mem_gb']:.2f} GB" if "peak_mem_gb" in stats else ""))
+            if stats["data_wait_fraction"] > 0.3:
+                print("⚠️ The dataloader is the bottleneck: try more --workers or an image cache")
+
+    def on_train_end(self, trainer):
+        if not self.epochs:
+            return
+        images = sum(e["images"] for e in self.epochs)
+        busy = sum(e["data_wait_s"] + e["compute_s"] for e in self.epochs)
+        record = {"type": "summary", "time": time.time(), **self.context, "epochs": len(self.epochs),
+                  "images_per_sec": images / busy if busy > 0 else 0.0,
+                  "data_wait_fraction": sum(e["data_wait_s"] for e in self.epochs) / busy if busy > 0 else 0.0,
+                  "train_wall_s": sum(e["epoch_wall_s"] for e in self.epochs),
+                  "peak_rss_gb": max(e["peak_rss_gb"] for e in self.epochs),
+                  "peak_mem_gb": max(e.get("peak_mem_gb", 0.0) for e in self.epochs)}
+        self.write(record)
+
+
+def _probe_trainer(base):
+    """Trainer for tuning probes: no validation, checkpoints or final evaluation."""
+
+    class ProbeTrainer(base):
+        def validate(self):
+            return {}, None
+
+        def save_model(self):
+            return False
+
+        def final_eval(self):
+            pass
+
+    return ProbeTrainer
+
+
+def autotune(model_path, data, batches, workers, imgsz=640, device=None, steps=20, trainer=None,
+             log_path=None, train_args=None, max_step_cv=0.5):
+    """
+    Short training probes over every (batch, workers) pair on this machine. Each probe builds the
+    real dataloader and model, skips warmup steps, measures `steps` steps and stops (no validation or
+    checkpoints). A setting counts as stable if it finished without errors (e.g. out of memory), its
+    losses stayed finite and its step time did not swing by more than max_step_cv (std/mean).
+    Returns (best {"batch", "workers", ...} or None, all results); best = highest median img/s.
+    """
+    from ultralytics import YOLO
+    results = []
+    project = tempfile.mkdtemp(prefix="autotune-")
+    try:
+        for batch in batches:
+            for nw in workers:
+                model = YOLO(model_path)
+                profiler = TrainProfiler(max_steps=steps, verbose=False).attach(model)
+                base = trainer or model.task_map[model.task]["trainer"]
+                row = {"batch": batch, "workers": nw}
+                start = time.time()
+                error = None
+                try:
+                    model.train(trainer=_probe_trainer(base), data=data, imgsz=imgsz, device=device, batch=batch,
+                                workers=nw, epochs=1, val=False, plots=False, save=False, verbose=False,
+                                project=project, name="probe", exist_ok=True, **(train_args or {}))
+                except Exception as e:
+                    # Probes save no checkpoint, so model.train complains at the very end; only errors
+                    # before all steps were measured (out of memory, dataloader crash) count as failures
+                    error = str(e).splitlines()[0][:200] if str(e) else repr(e)
+                stats = profiler.epochs[-1] if profiler.epochs else profiler.summary()
+                row.update(stats, ok=stats["steps"] >= steps and not profiler.context.get("nan"))
+                row["stable"] = row["ok"] and stats["step_cv"] <= max_step_cv
+                if not row["ok"]:
+                    row["error"] = error or ("non-finite loss" if profiler.context.get("nan") else
+                                             f"only {stats['steps']} of {steps} steps (dataset too small?)")
+                row["probe_s"] = time.time() - start
+                results.append(row)
+                if log_path:
+                    profiler.log_path = log_path
+                    profiler.write({"type": "autotune", "time": time.time(), **row})
+                if row["ok"]:
+                    print(f"🔧 batch={batch:<4} workers={nw:<3} {row['images_per_sec_median']:7.1f} img/s  "
+                          f"data wait {row['data_wait_fraction'] * 100:3.0f}%  step cv {row['step_cv']:.2f}"
+                          + ("" if row["stable"] else "  (unstable)"))
+                else:
+                    print(f"🔧 batch={batch:<4} workers={nw:<3} failed: {row['error']}")
+                del model
+                _free_accelerator_memory()
+    finally:
+        shutil.rmtree(project, ignore_errors=True)
+
+    stable = [r for r in results if r["stable"]]
+    best = max(stable, key=lambda r: r["images_per_sec_median"]) if stable else None
+    return best, results
+
+
+def _free_accelerator_memory():
+    import gc
+    import torch
+    gc.collect()
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
@@ -1,28 +1,39 @@
+import os
 import gradio as gr
-from ultralytics import YOLO
 import cv2
 import PIL.Image as Image
 import numpy as np
+from batch_inference import MicroBatcher
+from model_registry import load_model, warmup_model
 
-# Load the model
-model_path = 'yolo-project/models/yolov8n.pt'
-model = YOLO(model_path)
+# Serving settings (override with environment variables)
+model_path = os.environ.get("WEB_DEMO_MODEL", 'yolo-project/models/yolov8n.pt')
+REPLICAS = int(os.environ.get("WEB_DEMO_REPLICAS", 1))        # model copies, each on its own worker thread
+MAX_BATCH = int(os.environ.get("WEB_DEMO_MAX_BATCH", 8))      # max images per forward pass
+MAX_WAIT_MS = float(os.environ.get("WEB_DEMO_MAX_WAIT_MS", 20))  # how long to wait for a batch to fill
+DEVICE = os.environ.get("WEB_DEMO_DEVICE") or None
+
+# Load the model replicas behind the micro-batcher (each loads + warms up on its own worker thread)
+batcher = MicroBatcher(lambda: warmup_model(load_model(model_path, DEVICE)), replicas=REPLICAS,
+                       max_batch=MAX_BATCH, max_wait=MAX_WAIT_MS / 1000.0, device=DEVICE)
+
+def format_stats():
+    s = batcher.stats()
+    return (f"requests: {s['requests']} | batches: {s['batches']} | pending: {s['pending']}\n"
+            f"batch size avg/max: {s['batch_size_avg']:.2f}/{s['batch_size_max']}\n"
+            f"queue wait avg/p95: {s['queue_wait_ms_avg']:.1f}/{s['queue_wait_ms_p95']:.1f} ms | "
+            f"inference avg: {s['inference_ms_avg']:.1f} ms")
 
 def predict_image(img, conf_threshold, iou_threshold):
-    # Run inference
-    results = model.predict(
-        source=img,
-        conf=conf_threshold,
-        iou=iou_threshold,
-        show_labels=True,
-        show_conf=True,
-    )
-    
+    if img is None:
+        return None, format_stats()
+    # Run inference (batched together with other users' concurrent requests)
+    r = batcher.predict(img, conf=conf_threshold, iou=iou_threshold)
+
     # Plot results on the image
-    for r in results:
-        im_array = r.plot()  # plot a BGR numpy array of predictions
-        im = Image.fromarray(im_array[..., ::-1])  # RGB PIL image
-        return im
+    im_array = r.plot(labels=True, conf=True)  # plot a BGR numpy array of predictions
+    im = Image.fromarray(im_array[..., ::-1])  # RGB PIL image
+    return im, format_stats()
 
 # Create the Gradio interface
 demo = gr.Interface(
@@ -32,11 +43,16 @@ demo = gr.Interface(
         gr.Slider(minimum=0, maximum=1, value=0.25, label="Confidence Threshold"),
         gr.Slider(minimum=0, maximum=1, value=0.45, label="IoU Threshold"),
     ],
-    outputs=gr.Image(type="pil", label="Result"),
+    outputs=[
+        gr.Image(type="pil", label="Result"),
+        gr.Textbox(label="Serving Stats", lines=3),
+    ],
     title="🌟 YOLOv8 Object Detection Interactive Demo",
     description="Upload an image to see YOLOv8 in action! Adjust the thresholds to see how detection changes.",
     examples=[["bus.jpg", 0.25, 0.45]]
 )
 
 if __name__ == "__main__":
+    # Let Gradio hand enough requests to the batcher at once to fill every replica's batch
+    demo.queue(default_concurrency_limit=REPLICAS * MAX_BATCH)
     demo.launch(share=False)